@@ -0,0 +1,128 @@
+import importlib
+import numpy as np
+
+
+class Backend:
+    """
+    配列演算モジュール (numpy, cupy など) の抽象化.
+    ネットワークを作るときに1度だけ演算モジュールを決めておき、
+    活性化関数・学習係数・重み減衰には、そのモジュールを xp (ap) として渡します.
+    呼び出しのたびに、引数の配列の種類を調べて演算モジュールを切り替える必要がなくなります.
+
+    numpy と同じ名前の関数 (dot, matmul, where, empty, copyto ... ) を持つモジュールであれば、
+    numpy, cupy 以外のモジュールも使えます.
+    """
+
+    def __init__(self, xp=np):
+        """
+        コンストラクタ
+        :param xp: 配列演算モジュール
+        """
+        self.xp = xp
+
+    def name(self):
+        """
+        配列演算モジュールの名前を返します
+        """
+        return self.xp.__name__
+
+    def __getstate__(self):
+        # モジュールは pickle できないので、名前で送り、受け取った側で import し直す (プロセス間で学習器を送るため)
+        state = self.__dict__.copy()
+        state["xp"] = self.xp.__name__
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.xp = importlib.import_module(self.xp)
+
+    def asarray(self, a, dtype=None):
+        """
+        a を、このバックエンドの配列に変換します. (すでにこのバックエンドの配列であれば、そのまま返します)
+        :param a: 配列
+        :param dtype: 型 (省略時は a の型)
+        :return: このバックエンドの配列
+        """
+        return self.xp.asarray(a, dtype=dtype)
+
+    def asnumpy(self, a):
+        """
+        a を、numpy の配列に変換します
+        :param a: このバックエンドの配列
+        :return: numpy の配列
+        """
+        return np.asarray(a)
+
+    def synchronize(self):
+        """
+        非同期に実行される演算が終わるのを待ちます. (時間の計測用)
+        """
+        pass
+
+
+class CupyBackend(Backend):
+    """
+    cupy (GPU) のバックエンド.
+    cupy はこのクラスを作るときに import するので、cupy が無い環境でも ai_chan を import できます.
+    """
+
+    def __init__(self):
+        import cupy
+        super().__init__(cupy)
+
+    def asnumpy(self, a):
+        return self.xp.asnumpy(a)
+
+    def synchronize(self):
+        self.xp.cuda.get_current_stream().synchronize()
+
+
+NUMPY = Backend(np)
+
+
+def cupy_available():
+    """
+    cupy と、cupy が使える GPU があるかを返します
+    :return: True=cupy が使える
+    """
+    try:
+        import cupy
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except Exception:
+        return False
+
+
+def get_backend(backend=None):
+    """
+    バックエンドを返します
+    :param backend: 次のいずれか
+        None, "numpy" : numpy
+        "cupy" : cupy (cupy が無ければ ImportError)
+        "auto" : cupy が使えれば cupy、使えなければ numpy
+        Backend : そのまま返します
+        モジュール : そのモジュールを配列演算に使うバックエンド
+    :return: バックエンド
+    """
+    if backend is None:
+        return NUMPY
+
+    if isinstance(backend, Backend):
+        return backend
+
+    if isinstance(backend, str):
+        if backend == "numpy":
+            return NUMPY
+        if backend == "cupy":
+            return CupyBackend()
+        if backend == "auto":
+            return CupyBackend() if cupy_available() else NUMPY
+        raise ValueError("unknown backend: {}".format(backend))
+
+    if backend is np:
+        return NUMPY
+    if getattr(backend, "__name__", None) == "cupy":
+        return CupyBackend()
+    if hasattr(backend, "asarray"):
+        return Backend(backend)
+
+    raise ValueError("unknown backend: {}".format(backend))
@@ -7,20 +7,39 @@ class ActivateFunction(metaclass=ABCMeta):
     活性化関数の抽象クラス.
     """
 
+    # True=微分値を出力 z = f(u) から求められる (differential_from_output を実装している)
+    uses_output = False
+
     @abstractmethod
-    def calc(self, x, xp=np):
+    def calc(self, x, xp=np, out=None):
         """
         x に対する値を計算します
+        :param x: 入力
+        :param xp: numpy or cupy
+        :param out: 結果の格納先 (省略時は新しい配列を確保します)
         """
         pass
 
     @abstractmethod
-    def differential(self, x, xp=np):
+    def differential(self, x, xp=np, out=None):
         """
         x に対する微分値を計算します
+        :param x: 入力
+        :param xp: numpy or cupy
+        :param out: 結果の格納先 (省略時は新しい配列を確保します)
         """
         pass
 
+    def differential_from_output(self, z, xp=np, out=None):
+        """
+        出力 z = f(x) から、x に対する微分値を計算します.
+        順伝搬で記録した z を使えるので、x から計算し直すより安く求まる関数 (uses_output = True) だけが実装します
+        :param z: 出力
+        :param xp: numpy or cupy
+        :param out: 結果の格納先 (省略時は新しい配列を確保します)
+        """
+        raise NotImplementedError("{} does not compute the differential from its output".format(self.name()))
+
     @abstractmethod
     def inv(self, x, xp=np):
         """
@@ -30,9 +49,13 @@ class ActivateFunction(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def delta(self, d, y):
+    def delta(self, d, y, out=None, xp=np):
         """
         出力層にこの関数を使った場合のδ(L)を計算します
+        :param d: 教師値
+        :param y: 予測値
+        :param out: 結果の格納先 (省略時は新しい配列を確保します)
+        :param xp: numpy or cupy
         """
         pass
 
@@ -60,17 +83,28 @@ class IdentityMapping(ActivateFunction):
     """
     恒等写像
     """
-    def calc(self, x, xp=np):
-        return x
+    uses_output = True
+
+    def calc(self, x, xp=np, out=None):
+        if out is None:
+            return x
+        xp.copyto(out, x)
+        return out
 
-    def differential(self, x, xp=np):
-        return xp.ones_like(x)
+    def differential(self, x, xp=np, out=None):
+        if out is None:
+            return xp.ones_like(x)
+        out.fill(1.0)
+        return out
+
+    def differential_from_output(self, z, xp=np, out=None):
+        return self.differential(z, xp=xp, out=out)
 
     def inv(self, x, xp=np):
         return x
 
-    def delta(self, d, y):
-        return y - d
+    def delta(self, d, y, out=None, xp=np):
+        return _subtract(y, d, out)
 
     def error(d, y, xp=np):
         """
@@ -86,21 +120,42 @@ class Sigmoid(ActivateFunction):
     """
     シグモイド関数
     """
-    def calc(self, x, xp=np):
-        return 1.0 / (1.0 + xp.exp(-1.0 * x))
-
-    def differential(self, x, xp=np):
-        s = self.calc(x)
-        return (1.0 - s) * s
+    uses_output = True
+
+    def calc(self, x, xp=np, out=None):
+        if out is None:
+            return 1.0 / (1.0 + xp.exp(-1.0 * x))
+        xp.negative(x, out=out)
+        xp.exp(out, out=out)
+        out += 1.0
+        return xp.reciprocal(out, out=out)
+
+    def differential(self, x, xp=np, out=None):
+        if out is None:
+            s = self.calc(x, xp=xp)
+            return (1.0 - s) * s
+        # (1 - s) * s = 1/4 - (s - 1/2)^2 として、作業領域を増やさずに計算する
+        s = self.calc(x, xp=xp, out=out)
+        s -= 0.5
+        xp.square(s, out=s)
+        return xp.subtract(0.25, s, out=s)
+
+    def differential_from_output(self, z, xp=np, out=None):
+        # f'(x) = (1 - f(x)) * f(x) なので、exp を計算し直さずに済む
+        if out is None:
+            return (1.0 - z) * z
+        xp.subtract(1.0, z, out=out)
+        out *= z
+        return out
 
     def inv(self, x, xp=np):
         return xp.where(x > 0.5, 9.99, -9.99)
 
-    def delta(self, d, y):
+    def delta(self, d, y, out=None, xp=np):
         # delta = ((y - d) / (y * (1 - y))) * self.differential(y)
         # ここで、self.differential(y)が y * (1 - y) なため、
         # 打ち消し合って delta = y-d
-        return y - d
+        return _subtract(y, d, out)
 
     def name(self):
         return "Sigmoid"
@@ -110,20 +165,37 @@ class Tanh(ActivateFunction):
     """
     双曲線正接関数(tanh)
     """
-    def calc(self, x, xp=np):
+    uses_output = True
+
+    def calc(self, x, xp=np, out=None):
         # return (np.exp(x) - np.exp(-1.0 * x)) / (np.exp(x) + np.exp(-1.0 * x))
-        return xp.tanh(x)
+        return xp.tanh(x, out=out)
 
-    def differential(self, x, xp=np):
+    def differential(self, x, xp=np, out=None):
         # return 4.0 / np.power((np.exp(x) + np.exp(-1.0 * x)), 2)
-        return 1.0 / (xp.cosh(x) ** 2)
+        if out is None:
+            return 1.0 / (xp.cosh(x) ** 2)
+        xp.cosh(x, out=out)
+        xp.square(out, out=out)
+        return xp.reciprocal(out, out=out)
+
+    def differential_from_output(self, z, xp=np, out=None):
+        # f'(x) = 1 - f(x)^2 なので、cosh を計算せずに済む
+        if out is None:
+            return 1.0 - xp.square(z)
+        xp.square(z, out=out)
+        return xp.subtract(1.0, out, out=out)
 
     def inv(self, x, xp=np):
         return xp.where(x > 0.0, 9.99, -9.99)
 
-    def delta(self, d, y):
+    def delta(self, d, y, out=None, xp=np):
         # Tanh は、微分しても自分が出てこないので、Sigmoid のようにきれいな式にならない
-        return ((y - d) / (y * (1 - y))) * self.differential(y)
+        delta = ((y - d) / (y * (1 - y))) * self.differential(y, xp=xp)
+        if out is None:
+            return delta
+        out[...] = delta
+        return out
 
     def name(self):
         return "双曲線正接関数(tanh)"
@@ -133,18 +205,89 @@ class ReLu(ActivateFunction):
     """
     Rectified Linear Unit (正規化線形関数)
     """
-    def calc(self, x, xp=np):
+    uses_output = True
+
+    def calc(self, x, xp=np, out=None):
         # np.maximum( a, b ) means [max(a[0],b[0]), max(a[1], b[1]), max(a[2], b[2]),...]
-        return xp.maximum(0, x)
+        return xp.maximum(0, x, out=out)
 
-    def differential(self, x, xp=np):
-        return xp.where(x > 0, 1, 0)
+    def differential(self, x, xp=np, out=None):
+        if out is None:
+            # x と同じ型の 1.0, 0.0 を返す (整数の配列を作らない)
+            return (x > 0).astype(x.dtype)
+        return xp.greater(x, 0, out=out)
+
+    def differential_from_output(self, z, xp=np, out=None):
+        # f(x) > 0 と x > 0 は同じ
+        return self.differential(z, xp=xp, out=out)
 
     def inv(self, x, xp=np):
         return xp.where(x > 0.0, x, -9.99)
 
-    def delta(self, d, y):
-        return y - d
+    def delta(self, d, y, out=None, xp=np):
+        return _subtract(y, d, out)
 
     def name(self):
         return "正規化線形関数(ReLu)"
+
+
+class Softmax(ActivateFunction):
+    """
+    ソフトマックス関数 (分類問題の出力層用)
+    列 (=1件のデータ) ごとに、各クラスの確率 exp(x_i) / Σ exp(x_j) を計算します.
+    誤差関数は交差エントロピー (util.cross_entropy) で、教師値はクラス番号 (整数) を並べた 1行N列 の配列でも、
+    one-hot の配列でも構いません.
+    """
+    def calc(self, x, xp=np, out=None):
+        # 列ごとに最大値を引いてから exp を計算する (log-sum-exp と同じく、大きな x でもオーバーフローしない)
+        # (3次元の場合は、最後から2番目の軸がクラス)
+        out = xp.subtract(x, xp.max(x, axis=-2, keepdims=True), out=out)
+        xp.exp(out, out=out)
+        out /= xp.sum(out, axis=-2, keepdims=True)
+        return out
+
+    def differential(self, x, xp=np, out=None):
+        # ヤコビ行列が対角ではないので、要素ごとの微分値では表せない
+        raise NotImplementedError("Softmax can only be used in the output layer")
+
+    def inv(self, x, xp=np):
+        # クラス番号からは、クラス数 (出力数) が分からないので one-hot の配列にできない
+        if is_label(x):
+            raise ValueError("Softmax.inv needs one-hot targets, not class labels")
+        # 確率の対数 (定数の差を除いて x に戻る). 0 は適当な小さな値に丸める
+        return xp.log(xp.clip(x, 1e-4, 1.0))
+
+    def delta(self, d, y, out=None, xp=np):
+        # 交差エントロピー E = -Σ d log(y) の、ソフトマックスの入力での微分は y - d に打ち消し合う
+        # (log(y) や y の微分を計算しないので、y が 0 に近くても桁落ちしない)
+        if not is_label(d):
+            return _subtract(y, d, out)
+        # クラス番号の場合は、one-hot の配列を作らずに、正解のクラスの要素から 1 を引く
+        if out is None:
+            out = y.copy()
+        else:
+            out[...] = y
+        labels = d.reshape(-1)
+        out[..., labels, xp.arange(labels.size)] -= 1.0
+        return out
+
+    def name(self):
+        return "ソフトマックス関数(Softmax)"
+
+
+def is_label(d):
+    """
+    教師値 d がクラス番号 (整数の配列) かどうかを返します
+    """
+    return d.dtype.kind in "iu"
+
+
+def _subtract(y, d, out=None):
+    """
+    y - d を計算します. out を与えた場合は out に書き込みます
+    """
+    if out is None:
+        return y - d
+    out[...] = y
+    out -= d
+    return out
@@ -1,139 +1,92 @@
-import functools
-import types
-import inspect
-import cupy as cp
-from ai_chan import func, grad, nnet, weight
+import numpy as np
+from ai_chan import func, grad, nnet, weight, precision
+from ai_chan.backend import NUMPY, CupyBackend
 
-FLOAT_PRECISION = cp.float32
+# GPU で計算するときの浮動小数点の精度 (np.float32 と cupy.float32 は同じ型)
+# ネットワークに精度 (precision) を指定した場合は、その精度を使います
+FLOAT_PRECISION = np.float32
 
 
-def cupy_decorator(func):
-    """
-    数値演算関数の cupy/numpy 対応デコレーション.
-    第二引数が　numpy.ndarray であれば、可変引数 xp の numpy を指定します。
-    cupy.ndarray であれば、可変引数 xp に cupy を指定します。
-    ※ 第一引数は self です
-    :param func: function
-    :return: cupy対応
-    """
-
-    @functools.wraps(func)
-    def __func(*args, **kwargs):
-        kwargs["xp"] = cp.get_array_module(args[1])
-        return func(*args, **kwargs)
-
-    return __func
-
-
-def cupy_decorator2(func):
-    """
-    数値演算関数の cupy/numpy 対応デコレーション.
-    第二引数が　[numpy.ndarray] であれば、可変引数 xp の numpy を指定します。
-    [cupy.ndarray] であれば、可変引数 xp に cupy を指定します。
-    ※ 第一引数は self です
-    :param func: function
-    :return: cupy対応
-    """
-
-    @functools.wraps(func)
-    def __func(*args, **kwargs):
-        kwargs["ap"] = cp.get_array_module(args[1][1])
-        return func(*args, **kwargs)
-
-    return __func
-
+# 以下のクラスは、numpy 用のクラスと同じものです.
+# 以前は cupy/numpy を呼び出しのたびに判別するデコレータを付けていましたが、
+# 現在は GPUNet が backend (cupy) を xp として渡すので、numpy 用のクラスをそのまま使えます.
+# 既存のノートブックとの互換のために残しています.
 
-def GPU(clazz):
-    """
-    引数に xp または ap を持つ function を cupy_decorator で デコレートする
-    xp の場合は第一引数に cupy.ndarray または numpy.ndarray が来ると期待する.
-    ap の場合には第一引数に [cupy.ndarray] または [numpy.ndarray] が来ると期待する
-    :param clazz: クラス
-    :return: 処理済みクラス
-    """
-    for property_name in dir(clazz):
-        attr = getattr(clazz, property_name)
-        if type(attr) is not types.FunctionType:
-            continue
-
-        args = inspect.signature(attr).parameters.keys()
-        if 'xp' in args:
-            setattr(clazz, property_name, cupy_decorator(attr))
-        elif 'ap' in args:
-            setattr(clazz, property_name, cupy_decorator2(attr))
-
-    return clazz
-
-
-@GPU
 class IdentityMapping(func.IdentityMapping):
     pass
 
 
-@GPU
 class Sigmoid(func.Sigmoid):
     pass
 
 
-@GPU
 class Tanh(func.Tanh):
     pass
 
 
-@GPU
 class ReLu(func.ReLu):
     pass
 
 
-@GPU
 class Static(grad.Static):
     pass
 
 
-@GPU
 class Shrink(grad.Shrink):
     pass
 
 
-@GPU
 class NoDecay(weight.NoDecay):
     pass
 
 
-@GPU
 class L1Decay(weight.L1Decay):
     pass
 
 
-@GPU
 class L2Decay(weight.L2Decay):
     pass
 
 
-@GPU
 class LmaxDecay(weight.LmaxDecay):
     pass
 
 
-@GPU
 class GPUNet(nnet.SimpleNet):
+    """
+    GPU (cupy) で計算する SimpleNet.
+    ネットワークは CPU (numpy) 上で作り、to_gpu() で W,b を GPU に転送します.
+    to_gpu() の後は backend が cupy になり、forward などには cupy の配列を渡します.
+    """
 
     def to_gpu(self):
-        self.__to_gpu(self.w)
-        self.__to_gpu(self.b)
-        self.__to_gpu(self.learning_flag)
+        packed = self.parameters is not None
+        self.backend = CupyBackend()
+        # 精度を指定していない (float64 の) ネットワークは、GPU では FLOAT_PRECISION で計算する
+        if self.precision == precision.FLOAT64:
+            self.precision = precision.get_precision(FLOAT_PRECISION)
+        storage = self.precision.storage
+        self.__convert(self.w, lambda a: self.backend.asarray(a, dtype=storage))
+        self.__convert(self.b, lambda a: self.backend.asarray(a, dtype=storage))
+        self.__reset(packed)
 
     def to_cpu(self):
-        self.__to_cpu(self.w)
-        self.__to_cpu(self.b)
-        self.__to_cpu(self.learning_flag)
-
-    @staticmethod
-    def __to_gpu(list):
-        for cnt in range(0, len(list)):
-            list[cnt] = cp.asarray(list[cnt], dtype=FLOAT_PRECISION)
+        packed = self.parameters is not None
+        self.__convert(self.w, self.backend.asnumpy)
+        self.__convert(self.b, self.backend.asnumpy)
+        self.backend = NUMPY
+        self.__reset(packed)
+
+    def __reset(self, packed):
+        # 作業領域は、次の forward/predict で転送先に確保し直す
+        self.workspace = None
+        self.predict_buffer = None
+        # W,b をまとめていた場合は、転送先でまとめ直す
+        self.parameters = None
+        if packed:
+            self.pack_parameters()
 
     @staticmethod
-    def __to_cpu(list):
-        for cnt in range(0, len(list)):
-            list[cnt] = cp.asnumpy(list[cnt])
+    def __convert(list, converter):
+        for cnt in range(1, len(list)):
+            list[cnt] = converter(list[cnt])
@@ -1,44 +1,193 @@
+import math
 import numpy as np
 from abc import ABCMeta, abstractmethod
 
 
-class Grad(metaclass=ABCMeta):
+class Schedule(metaclass=ABCMeta):
+    """
+    学習回数 t から、その回の学習係数 (スカラー) を決めます
+    """
 
     @abstractmethod
-    def eta(self, dEdW, dEdB, ap=np):
+    def rate(self, t):
         """
-        学習係数η(イータ)を返します
-        :param dEdW: ∂E/∂W
-        :param dEdB: ∂E/∂b
-        :param ap: numpy or cupy
-        :return: 学習係数
+        t 回目のパラメータ修正での学習係数を返します
+        :param t: 学習回数 (1, 2, 3, ...)
+        :return: 学習係数 (スカラー)
         """
         pass
 
 
-class Static(Grad):
+class Constant(Schedule):
     """
     常に、コンストラクタで与えた係数を返します
     """
 
     def __init__(self, rate=0.001):
+        self.base = rate
+
+    def rate(self, t):
+        return self.base
+
+
+class StepDecay(Schedule):
+    """
+    step_size 回ごとに、係数を gamma 倍にします
+    """
+
+    def __init__(self, rate=0.001, step_size=1000, gamma=0.1):
+        self.base = rate
+        self.step_size = step_size
+        self.gamma = gamma
+
+    def rate(self, t):
+        return self.base * self.gamma ** ((t - 1) // self.step_size)
+
+
+class ExponentialDecay(Schedule):
+    """
+    1回ごとに、係数を gamma 倍にします
+    """
+
+    def __init__(self, rate=0.001, gamma=0.999):
+        self.base = rate
+        self.gamma = gamma
+
+    def rate(self, t):
+        return self.base * self.gamma ** (t - 1)
+
+
+class InverseDecay(Schedule):
+    """
+    係数/t を返します (Shrink の学習係数です)
+    """
+
+    def __init__(self, rate=0.001):
+        self.base = rate
+
+    def rate(self, t):
+        return self.base / t
+
+
+class CosineDecay(Schedule):
+    """
+    steps 回かけて、係数を rate から min_rate まで余弦の形で小さくします. 以降は min_rate です
+    """
+
+    def __init__(self, rate=0.001, steps=1000, min_rate=0.0):
+        self.base = rate
+        self.steps = steps
+        self.min_rate = min_rate
+
+    def rate(self, t):
+        progress = min(t - 1, self.steps) / self.steps
+        return self.min_rate + (self.base - self.min_rate) * (1.0 + math.cos(math.pi * progress)) / 2.0
+
+
+class WarmUp(Schedule):
+    """
+    最初の steps 回は、schedule の係数を 0 から線形に増やします (ウォームアップ)
+    """
+
+    def __init__(self, schedule, steps=100):
+        self.schedule = as_schedule(schedule)
+        self.steps = steps
+
+    def rate(self, t):
+        h = self.schedule.rate(t)
+        if t < self.steps:
+            h *= t / self.steps
+        return h
+
+
+def as_schedule(rate):
+    """
+    数値なら Constant に包み、Schedule ならそのまま返します
+    :param rate: 学習係数 または Schedule
+    :return: Schedule
+    """
+    if isinstance(rate, Schedule):
+        return rate
+    return Constant(rate)
+
+
+class Grad(metaclass=ABCMeta):
+    """
+    学習係数の管理をします.
+    学習係数は層ごとのスカラーで、Schedule で学習回数ごとに変えたり、
+    multipliers で層ごとに倍率をかけたりできます.
+    """
+
+    def __init__(self, rate=0.001, multipliers=None):
+        """
+        :param rate: 学習係数 または Schedule
+        :param multipliers: {層番号: 倍率} の dict. 書かれていない層の倍率は 1.0 です
+        """
         self.rate = rate
-        self.hw = None
-        self.hb = None
+        self.schedule = as_schedule(rate)
+        self.multipliers = {} if multipliers is None else multipliers
+        self.cnt = 0
 
     def eta(self, dEdW, dEdB, ap=np):
-        if self.hw is not None:
-            return self.hw, self.hb
-
-        self.hw = [None]
-        self.hb = [None]
+        """
+        学習係数η(イータ)を返します.
+        既定の実装は、層ごとのスカラーを返します. (パラメータと同じ形の行列は作りません)
+        要素ごとに学習係数が異なる実装だけが、行列を返します.
+        :param dEdW: ∂E/∂W
+        :param dEdB: ∂E/∂b
+        :param ap: numpy or cupy
+        :return: 学習係数
+        """
+        hw = [None]
+        hb = [None]
 
-        h = self.rate
         for idx in range(1, len(dEdW)):
-            self.hw.append(h * ap.ones_like(dEdW[idx]))
-            self.hb.append(h * ap.ones_like(dEdB[idx]))
+            h = self.layer_rate(idx)
+            hw.append(h)
+            hb.append(h)
+
+        return hw, hb
+
+    def layer_rate(self, idx):
+        """
+        現在の学習回数での、第 idx 層の学習係数 (スカラー) を返します
+        :param idx: 層番号
+        :return: 学習係数
+        """
+        return self.schedule.rate(max(self.cnt, 1)) * self.multipliers.get(idx, 1.0)
+
+    def next_step(self):
+        """
+        パラメータ修正を1回行うごとに、各層の update() の前に呼ばれます.
+        学習回数を数えます
+        """
+        self.cnt += 1
+
+    def update(self, dEdW, dEdB, idx, xp=np):
+        """
+        第 idx 層の修正量 η∂E/∂W, η∂E/∂b を求めます.
+        結果は dEdW, dEdB に上書きして返すので、全層分の学習係数を作りません.
+        (既定の実装は、層のスカラーの学習係数を掛けます)
+        :param dEdW: 第 idx 層の ∂E/∂W
+        :param dEdB: 第 idx 層の ∂E/∂b
+        :param idx: 層番号
+        :param xp: numpy or cupy
+        :return: W,b の修正量
+        """
+        h = self.layer_rate(idx)
+        dEdW *= h
+        dEdB *= h
+        return dEdW, dEdB
 
-        return self.hw, self.hb
+
+class Static(Grad):
+    """
+    常に、コンストラクタで与えた係数を返します.
+    rate に Schedule を与えると、学習回数に応じた係数になります
+    """
+
+    def __init__(self, rate=0.001, multipliers=None):
+        super().__init__(rate, multipliers)
 
 
 class Shrink(Grad):
@@ -46,18 +195,230 @@ class Shrink(Grad):
     呼ばれた回数tを数えていて、コンストラクタで与えた係数/t+1 を返します
     """
 
-    def __init__(self, rate=0.001):
+    def __init__(self, rate=0.001, multipliers=None):
+        super().__init__(InverseDecay(rate), multipliers)
         self.rate = rate
-        self.cnt = 0.0
 
     def eta(self, dEdW, dEdB, ap=np):
-        hw = [None]
-        hb = [None]
+        # eta() を学習回数ごとに呼ぶ使い方のために、ここでも数える
+        self.cnt += 1
+        return super().eta(dEdW, dEdB, ap=ap)
+
+
+class Stateful(Grad):
+    """
+    過去の勾配を状態として持つ学習アルゴリズムの抽象クラス.
+    状態の配列は、層ごとに最初の update() で1度だけ確保し、以降はその場で更新します.
+    """
+
+    def __init__(self, rate, multipliers=None):
+        super().__init__(rate, multipliers)
+        # (層番号, 0=W 1=b) ごとの状態配列のリスト
+        self.state = {}
+
+    def eta(self, dEdW, dEdB, ap=np):
+        hw, hb = super().eta(dEdW, dEdB, ap=ap)
 
-        self.cnt += 1.0
-        h = self.rate / self.cnt # これは rate / (cnt+1)
         for idx in range(1, len(dEdW)):
-            hw.append(h * ap.ones_like(dEdW[idx]))
-            hb.append(h * ap.ones_like(dEdB[idx]))
+            hw[idx] = self.element_rate(hw[idx], self.state.get((idx, 0)), ap)
+            hb[idx] = self.element_rate(hb[idx], self.state.get((idx, 1)), ap)
 
         return hw, hb
+
+    def update(self, dEdW, dEdB, idx, xp=np):
+        h = self.layer_rate(idx)
+        self.step(dEdW, self.__state((idx, 0), dEdW, xp), h, xp)
+        self.step(dEdB, self.__state((idx, 1), dEdB, xp), h, xp)
+        return dEdW, dEdB
+
+    def __state(self, key, like, xp):
+        state = self.state.get(key)
+        if state is None:
+            state = [xp.zeros_like(like) for cnt in range(0, self.state_size())]
+            self.state[key] = state
+        return state
+
+    def element_rate(self, h, state, ap=np):
+        """
+        状態から、要素ごとの学習係数を求めます.
+        要素ごとに学習係数が変わる実装だけが、行列を返します
+        :param h: 層の学習係数 (スカラー)
+        :param state: このパラメータの状態配列のリスト (まだ無ければ None)
+        :param ap: numpy or cupy
+        :return: 学習係数
+        """
+        return h
+
+    @abstractmethod
+    def state_size(self):
+        """
+        1つのパラメータ (W または b) ごとに必要な状態配列の数を返します
+        """
+        pass
+
+    @abstractmethod
+    def step(self, g, state, rate, xp=np):
+        """
+        勾配 g を、その場で修正量 (W -= 修正量) に書き換えます
+        :param g: ∂E/∂W または ∂E/∂b (上書きされます)
+        :param state: このパラメータの状態配列のリスト
+        :param rate: 層の学習係数 (スカラー)
+        :param xp: numpy or cupy
+        """
+        pass
+
+
+class Momentum(Stateful):
+    """
+    モーメンタム.
+    v = μv + η∂E/∂W を修正量とします. (前回の修正の向きに慣性をつけます)
+    """
+
+    def __init__(self, rate=0.001, momentum=0.9, multipliers=None):
+        super().__init__(rate, multipliers)
+        self.momentum = momentum
+
+    def state_size(self):
+        return 1
+
+    def step(self, g, state, rate, xp=np):
+        v = state[0]
+        g *= rate
+        v *= self.momentum
+        v += g
+        xp.copyto(g, v)
+
+
+class Nesterov(Stateful):
+    """
+    Nesterov の加速勾配法.
+    v = μv + η∂E/∂W とし、慣性で進んだ先を見越した μv + η∂E/∂W を修正量とします.
+    """
+
+    def __init__(self, rate=0.001, momentum=0.9, multipliers=None):
+        super().__init__(rate, multipliers)
+        self.momentum = momentum
+
+    def state_size(self):
+        return 1
+
+    def step(self, g, state, rate, xp=np):
+        v = state[0]
+        g *= rate
+        v *= self.momentum
+        v += g
+        # 修正量 μv + ηg = μ(g/μ + v) を、作業領域を増やさずに g に求める
+        if self.momentum != 0.0:
+            g /= self.momentum
+            g += v
+            g *= self.momentum
+
+
+class AdaGrad(Stateful):
+    """
+    AdaGrad.
+    h = h + (∂E/∂W)^2 とし、η / (√h + ε) ∂E/∂W を修正量とします.
+    (これまでに大きく修正した要素ほど、学習係数を小さくします)
+    """
+
+    def __init__(self, rate=0.01, epsilon=10e-8, multipliers=None):
+        super().__init__(rate, multipliers)
+        self.epsilon = epsilon
+
+    def state_size(self):
+        # h と作業用の配列
+        return 2
+
+    def element_rate(self, h, state, ap=np):
+        if state is None:
+            return h
+        return h / (ap.sqrt(state[0]) + self.epsilon)
+
+    def step(self, g, state, rate, xp=np):
+        h, work = state
+        xp.multiply(g, g, out=work)
+        h += work
+        xp.sqrt(h, out=work)
+        work += self.epsilon
+        g /= work
+        g *= rate
+
+
+class RMSProp(Stateful):
+    """
+    RMSProp.
+    h = ρh + (1 - ρ)(∂E/∂W)^2 とし、η / (√h + ε) ∂E/∂W を修正量とします.
+    (AdaGrad の h を指数移動平均にして、古い勾配の影響を忘れるようにしたものです)
+    """
+
+    def __init__(self, rate=0.001, decay=0.9, epsilon=10e-8, multipliers=None):
+        super().__init__(rate, multipliers)
+        self.decay = decay
+        self.epsilon = epsilon
+
+    def state_size(self):
+        # h と作業用の配列
+        return 2
+
+    def element_rate(self, h, state, ap=np):
+        if state is None:
+            return h
+        return h / (ap.sqrt(state[0]) + self.epsilon)
+
+    def step(self, g, state, rate, xp=np):
+        h, work = state
+        xp.multiply(g, g, out=work)
+        work *= 1.0 - self.decay
+        h *= self.decay
+        h += work
+        xp.sqrt(h, out=work)
+        work += self.epsilon
+        g /= work
+        g *= rate
+
+
+class Adam(Stateful):
+    """
+    Adam.
+    m = β1 m + (1 - β1) ∂E/∂W
+    v = β2 v + (1 - β2) (∂E/∂W)^2
+    とし、α m^ / (√v^ + ε) を修正量とします. (m^ = m/(1 - β1^t), v^ = v/(1 - β2^t) は初期値 0 の偏りの補正)
+    """
+
+    def __init__(self, rate=0.001, beta1=0.9, beta2=0.999, epsilon=10e-8, multipliers=None):
+        super().__init__(rate, multipliers)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+
+    def state_size(self):
+        # m, v と作業用の配列
+        return 3
+
+    def element_rate(self, h, state, ap=np):
+        # m^ に掛かる係数 α / (√v^ + ε)
+        if state is None:
+            return h
+        t = max(self.cnt, 1)
+        return h / (ap.sqrt(state[1] / (1.0 - self.beta2 ** t)) + self.epsilon)
+
+    def step(self, g, state, rate, xp=np):
+        m, v, work = state
+        xp.multiply(g, g, out=work)
+
+        m *= self.beta1
+        g *= 1.0 - self.beta1
+        m += g
+
+        v *= self.beta2
+        work *= 1.0 - self.beta2
+        v += work
+
+        # √v^ + ε
+        xp.sqrt(v, out=work)
+        work /= math.sqrt(1.0 - self.beta2 ** self.cnt)
+        work += self.epsilon
+
+        # α m^ / (√v^ + ε)
+        xp.divide(m, work, out=g)
+        g *= rate / (1.0 - self.beta1 ** self.cnt)
@@ -0,0 +1,403 @@
+import itertools
+import os
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+import numpy as np
+from ai_chan.train import NetTrainer
+
+# BLAS (OpenBLAS, MKL など) のスレッド数を決める環境変数
+BLAS_THREAD_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                         "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+
+def orthogonal_array(levels):
+    """
+    強さ2の直交表を作ります.
+    p を素数とすると、p^2 行の表に p+1 列までの因子を割り付けられます.
+    (行 (a, b) の列は a, b, b+a, b+2a, ..., b+(p-1)a を p で割った余り)
+    どの2列を取っても、水準の組み合わせがすべて同じ回数ずつ現れます.
+    水準数が p より少ない因子は、余りを水準数で割った余りを水準にします. (ダミー水準法)
+    :param levels: 因子ごとの水準数のリスト
+    :return: 実験ごとの、因子の水準番号のリスト (実験数 × 因子数)
+    """
+    factors = len(levels)
+    p = _next_prime(max([2] + list(levels)))
+    while p + 1 < factors:
+        p = _next_prime(p + 1)
+
+    rows = []
+    for a in range(0, p):
+        for b in range(0, p):
+            columns = [a] + [(b + k * a) % p for k in range(0, p)]
+            rows.append([columns[f] % levels[f] for f in range(0, factors)])
+    return rows
+
+
+def _next_prime(n):
+    """
+    n 以上の最小の素数を返します
+    """
+    while any([n % k == 0 for k in range(2, int(np.sqrt(n)) + 1)]):
+        n += 1
+    return n
+
+
+class Trial:
+    """
+    1回の実験 (あるハイパーパラメータの組み合わせでの学習) の結果
+    """
+
+    def __init__(self, index, params, levels, seed):
+        """
+        コンストラクタ
+        :param index: 実験番号
+        :param params: ハイパーパラメータ名 → 値 の dict
+        :param levels: ハイパーパラメータ名 → 水準の番号 の dict
+        :param seed: この実験の乱数の種
+        """
+        self.index = index
+        self.params = params
+        self.levels = levels
+        self.seed = seed
+        # 最小エラー (評価用データ)
+        self.error = None
+        # 評価誤差の推移
+        self.gx = []
+        self.ge = []
+        # 早期終了した学習回数
+        self.stop_iteration = None
+        # 学習回数
+        self.iteration = 0
+        # 学習にかかった時間 (秒)
+        self.elapsed = 0.0
+        # 逐次半減法で、何段目まで学習したか
+        self.rung = 0
+
+
+# ワーカープロセスごとに1度だけ受け取る学習データ
+_worker_data = None
+# threadpoolctl が無いことを、このプロセスで警告したか
+_warned_threadpoolctl = False
+
+
+def _init_worker(blas_threads, x, d):
+    """
+    ワーカープロセスの初期化.
+    BLAS のスレッド数を blas_threads に制限し、学習データを受け取ります.
+    """
+    global _worker_data, _warned_threadpoolctl
+    _worker_data = (x, d)
+    if blas_threads is None:
+        return
+    # すでに読み込まれている BLAS は、threadpoolctl があれば制限する (環境変数は読み込み前にしか効かない)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(blas_threads)
+    except ImportError:
+        # fork したワーカーは親の BLAS を引き継ぐので、制限できずに CPU を取り合うかもしれない (プロセスごとに1度だけ警告する)
+        if not _warned_threadpoolctl:
+            _warned_threadpoolctl = True
+            warnings.warn("threadpoolctl is not installed; the already loaded BLAS may use more than "
+                          "blas_threads={} threads (pip install threadpoolctl)".format(blas_threads), RuntimeWarning)
+
+
+def _run_trial(factory, trial, loop, divide, train_options):
+    """
+    1回の実験を行います. (ワーカープロセスで実行します)
+    """
+    trial, trainer = _resume_trial(factory, trial, None, loop, divide, train_options)
+    return trial
+
+
+def _resume_trial(factory, trial, trainer, loop, divide, train_options):
+    """
+    実験の学習を loop 回行います. (ワーカープロセスで実行します)
+    trainer が None であれば、ネットワークを作って最初から学習します.
+    trainer があれば、その続きから学習します.
+    trainer は呼び出し元に送り返すので、学習データは外しておきます. (ワーカーで付け直します)
+    """
+    x, d = _worker_data
+
+    start = time.perf_counter()
+    if trainer is None:
+        np.random.seed(trial.seed)
+        trainer = NetTrainer(factory(trial.params), x, d, divide=divide)
+    else:
+        _attach_data(trainer, x, d)
+    trial.error = trainer.train(loop, **train_options)
+    trial.elapsed += time.perf_counter() - start
+
+    trial.iteration = trainer.iteration
+    trial.gx = trainer.gx.copy()
+    trial.ge = trainer.ge.copy()
+    trial.stop_iteration = trainer.stop_iteration
+
+    trainer.x = None
+    trainer.d = None
+    trainer.prefix_x = None
+    return trial, trainer
+
+
+def _attach_data(trainer, x, d):
+    """
+    学習データを外した学習器に、学習データを分割して付け直します.
+    (固定した層の出力は、次の学習のときに求め直します)
+    """
+    trainer.x = np.hsplit(x, trainer.divide)
+    trainer.d = np.hsplit(d, trainer.divide)
+    trainer.prefix_x = None
+
+
+class HyperTrainer:
+    """
+    ハイパーパラメータの検証を行います.
+    直交表でハイパーパラメータの組み合わせ (実験) を作り、実験ごとにネットワークを作って NetTrainer で学習し、
+    評価誤差を比較します.
+    実験はプロセスプールで並列に実行し、終わった順に結果を返します.
+    """
+
+    def __init__(self, factory, space, x, d, loop=1000, divide=5, design="orthogonal",
+                 max_workers=None, blas_threads=1, seed=0, mp_context=None, **train_options):
+        """
+        コンストラクタ
+        :param factory: ハイパーパラメータの dict からネットワークを作る関数.
+                        ワーカープロセスに渡すので、モジュールの関数にしてください (lambda は使えません)
+        :param space: ハイパーパラメータ名 → 水準 (値) のリスト の dict
+        :param x: 入力データ
+        :param d: 教師値
+        :param loop: 実験ごとの学習回数
+        :param divide: NetTrainer の教師データの分割数
+        :param design: 実験の作り方
+            "orthogonal" : 直交表 (すべての2因子の組み合わせを、少ない実験数で均等に調べます)
+            "grid" : 全ての組み合わせ
+        :param max_workers: ワーカープロセス数 (None=CPU数, 0=プロセスを使わずに順に実行する)
+        :param blas_threads: ワーカーごとの BLAS のスレッド数 (None=制限しない).
+                             ワーカー数 × スレッド数 が CPU数を超えないようにします
+        :param seed: 実験ごとの乱数の種を作るための種
+        :param mp_context: ProcessPoolExecutor の mp_context (None=multiprocessing の既定)
+        :param train_options: NetTrainer.train に渡すオプション (eval_every, patience など)
+        """
+        self.factory = factory
+        self.space = space
+        self.x = x
+        self.d = d
+        self.loop = loop
+        self.divide = divide
+        self.design = design
+        self.max_workers = max_workers
+        self.blas_threads = blas_threads
+        self.seed = seed
+        self.mp_context = mp_context
+        self.train_options = train_options
+        # 終わった実験の結果 (終わった順)
+        self.results = []
+
+    def experiments(self):
+        """
+        実験のリストを返します. 実験ごとに、独立した乱数の種を割り当てます
+        :return: Trial のリスト (結果はまだ空)
+        """
+        names = list(self.space.keys())
+        levels = [len(self.space[name]) for name in names]
+        if self.design == "orthogonal":
+            table = orthogonal_array(levels)
+        elif self.design == "grid":
+            table = list(itertools.product(*[range(0, n) for n in levels]))
+        else:
+            raise ValueError("unknown design: {}".format(self.design))
+
+        seeds = np.random.SeedSequence(self.seed).generate_state(len(table))
+        trials = []
+        for index, row in enumerate(table):
+            params = {name: self.space[name][level] for name, level in zip(names, row)}
+            levels = {name: level for name, level in zip(names, row)}
+            trials.append(Trial(index, params, levels, int(seeds[index])))
+        return trials
+
+    def run(self):
+        """
+        実験を行い、終わった順に結果を返します. (ジェネレータ)
+        結果は results にも追加します
+        :return: Trial
+        """
+        trials = self.experiments()
+
+        if self.max_workers == 0:
+            _init_worker(None, self.x, self.d)
+            for trial in trials:
+                trial = _run_trial(self.factory, trial, self.loop, self.divide, self.train_options)
+                self.results.append(trial)
+                yield trial
+            return
+
+        with self.pool() as pool:
+            futures = [pool.submit(_run_trial, self.factory, trial, self.loop, self.divide, self.train_options)
+                       for trial in trials]
+            for future in as_completed(futures):
+                trial = future.result()
+                self.results.append(trial)
+                yield trial
+
+    @contextmanager
+    def pool(self):
+        """
+        実験を実行するプロセスプールを作ります.
+        ワーカーは、学習データを受け取り BLAS のスレッド数を制限してから実験を行います
+        """
+        # ワーカーが起動時に BLAS を読み込むとき (spawn, forkserver) のために、環境変数でもスレッド数を制限する
+        saved = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+        if self.blas_threads is not None:
+            for name in BLAS_THREAD_VARIABLES:
+                os.environ[name] = str(self.blas_threads)
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context,
+                                     initializer=_init_worker, initargs=(self.blas_threads, self.x, self.d)) as pool:
+                yield pool
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def train(self):
+        """
+        すべての実験を行います
+        :return: 最小エラーが最も小さかった実験
+        """
+        for trial in self.run():
+            pass
+        return self.best()
+
+    def best(self):
+        """
+        終わった実験のうち、最小エラーが最も小さかった実験を返します
+        """
+        if len(self.results) == 0:
+            return None
+        return min(self.results, key=lambda trial: trial.error)
+
+    def effects(self):
+        """
+        因子ごとの効果 (要因効果) を返します.
+        ハイパーパラメータごとに、各水準の実験の最小エラーの平均を求めます.
+        直交表の実験では、他の因子の影響が均等に混ざるので、平均の小さい水準がよい水準です.
+        :return: ハイパーパラメータ名 → 水準の番号ごとの平均エラーのリスト の dict
+        """
+        effects = {}
+        for name, values in self.space.items():
+            means = []
+            for level in range(0, len(values)):
+                errors = [trial.error for trial in self.results if trial.levels[name] == level]
+                means.append(float(np.mean(errors)) if len(errors) > 0 else None)
+            effects[name] = means
+        return effects
+
+
+class SuccessiveHalving(HyperTrainer):
+    """
+    逐次半減法 (Successive Halving) でハイパーパラメータを検証します.
+    すべての実験を少ない回数 (min_loop) だけ学習し、評価誤差 (これまでの最小エラー) の悪い方から
+    (1 - 1/reduction) を打ち切ります. 残った実験は、学習の続きから reduction 倍の回数まで学習し、
+    これを実験が1つになるか、max_loop 回に達するまで繰り返します.
+    打ち切った実験には学習時間を使わないので、同じ時間でより多くの組み合わせを調べられます.
+    """
+
+    def __init__(self, factory, space, x, d, min_loop=100, max_loop=None, reduction=2, divide=5, design="grid",
+                 max_workers=None, blas_threads=1, seed=0, mp_context=None, **train_options):
+        """
+        コンストラクタ
+        :param min_loop: 1段目の学習回数
+        :param max_loop: 1つの実験の最大の学習回数 (None=制限しない)
+        :param reduction: 1段ごとに、実験を 1/reduction に減らし、学習回数を reduction 倍にします
+        その他の引数は HyperTrainer と同じです. (design の既定は、全ての組み合わせ "grid" です)
+        """
+        super().__init__(factory, space, x, d, loop=min_loop, divide=divide, design=design,
+                         max_workers=max_workers, blas_threads=blas_threads, seed=seed, mp_context=mp_context,
+                         **train_options)
+        self.min_loop = min_loop
+        self.max_loop = max_loop
+        self.reduction = reduction
+        # 最後の段まで残った実験
+        self.survivors = []
+        # 最後の段まで残った実験の学習器 (実験の番号 → NetTrainer. 学習の続きや、W,b の取り出しに使えます)
+        self.trainers = {}
+
+    def run(self):
+        """
+        逐次半減法で実験を行い、各段で実験の学習が終わった順に結果を返します. (ジェネレータ)
+        同じ実験が、段ごとに何度も返ります. (Trial.rung が段の番号です)
+        results には、打ち切った段または最後の段での、各実験の結果が入ります
+        :return: Trial
+        """
+        trials = self.experiments()
+        trainers = {trial.index: None for trial in trials}
+        finished = {}
+
+        with self.__executor() as submit:
+            rung = 0
+            total = self.min_loop
+            while True:
+                # 残った実験を、通算 total 回まで学習する
+                futures = [submit(_resume_trial, self.factory, trial, trainers[trial.index],
+                                  total - trial.iteration, self.divide, self.train_options) for trial in trials]
+                trials = []
+                for future in as_completed(futures):
+                    trial, trainer = future.result()
+                    trial.rung = rung
+                    trainers[trial.index] = trainer
+                    finished[trial.index] = trial
+                    trials.append(trial)
+                    yield trial
+
+                next_total = total * self.reduction
+                if len(trials) <= 1 or (self.max_loop is not None and total >= self.max_loop):
+                    break
+
+                # 評価誤差の良い方から 1/reduction を残し、残りは打ち切る (学習器も捨てる)
+                trials.sort(key=lambda trial: trial.error)
+                keep = max(1, len(trials) // self.reduction)
+                for trial in trials[keep:]:
+                    trainers[trial.index] = None
+                trials = trials[0:keep]
+
+                rung += 1
+                total = next_total if self.max_loop is None else min(next_total, self.max_loop)
+
+        self.survivors = sorted(trials, key=lambda trial: trial.error)
+        self.results = [finished[index] for index in sorted(finished.keys())]
+        self.trainers = {trial.index: trainers[trial.index] for trial in self.survivors}
+        # ワーカーから返った学習器は学習データを外してあるので、続きから学習できるように付け直す
+        for trainer in self.trainers.values():
+            _attach_data(trainer, self.x, self.d)
+
+    @contextmanager
+    def __executor(self):
+        """
+        関数をワーカー (またはこのプロセス) で実行して future を返す関数を作ります
+        """
+        if self.max_workers == 0:
+            _init_worker(None, self.x, self.d)
+            yield _serial_submit
+            return
+        with self.pool() as pool:
+            yield pool.submit
+
+    def best(self):
+        """
+        最後の段まで残った実験のうち、最小エラーが最も小さかった実験を返します
+        """
+        if len(self.survivors) == 0:
+            return None
+        return self.survivors[0]
+
+
+def _serial_submit(fn, *args):
+    """
+    このプロセスで関数を実行し、結果の入った Future を返します. (max_workers=0 のとき)
+    """
+    future = Future()
+    future.set_result(fn(*args))
+    return future
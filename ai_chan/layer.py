@@ -1,3 +1,4 @@
+import warnings
 import numpy as np
 from scipy import linalg
 from abc import ABCMeta, abstractmethod
@@ -5,7 +6,19 @@ from ai_chan import const
 
 
 class LayerFactory(metaclass=ABCMeta):
-    pass
+    """
+    レイヤ (W,b) を作ります.
+    create() の dtype には、ネットワークが W,b を保存する型が渡されます. (省略時は float64)
+    """
+
+    def diagonal(self):
+        """
+        作るレイヤの種類を返します.
+        0 : 通常の層. W は 出力数 × 入力数 の行列で、u = W・z + b です
+        r (>0) : 対角スケール層. W は 出力数 (= r × 入力数) × 1 の列ベクトルで、
+                 入力 z を縦に r 回並べたものに要素ごとに掛けます. u = W * [z; z; ...] + b
+        """
+        return 0
 
 
 class PreLayerFactory(LayerFactory):
@@ -14,7 +27,7 @@ class PreLayerFactory(LayerFactory):
     教師データの統計処理を行うレイヤを作ります.
     """
     @abstractmethod
-    def create(self, x):
+    def create(self, x, dtype=None):
         pass
 
 
@@ -23,7 +36,7 @@ class MidLayerFactory(LayerFactory):
     中間層及び出力層のレイヤを作ります
     """
     @abstractmethod
-    def create(self, in_size, out_size):
+    def create(self, in_size, out_size, dtype=None):
         pass
 
 
@@ -33,78 +46,96 @@ class OutLayerFactory(LayerFactory):
     出力層の初期値に、統計処理で求めたパラメータを設定します
     """
     @abstractmethod
-    def create(self, x, y):
+    def create(self, x, y, dtype=None):
         pass
 
 
 class Seq(MidLayerFactory):
 
-    def create(self, in_size, out_size):
+    def create(self, in_size, out_size, dtype=None):
         """
          1レイヤ分をシーケンス値で初期化します.
         順伝搬・逆伝搬の検証用に使います
         :param in_size: 入力サイズ
         :param out_size: 出力サイズ
+        :param dtype: W,b の型
         :return w: 重み行列
         :return b: バイアス
         """
-        w = np.array(range(0, out_size * in_size)).reshape(out_size, in_size)
-        b = np.array(range(0, out_size)).reshape(1, out_size).T
+        dtype = float if dtype is None else dtype
+        w = np.array(range(0, out_size * in_size), dtype=dtype).reshape(out_size, in_size)
+        b = np.array(range(0, out_size), dtype=dtype).reshape(1, out_size).T
         return w, b
 
 
 class Random(MidLayerFactory):
 
-    def create(self, in_size, out_size):
+    def create(self, in_size, out_size, dtype=None):
         """
          1レイヤ分をランダム(平均0, 分散1)に初期化します.
         :param in_size: 入力サイズ
         :param out_size: 出力サイズ
+        :param dtype: W,b の型
         :return w: 重み行列
         :return b: バイアス
         """
         w = np.random.normal(0, 1, (out_size, in_size))
         b = np.random.normal(0, 1, (1, out_size)).T
 
-        return w, b
+        return _astype(w, b, dtype)
 
 
 class Xavier(MidLayerFactory):
 
-    def create(self, in_size, out_size):
+    def create(self, in_size, out_size, dtype=None):
         """
          1レイヤ分をランダム(平均0, 分散√in_size)に初期化します.
          各層の出力が、平均0 分散1 になるような初期ネットワークを作成します.
         :param in_size: 入力サイズ
         :param out_size: 出力サイズ
+        :param dtype: W,b の型
         :return w: 重み行列
         :return b: バイアス
         """
         w = np.random.normal(0, np.sqrt(in_size), (out_size, in_size))
         b = np.random.normal(0, np.sqrt(in_size), (1, out_size)).T
-        return w, b
+        return _astype(w, b, dtype)
 
 
 class He(MidLayerFactory):
 
-    def create(self, in_size, out_size):
+    def create(self, in_size, out_size, dtype=None):
         """
          1レイヤ分をランダム(平均0, 分散(√(in_size/2)に初期化します.
          各層の出力が、平均0 分散2 になるような初期ネットワークを作成します.
          ReLuでは、半分(x<0)が0になるので、有効な部分(0≧x)の分散を2倍する.
         :param in_size: 入力サイズ
         :param out_size: 出力サイズ
+        :param dtype: W,b の型
         :return w: 重み行列
         :return b: バイアス
         """
         w = np.random.normal(0, np.sqrt(in_size/2), (out_size, in_size))
         b = np.random.normal(0, np.sqrt(in_size/2), (1, out_size)).T
-        return w, b
+        return _astype(w, b, dtype)
 
 
 class Normalize(PreLayerFactory):
 
-    def create(self, x):
+    def __init__(self, diagonal=False):
+        """
+        コンストラクタ
+        :param diagonal: True=対角スケール層を作ります.
+                         W を 2n×n の対角行列 (ほとんどが0) ではなく、2n×1 の列ベクトルで持ち、
+                         入力の標準化を O(n^2) の行列積ではなく O(n) の要素ごとの積で行います.
+                         (学習しても、対角成分以外は 0 のままです)
+        """
+        self.diagonal_scale = diagonal
+
+    def diagonal(self):
+        return 2 if self.diagonal_scale else 0
+
+    def create(self, x=None, dtype=None, chunks=None):
         """
         入力データを標準化スコアに変換するレイヤを作ります.
         標準化スコア(n,i) = (x(n,i) - avr_x(n) / σ(n) = x(n,i)/σ(n) - avr_x(n)/σ(n)
@@ -119,58 +150,147 @@ class Normalize(PreLayerFactory):
         (ReLuは0以下を0に丸める活性化関数なので、標準化スコアと標準化スコアの-1倍
         を出力すれば、そのどちらかが次の層に渡ることになる)
 
+        平均・分散は、データを1度だけ読みながら求めます. (Welford / Chan の方法)
+        x の代わりに chunks にデータの塊 (特徴数 × データ数 の配列) のイテラブルを渡すと、
+        全データを1つの配列にしなくても、塊ごとに読んで求められます.
+
         ※ 計算上 分散σ(n) が、非常に小さくなるのを防ぐために σ(n) には 10e-7 を加えています。
-        :param x: 入力データ
-        :param y: 期待出力
-        :return w: 重み行列
+        :param x: 入力データ (特徴数 × データ数 の配列、または np.asarray で配列にできるもの)
+        :param dtype: W,b の型 (平均・分散を求めてから変換します)
+        :param chunks: x の代わりに渡す、入力データの塊のイテラブル (x と chunks のどちらか一方を指定します)
+        :return w: 重み行列 (diagonal=True のときは 2n×1 の列ベクトル)
         :return b: バイアス
         """
-
-        sigma = np.sqrt(np.var(x, axis=1) ** 2 + const.FLT16_EPSILON)
-        average = np.mean(x, axis=1)
-
-        # 対角成分が sigma[i] な対角行列を作ります(対角成分以外0)
-        w = np.diag(1.0 / sigma)
-        w = np.vstack((w, -1.0 * w))
+        if (x is None) == (chunks is None):
+            raise ValueError("specify either x or chunks")
+        average, var = _moments([x] if chunks is None else chunks)
+        sigma = np.sqrt(var ** 2 + const.FLT16_EPSILON)
+
+        if self.diagonal_scale:
+            # 対角成分だけを、2n×1 の列ベクトルで持つ
+            w = np.concatenate((1.0 / sigma, -1.0 / sigma)).reshape(-1, 1)
+        else:
+            # 対角成分が sigma[i] な対角行列を作ります(対角成分以外0)
+            w = np.diag(1.0 / sigma)
+            w = np.vstack((w, -1.0 * w))
         # b[i] = -average[i]/sigma[i] なバイアスベクトルb(N行1列)を作ります
         b = np.array([- average / sigma]).T
         b = np.vstack((b, -1.0 * b))
 
-        return w, b
+        return _astype(w, b, dtype)
+
+
+def _moments(chunks):
+    """
+    データの塊を1つずつ読みながら、特徴ごとの平均と分散 (母分散) を求めます.
+    塊ごとの平均と偏差平方和を、Chan らの方法で合わせていきます. (塊が1件ずつなら Welford の方法と同じです)
+    :param chunks: 特徴数 × データ数 の配列のイテラブル
+    :return: 平均, 分散
+    """
+    count = 0
+    mean = None
+    m2 = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        n = chunk.shape[1]
+        if n == 0:
+            continue
+        chunk_mean = np.mean(chunk, axis=1)
+        chunk_m2 = np.sum(np.square(chunk - chunk_mean[:, np.newaxis]), axis=1)
+        if mean is None:
+            count, mean, m2 = n, chunk_mean, chunk_m2
+            continue
+
+        total = count + n
+        delta = chunk_mean - mean
+        mean = mean + delta * (n / total)
+        m2 = m2 + chunk_m2 + np.square(delta) * (count * n / total)
+        count = total
+
+    if mean is None:
+        raise ValueError("no data")
+    return mean, m2 / count
 
 
 class LeastSquare(OutLayerFactory):
+    """
+    出力層の重みに、入力と出力を線形回帰 (最小二乗法) した重みを設定します.
+    出力が複数あっても、右辺を行列にして1度だけ解きます. (計画行列 A の分解は1回です)
+    """
 
-    def create(self, x, y):
+    def __init__(self, ridge=0.0, method="lstsq", tall_ratio=10):
         """
-        出力層の重みに、回帰分析で得た重みを設定します
-        :param x: 第L-1層の出力 = 出力層(L層)の入力
-        :param y: このネットワークの出力 = 出力層(L層)の出力
-        :return: x と y を線形回帰した重み w,b
+        コンストラクタ
+        :param ridge: リッジ回帰 (Tikhonov 正則化) の係数 λ. W の二乗和 × λ を誤差に加えます (b には加えません)
+        :param method: 解き方
+            "lstsq" : A の特異値分解で解きます (scipy.linalg.lstsq)
+            "normal" : 正規方程式 (AᵀA + λI) C = AᵀY をコレスキー分解で解きます.
+                       データ数 N が特徴数よりずっと多いときに速く、分解するのは AᵀA (特徴数 × 特徴数) だけです.
+                       (AᵀA が正定値でないか、特異に近い場合は lstsq で解き直します)
+            "auto" : データ数が 特徴数 × tall_ratio 以上であれば "normal"、それ以外は "lstsq" で解きます
+        :param tall_ratio: "auto" で正規方程式を使う、データ数と特徴数の比
         """
-        A = x.T
-        A = np.hstack((A, np.ones((A.shape[0], 1))))
-        w_list = []
-        b_list = []
-
-        if 1 == np.ndim(y):
-            w, b = self.__calc_wb(A, y)
-            w_list.append(w)
-            b_list.append(b)
+        if method not in ["lstsq", "normal", "auto"]:
+            raise ValueError("unknown method: {}".format(method))
+        self.ridge = ridge
+        self.method = method
+        self.tall_ratio = tall_ratio
 
-        else :
-            for idx in range(0, y.shape[1]) :
-                w, b = self.__calc_wb(A, y[idx])
-                w_list.append(w)
-                b_list.append(b)
+    def create(self, x, y, dtype=None):
+        """
+        出力層の重みに、回帰分析で得た重みを設定します
+        :param x: 第L-1層の出力 = 出力層(L層)の入力 (特徴数 × データ数)
+        :param y: このネットワークの出力 = 出力層(L層)の出力 (出力数 × データ数. 出力が1つの場合は1次元でも構いません)
+        :param dtype: W,b の型 (回帰分析をしてから変換します)
+        :return: x と y を線形回帰した重み w (出力数 × 特徴数),b (出力数 × 1)
+        """
+        # 最後の列を 1 にした計画行列 A (データ数 × (特徴数 + 1)) と、右辺 Y (データ数 × 出力数)
+        A = np.hstack((np.asarray(x, dtype=np.float64).T, np.ones((x.shape[1], 1))))
+        Y = np.asarray(y, dtype=np.float64).reshape(-1, x.shape[1]).T
 
-        return np.array(w_list), np.array(b_list)
+        method = self.method
+        if method == "auto":
+            method = "normal" if A.shape[0] >= A.shape[1] * self.tall_ratio else "lstsq"
 
-    def __calc_wb(self, A, B):
-        C, resid, rank, sigma = linalg.lstsq(A, B)
+        C = self.__normal(A, Y) if method == "normal" else None
+        if C is None:
+            C = self.__lstsq(A, Y)
 
-        r = np.ndarray.tolist(C)
-        w = r[0:-1]
-        b = [r[-1]]
+        # C の最後の行がバイアス
+        w = C[0:-1].T
+        b = C[-1:].T
+        return _astype(w, b, dtype)
 
-        return w, b
+    def __penalty(self, size):
+        """
+        リッジ回帰の正則化行列の対角成分 (バイアスの行は 0)
+        """
+        penalty = np.full(size, float(self.ridge))
+        penalty[-1] = 0.0
+        return penalty
+
+    def __lstsq(self, A, Y):
+        if self.ridge > 0.0:
+            # min |AC - Y|^2 + λ|W|^2 は、A の下に √λ I を、Y の下に 0 を足した最小二乗問題と同じ
+            A = np.vstack((A, np.diag(np.sqrt(self.__penalty(A.shape[1])))))
+            Y = np.vstack((Y, np.zeros((A.shape[1], Y.shape[1]))))
+        C, resid, rank, sigma = linalg.lstsq(A, Y)
+        return C
+
+    def __normal(self, A, Y):
+        G = A.T @ A
+        G[np.diag_indices_from(G)] += self.__penalty(A.shape[1])
+        try:
+            # 特異に近い (条件数が大きい) 場合の警告もエラーとして扱い、lstsq で解き直す
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", linalg.LinAlgWarning)
+                return linalg.solve(G, A.T @ Y, assume_a="pos")
+        except (linalg.LinAlgError, linalg.LinAlgWarning):
+            return None
+
+
+def _astype(w, b, dtype=None):
+    """
+    w, b を dtype の配列にして返します (dtype が None か、すでに dtype であればそのまま)
+    """
+    return np.asarray(w, dtype=dtype), np.asarray(b, dtype=dtype)
@@ -0,0 +1,234 @@
+import json
+import time
+import numpy as np
+
+
+class Series:
+    """
+    1つの指標の (学習回数, 値) の列を記録します.
+    Python の list ではなく、確保済みの配列 (足りなくなったら2倍に伸ばします) に書き込むので、
+    百万回の学習でも1件あたり 16 byte (int64 + float64) で記録できます.
+    """
+
+    def __init__(self, mode="all", every=1, capacity=1024, seed=0):
+        """
+        コンストラクタ
+        :param mode: 記録の仕方
+            "all" : すべて記録します
+            "every" : every 件に1件だけ記録します (間引き)
+            "reservoir" : capacity 件だけを、全体から均等に無作為に選んで記録します (リザーバサンプリング)
+        :param every: "every" のときの間引きの間隔
+        :param capacity: 最初に確保する件数 ("reservoir" のときは記録する件数)
+        :param seed: "reservoir" のときの乱数の種 (np.random の状態は変えません)
+        """
+        if mode not in ["all", "every", "reservoir"]:
+            raise ValueError("unknown mode: {}".format(mode))
+        self.mode = mode
+        self.every = every
+        # 記録しようとした件数 (間引いたもの・選ばれなかったものを含む)
+        self.count = 0
+        self.__size = 0
+        self.__x = np.empty(capacity, dtype=np.int64)
+        self.__values = np.empty(capacity, dtype=np.float64)
+        self.__random = np.random.RandomState(seed) if mode == "reservoir" else None
+
+    def append(self, x, value):
+        """
+        1件記録します
+        :param x: 学習回数
+        :param value: 値
+        :return: True=記録した False=間引いた (選ばれなかった)
+        """
+        count = self.count
+        self.count += 1
+
+        if self.mode == "every" and count % self.every != 0:
+            return False
+
+        if self.mode == "reservoir" and self.__size == len(self.__x):
+            # count 件目を capacity / (count + 1) の確率で、無作為に選んだ1件と入れ替える
+            pos = self.__random.randint(0, count + 1)
+            if pos >= self.__size:
+                return False
+            self.__x[pos] = x
+            self.__values[pos] = value
+            return True
+
+        if self.__size == len(self.__x):
+            self.__grow()
+        self.__x[self.__size] = x
+        self.__values[self.__size] = value
+        self.__size += 1
+        return True
+
+    def __grow(self):
+        capacity = max(1, len(self.__x) * 2)
+        self.__x = _resize(self.__x, capacity)
+        self.__values = _resize(self.__values, capacity)
+
+    @property
+    def x(self):
+        """
+        記録した学習回数の配列 ("reservoir" のときは学習回数の順に並べたコピー. それ以外はビュー)
+        """
+        if self.mode == "reservoir":
+            return self.__x[0:self.__size][self.__order()]
+        return self.__x[0:self.__size]
+
+    @property
+    def values(self):
+        """
+        記録した値の配列 (x と同じ並び)
+        """
+        if self.mode == "reservoir":
+            return self.__values[0:self.__size][self.__order()]
+        return self.__values[0:self.__size]
+
+    def __order(self):
+        return np.argsort(self.__x[0:self.__size], kind="stable")
+
+    def __len__(self):
+        return self.__size
+
+
+def _resize(a, capacity):
+    """
+    a の先頭を、capacity 件の新しい配列にコピーします
+    """
+    new = np.empty(capacity, dtype=a.dtype)
+    new[0:len(a)] = a
+    return new
+
+
+class JsonlWriter:
+    """
+    記録した指標を、1件1行の JSON (JSON Lines) でファイルに追記します.
+    書き込みはバッファにためて、flush_every 件ごと、または前回から flush_seconds 秒たったとき (と close のとき) に
+    ファイルに書き出すので、学習1回ごとにシステムコールを呼びません.
+    学習中でも tail -f や read_jsonl() で途中経過を読めます. (ただし、最大 flush_every 件遅れます)
+    """
+
+    def __init__(self, path, flush_every=100, flush_seconds=1.0):
+        """
+        コンストラクタ
+        :param path: 追記するファイル
+        :param flush_every: 何件ごとにファイルに書き出すか
+        :param flush_seconds: 前回の書き出しから何秒たったら書き出すか (None の場合は、時間では書き出さない)
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.__file = open(path, "a", encoding="utf-8")
+        self.__pending = 0
+        self.__last_flush = time.perf_counter()
+
+    def write(self, name, x, value):
+        self.__file.write(json.dumps({"name": name, "x": int(x), "value": float(value)}) + "\n")
+        self.__pending += 1
+        if self.__pending >= self.flush_every:
+            self.flush()
+        elif self.flush_seconds is not None and time.perf_counter() - self.__last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        バッファにためた記録を、ファイルに書き出します
+        """
+        self.__file.flush()
+        self.__pending = 0
+        self.__last_flush = time.perf_counter()
+
+    def close(self):
+        self.flush()
+        self.__file.close()
+
+
+def read_jsonl(path):
+    """
+    JsonlWriter が書いたファイルを読みます. (書き途中の最後の行は読み飛ばします)
+    :param path: ファイル
+    :return: 指標名 → (学習回数の配列, 値の配列) の dict
+    """
+    data = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            xs, values = data.setdefault(record["name"], ([], []))
+            xs.append(record["x"])
+            values.append(record["value"])
+    return {name: (np.array(xs, dtype=np.int64), np.array(values)) for name, (xs, values) in data.items()}
+
+
+class Recorder:
+    """
+    学習中の指標を、指標名ごとの Series に記録します.
+    writer を指定すると、記録したすべての値をファイルにも書き出します. (間引いた値も書き出します)
+    """
+
+    def __init__(self, writer=None, series=None):
+        """
+        コンストラクタ
+        :param writer: 書き出し先 (JsonlWriter など. None=書き出さない)
+        :param series: 指標名 → Series の dict. 記録の仕方を変えたい指標だけ指定します
+                       (指定していない指標は、最初に記録するときに Series() で作ります)
+        """
+        self.writer = writer
+        self.series = {} if series is None else dict(series)
+
+    def record(self, name, x, value):
+        """
+        指標を1件記録します
+        :param name: 指標名
+        :param x: 学習回数
+        :param value: 値
+        """
+        self[name].append(x, value)
+        if self.writer is not None:
+            self.writer.write(name, x, value)
+
+    def __getitem__(self, name):
+        """
+        指標名の Series を返します (まだ無ければ Series() で作ります)
+        """
+        series = self.series.get(name)
+        if series is None:
+            series = Series()
+            self.series[name] = series
+        return series
+
+    def __contains__(self, name):
+        return name in self.series
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def parameter_norm(trainer):
+    """
+    NetTrainer.add_metric() に渡せる指標: W,b 全体の L2 ノルム
+    """
+    return trainer.nnet.parameter_norm()
+
+
+def profile_seconds(profiler, phase=None, layer=None, op=None):
+    """
+    NetTrainer.add_metric() に渡せる指標を作ります: プロファイラが集計した、これまでの経過時間の合計 (秒)
+    :param profiler: ネットワークに登録した profiler.Profiler
+    :param phase: 処理段階で絞り込みます (None=すべて)
+    :param layer: 層番号で絞り込みます (None=すべて)
+    :param op: 演算で絞り込みます (None=すべて)
+    :return: 指標の関数
+    """
+
+    def seconds(trainer):
+        total = 0.0
+        for (p, l, o), record in profiler.records.items():
+            if (phase is None or p == phase) and (layer is None or l == layer) and (op is None or o == op):
+                total += record.seconds
+        return total
+
+    return seconds
@@ -1,6 +1,8 @@
 from abc import ABCMeta, abstractmethod
 import numpy as np
 from ai_chan import func, grad, layer, weight, const
+from ai_chan.backend import get_backend
+from ai_chan.precision import get_precision
 
 
 class AbstractNet(metaclass=ABCMeta):
@@ -8,30 +10,66 @@ class AbstractNet(metaclass=ABCMeta):
     ニューラルネットワークの抽象クラス.
     """
 
-    def __init__(self):
+    def __init__(self, backend=None, precision=None):
         """
         コンストラクタ.
+        :param backend: 配列演算のバックエンド (backend.get_backend() に渡せるもの. 省略時は numpy)
+        :param precision: 浮動小数点の精度 (precision.get_precision() に渡せるもの. 省略時は float64)
         インスタンス変数
+        backend 配列演算のバックエンド (forward などの xp を省略したときに使うモジュール)
+        precision 浮動小数点の精度 (W,b を保存する型と、活性・微分値を計算する型)
         w 重み行列 (配列添え字と、一般的な教科書と層番号を合わせるため 第0層 にNoneを設定)
         b バイアス (配列添え字と、一般的な教科書と層番号を合わせるため 第0層 にNoneを設定)
         learning_flag W,b を更新するかのフラグ 1.0=学習する 0.0=学習しない
+        diagonal 層の種類 0=通常の層 r(>0)=対角スケール層 (入力を r 回並べて W に要素ごとに掛ける. LayerFactory.diagonal())
         f 活性化関数 (配列添え字と、一般的な教科書と層番号を合わせるため 第0層 にNoneを設定)
         learning_rate 学習率 (初期値は、学習率0.001固定)
-        u_memento 順伝搬時のuの記録用リスト (逆伝搬で使う)
+        u_memento 順伝搬時のuの記録用リスト (逆伝搬で使う. compact_memento の場合は、逆伝搬で読まない層は None)
         z_memento 順伝搬時のzの記録用リスト (逆伝搬で使う)
+        compact_memento True=逆伝搬で読まない u を記録しない (use_compact_memento で設定する)
+        checkpoint u,z を記録する層の間隔 (use_checkpoint で設定する. None=すべての層で記録する)
         d 重み減衰アルゴリズム (Weight Decay)
+        workspace_size 作業領域を使うバッチサイズ (None=作業領域を使わない)
+        workspace 順伝搬・逆伝搬の作業領域 (最初の forward で確保する)
+        predict_buffer 推論(predict)用の作業領域 (交互に使う2つの配列)
+        parameters W,b をまとめた配列 (pack_parameters で作る. None=まとめていない)
+        hooks 演算の前後に呼ぶフック (profiler.Hook) のリスト (空の場合は呼び出しをしません)
         """
+        self.backend = get_backend(backend)
+        self.precision = get_precision(precision)
         self.w = [None]
         self.b = [None]
         self.learning_flag = [None]
+        self.diagonal = [None]
         self.f: [func.ActivateFunction] = [None]
         self.g = grad.Static()
         self.u_memento = []
         self.z_memento = []
+        self.compact_memento = False
+        self.checkpoint = None
         self.d = weight.NoDecay()
+        self.workspace_size = None
+        self.workspace = None
+        self.predict_buffer = None
+        self.parameters = None
+        self.hooks = []
+
+    def add_hook(self, hook):
+        """
+        層ごと・処理段階ごとの演算の前後に呼ぶフックを登録します
+        :param hook: profiler.Hook
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """
+        登録したフックを外します
+        :param hook: profiler.Hook
+        """
+        self.hooks.remove(hook)
 
     @abstractmethod
-    def add_pre_layer(self, layer_factory, activate_function, x, fix_parameter):
+    def add_pre_layer(self, layer_factory, activate_function, x, fix_parameter, chunks):
         """
         ニューラルネットワークに (初期状態で) 統計的な前処理を行うレイヤを追加します.
         活性化関数はReLu関数になります.
@@ -40,7 +78,8 @@ class AbstractNet(metaclass=ABCMeta):
         :param x: 入力データ
         :param y: 教師値
         :param fix_parameter: この層の W,b を固定するかどうかのフラグ
-        :return: x をこの層で変換したときの出力
+        :param chunks: x の代わりに、入力データの塊のイテラブルを渡します (layer.Normalize だけが受け付けます)
+        :return: x をこの層で変換したときの出力 (chunks を渡した場合は None)
         """
         pass
 
@@ -84,17 +123,71 @@ class AbstractNet(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def forward(self, x, xp=np):
+    def use_workspace(self, batch_size):
+        """
+        バッチサイズ batch_size の順伝搬・逆伝搬・重み調整で、作業領域を使い回すようにします.
+        作業領域を使うと、forward, train_step の戻り値 (出力 y) と backward の微分値は作業領域の配列そのものになり、
+        次の forward, train_step で上書きされます. 学習の後まで値を使う場合は、呼び出し側でコピーしてください.
+        (predict の戻り値は、作業領域を使っても新しい配列です)
+        :param batch_size: 作業領域を使うバッチサイズ (None を指定すると作業領域を使わない)
+        """
+        pass
+
+    @abstractmethod
+    def use_compact_memento(self, compact=True):
+        """
+        逆伝搬で読まない u を記録しないようにします.
+        活性化関数が出力 z から微分値を求める (uses_output) 層と出力層の u は、逆伝搬で読まないので、
+        u を記録せずに z をその場で計算します (順伝搬の記録が約半分になります)
+        :param compact: True=読まない u を記録しない False=すべての層の u を記録する
+        """
+        pass
+
+    @abstractmethod
+    def use_checkpoint(self, every):
+        """
+        順伝搬で、every 層ごと (と出力層) の u,z だけを記録するようにします (gradient checkpointing).
+        逆伝搬では、記録していない層の u,z を、直前に記録した層から計算し直します.
+        順伝搬1回分ほどの計算が増える代わりに、記録は 約 L/every + every 層分 になります (every=√L で O(√L))
+        作業領域 (use_workspace) は使いません
+        :param every: 記録する層の間隔 (None を指定すると、すべての層で記録する)
+        """
+        pass
+
+    @abstractmethod
+    def frozen_prefix(self):
+        """
+        先頭から続く、W,b を固定した (learning_flag が 0.0 の) 層の数を返します.
+        逆伝搬はこの層の手前で止め、これらの層の微分値は求めません
+        """
+        pass
+
+    @abstractmethod
+    def forward(self, x, xp=None, start=0):
         """
         順伝搬
-        :param x: 入力データ
-        :param xp: numpy or cupy
+        :param x: 入力データ (start を指定した場合は、第 start 層の出力)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :param start: 第 start+1 層から順伝搬します (frozen_prefix() 以下)
+        :return: 予測値
+        """
+        pass
+
+    @abstractmethod
+    def predict(self, x, xp=None, start=0, stop=None):
+        """
+        推論 (逆伝搬のための記録を行わない順伝搬)
+        u_memento, z_memento は変更しません
+        :param x: 入力データ (start を指定した場合は、第 start 層の出力)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :param start: 第 start+1 層から順伝搬します
+        :param stop: 第 stop 層の出力を返します (省略時は出力層)
         :return: 予測値
         """
         pass
 
     @abstractmethod
-    def backward(self, d, y, xp=np):
+    def backward(self, d, y, xp=None):
         """
         逆伝搬
         :param d: 教師値
@@ -105,24 +198,88 @@ class AbstractNet(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def adjust_network(self, dEdW, dEdB, xp=np):
+    def adjust_network(self, dEdW, dEdB, xp=None):
         """
         :param xp: numpy or cupy
         :return:
         """
         pass
 
+    @abstractmethod
+    def pack_parameters(self):
+        """
+        全層の W,b を1つの連続した配列にまとめ、w[l], b[l] をそのビューにします.
+        微分値も同じ並びの配列にまとめます.
+        重みの更新・スナップショット・ノルムが、全層まとめて1回の配列演算になります
+        """
+        pass
+
+    @abstractmethod
+    def snapshot_parameters(self, out=None):
+        """
+        全層の W,b を W1, b1, W2, b2, ... の順に並べた1次元配列にコピーします
+        :param out: コピー先 (前回のスナップショットを渡すと、新しい配列を確保せずに上書きします)
+        :return: スナップショット
+        """
+        pass
+
+    @abstractmethod
+    def restore_parameters(self, snapshot):
+        """
+        snapshot_parameters で取ったスナップショットに W,b を戻します
+        :param snapshot: スナップショット
+        """
+        pass
+
+    @abstractmethod
+    def parameter_views(self, snapshot):
+        """
+        スナップショットを、層ごとの W,b のリストとして参照します (コピーしません)
+        :param snapshot: スナップショット
+        :return: 重み行列のリスト, バイアスのリスト (第0層は None)
+        """
+        pass
+
+    @abstractmethod
+    def parameter_norm(self):
+        """
+        全層の W,b を1つのベクトルとみなしたときの L2 ノルムを返します
+        """
+        pass
+
+    @abstractmethod
+    def train_step(self, x, d, xp=None, start=0):
+        """
+        順伝搬・逆伝搬・重み調整を1度に行います
+        :param x: 入力データ (start を指定した場合は、第 start 層の出力)
+        :param d: 教師値
+        :param xp: numpy or cupy
+        :param start: 第 start+1 層から順伝搬します (frozen_prefix() 以下)
+        :return: 予測値 (更新前の W,b による)
+        """
+        pass
+
 
 class SimpleNet(AbstractNet):
 
-    def add_pre_layer(self, layer_factory, activate_function=func.ReLu(), x=None, fix_parameter=False):
-        w, b = layer_factory.create(x)
-        self.w.append(w)
-        self.b.append(b)
+    def add_pre_layer(self, layer_factory, activate_function=func.ReLu(), x=None, fix_parameter=False,
+                      chunks=None):
+        if chunks is None:
+            w, b = layer_factory.create(x, dtype=self.precision.storage)
+        else:
+            w, b = layer_factory.create(x, dtype=self.precision.storage, chunks=chunks)
+        self.w.append(self.backend.asarray(w, dtype=self.precision.storage))
+        self.b.append(self.backend.asarray(b, dtype=self.precision.storage))
         self.f.append(activate_function)
         self.learning_flag.append(0.0 if fix_parameter else 1.0)
+        self.diagonal.append(layer_factory.diagonal())
+        self.__layers_changed()
 
-        u = np.dot(w, x) + b
+        # データの塊を渡した場合は、出力を求められない
+        if chunks is not None:
+            return None
+        # 入力データ x は numpy の配列 (またはそれに変換できるもの) なので、この層の出力は numpy で求める
+        u = _affine(w, b, np.asarray(x), self.diagonal[-1])
         z = activate_function.calc(u)
         return z
 
@@ -140,18 +297,31 @@ class SimpleNet(AbstractNet):
 
     def add_post_layer(self, x, y, layer_factory=layer.LeastSquare(), activate_function=func.IdentityMapping()
                       , fix_parameter=False):
-        w, b = layer_factory.create(self.forward(x), activate_function.inv(y))
-        self.w.append(w)
-        self.b.append(b)
+        z = self.backend.asnumpy(self.forward(self.backend.asarray(x)))
+        w, b = layer_factory.create(z, activate_function.inv(y), dtype=self.precision.storage)
+        self.w.append(self.backend.asarray(w, dtype=self.precision.storage))
+        self.b.append(self.backend.asarray(b, dtype=self.precision.storage))
         self.f.append(activate_function)
         self.learning_flag.append(0.0 if fix_parameter else 1.0)
+        self.diagonal.append(layer_factory.diagonal())
+        self.__layers_changed()
 
     def __append_layer(self, in_size, out_size, layer_factory, activate_function, fix_parameter):
-        w, b = layer_factory.create(in_size, out_size)
-        self.w.append(w)
-        self.b.append(b)
+        w, b = layer_factory.create(in_size, out_size, dtype=self.precision.storage)
+        self.w.append(self.backend.asarray(w, dtype=self.precision.storage))
+        self.b.append(self.backend.asarray(b, dtype=self.precision.storage))
         self.f.append(activate_function)
         self.learning_flag.append(0.0 if fix_parameter else 1.0)
+        self.diagonal.append(layer_factory.diagonal())
+        self.__layers_changed()
+
+    def __layers_changed(self):
+        """
+        層構成が変わったので、作業領域は作り直し、W,b のまとめは解除します.
+        (まとめていた W,b のビューは、そのまま使えます)
+        """
+        self.workspace = None
+        self.parameters = None
 
     def set_learning_rate(self, g):
         self.g = g
@@ -159,7 +329,48 @@ class SimpleNet(AbstractNet):
     def set_weight_decay(self, d):
         self.d = d
 
-    def forward(self, x, xp=np):
+    def use_workspace(self, batch_size):
+        self.workspace_size = batch_size
+        self.workspace = None
+
+    def use_compact_memento(self, compact=True):
+        self.compact_memento = compact
+        # 作業領域の u も、記録する層の分だけ確保し直す
+        self.workspace = None
+
+    def use_checkpoint(self, every):
+        if every is not None and every < 1:
+            raise ValueError("every must be positive: {}".format(every))
+        self.checkpoint = every
+
+    def __keeps_input(self, layer):
+        """
+        第 layer 層の u を記録するかを返します.
+        逆伝搬で u を読むのは、出力 z から微分値を求められない (uses_output でない) 活性化関数の中間層だけです
+        """
+        if not self.compact_memento:
+            return True
+        return layer < len(self.w) - 1 and not self.f[layer].uses_output
+
+    def __workspace(self, x, xp=np):
+        """
+        x の順伝搬に使える作業領域を返します.
+        作業領域を使わない設定か、x のバッチサイズが作業領域と異なる場合は None を返します
+        """
+        if self.workspace_size is None or xp.ndim(x) != 2 or x.shape[1] != self.workspace_size:
+            return None
+        if self.workspace is None:
+            store = self.parameters
+            dtype = self.precision.dtype
+            keep_u = [None] + [self.__keeps_input(l) for l in range(1, len(self.w))]
+            if store is None:
+                self.workspace = Workspace(self.w, self.b, self.workspace_size, xp=xp, dtype=dtype, keep_u=keep_u)
+            else:
+                self.workspace = Workspace(self.w, self.b, self.workspace_size, xp=xp, dtype=dtype,
+                                           dEdW=store.dEdW, dEdB=store.dEdB, keep_u=keep_u)
+        return self.workspace
+
+    def forward(self, x, xp=None, start=0):
         """
          順伝搬します.
          z(0) = x
@@ -168,86 +379,845 @@ class SimpleNet(AbstractNet):
            z(l) = func1( u(l) )
          }
          y = func2 ( z(L) )
-        :param x: 入力データ　(複数のデータを同時に投入できる)
-        :param xp: numpy or cupy
-        :return: 出力
+        W,b を固定した先頭の層の出力をとっておけば、start にその層番号を指定して、続きから順伝搬できます.
+        (固定した層の出力は毎回同じなので、順伝搬し直す必要がありません)
+        :param x: 入力データ　(複数のデータを同時に投入できる. start を指定した場合は、第 start 層の出力)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :param start: 第 start+1 層から順伝搬します (frozen_prefix() 以下)
+        :return: 出力 (作業領域を使う場合は作業領域の配列なので、次の forward で上書きされます)
         """
+        xp = self.backend.xp if xp is None else xp
+        x = self.__compute_array(x)
+        if start > self.frozen_prefix():
+            raise ValueError("start must not exceed frozen_prefix(): {}".format(start))
+
+        every = self.checkpoint
+        ws = None if every is not None else self.__workspace(x, xp=xp)
+        if ws is not None:
+            return self.__forward_workspace(x, ws, xp=xp, start=start)
 
         # uとzの記録用リストの初期化
-        self.u_memento = []
-        self.z_memento = []
+        # (第 start 層までの u, z は逆伝搬で使わないので None)
+        self.u_memento = [None] * (start + 1)
+        self.z_memento = [None] * start
 
-        # u[0] はNone
-        # z[0] は入力データ
+        # z[start] は入力データ
         z = x
-        self.u_memento.append(None)
+        self.z_memento.append(z)
 
-        for layer in range(1, len(self.w)):
-            self.z_memento.append(z)
+        hooks = self.hooks
+        last = len(self.w) - 1
+        for layer in range(start + 1, last + 1):
+            # チェックポイントの層 (every 層ごとと出力層) 以外は記録しない (逆伝搬で計算し直す)
+            stored = every is None or layer % every == 0 or layer == last
             # w・z はn行m列の行列、bはn行1列のベクトル
             # numpy の 行列計算の broadcast 規則 により
             # b が 列方向に m 個コピーされた n行m列の行列として計算される
-            u = xp.dot(self.w[layer], z)
-            u += self.b[layer]
-            self.u_memento.append(u)
-            # 活性化関数
-            z = self.f[layer].calc(u)
+            if hooks:
+                self.__pre("forward", layer, "matmul")
+            u = _affine(self.w[layer], self.b[layer], z, self.diagonal[layer], xp=xp)
+            keep = stored and self.__keeps_input(layer)
+            self.u_memento.append(u if keep else None)
+            if hooks:
+                self.__post("forward", layer, "matmul", 2 * self.w[layer].size * z.shape[-1])
+                self.__pre("forward", layer, "activation")
+            # 活性化関数 (u を記録しない場合は、u の配列に z を上書きする)
+            z = self.f[layer].calc(u, xp=xp, out=None if keep else u)
+            self.z_memento.append(z if stored else None)
+            if hooks:
+                self.__post("forward", layer, "activation", u.size)
 
         # 最終的なzは出力y
         y = z
-        self.z_memento.append(y)
 
         return y
 
-    def backward(self, d, y, xp=np):
+    def __recompute(self, l, xp=np):
+        """
+        直前のチェックポイント (z を記録した層) から第 l 層まで順伝搬し直し、u_memento, z_memento に書き込みます
+        :return: 計算し直した層番号のリスト
+        """
+        c = l
+        while self.z_memento[c] is None:
+            c -= 1
+        z = self.z_memento[c]
 
-        delta = self.f[-1].delta(d, y)
+        hooks = self.hooks
+        for layer in range(c + 1, l + 1):
+            if hooks:
+                self.__pre("recompute", layer, "matmul")
+            u = _affine(self.w[layer], self.b[layer], z, self.diagonal[layer], xp=xp)
+            keep = self.__keeps_input(layer)
+            self.u_memento[layer] = u if keep else None
+            if hooks:
+                self.__post("recompute", layer, "matmul", 2 * self.w[layer].size * z.shape[-1])
+                self.__pre("recompute", layer, "activation")
+            z = self.f[layer].calc(u, xp=xp, out=None if keep else u)
+            self.z_memento[layer] = z
+            if hooks:
+                self.__post("recompute", layer, "activation", u.size)
+        return list(range(c + 1, l + 1))
 
-        # dE/dW , dE/db の格納領域。第L層 から 第1層にむけて 逆順に登録するので
-        # 最後に 第0層の None を追加して reverse して返却する
-        dEdW = []
-        dEdB = []
+    def __forward_workspace(self, x, ws, xp=np, start=0):
+        """
+        作業領域に u, z を書き込みながら順伝搬します.
+        u_memento, z_memento は作業領域のリストそのものになります
+        """
+        if start == 0:
+            ws.z[0] = x
+            z = x
+        else:
+            # 作業領域のリストの配列は差し替えずに、第 start 層の出力をコピーする
+            z = ws.z[start]
+            xp.copyto(z, x)
+
+        hooks = self.hooks
+        for layer in range(start + 1, len(self.w)):
+            if hooks:
+                self.__pre("forward", layer, "matmul")
+            # u を記録しない層 (ws.u[layer] が None) は、z の領域に u を書いてその場で z にする
+            u = _affine(self.w[layer], self.b[layer], z, self.diagonal[layer], xp=xp,
+                        out=ws.z[layer] if ws.u[layer] is None else ws.u[layer])
+            if hooks:
+                self.__post("forward", layer, "matmul", 2 * self.w[layer].size * z.shape[-1])
+                self.__pre("forward", layer, "activation")
+            z = self.f[layer].calc(u, xp=xp, out=ws.z[layer])
+            if hooks:
+                self.__post("forward", layer, "activation", u.size)
+
+        self.u_memento = ws.u
+        self.z_memento = ws.z
+
+        return z
+
+    def predict(self, x, xp=None, start=0, stop=None):
+        """
+         逆伝搬のための u, z を記録せずに順伝搬します.
+         中間層の出力は、交互に使う2つの配列 (predict_buffer) に書き込むので、
+         層の数によらず保持するのは直前の層の出力だけです.
+         出力層 (stop を指定した場合は第 stop 層) の出力だけは新しい配列を確保して返却します.
+        :param x: 入力データ　(複数のデータを同時に投入できる. start を指定した場合は、第 start 層の出力)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :param start: 第 start+1 層から順伝搬します
+        :param stop: 第 stop 層の出力を返します (省略時は出力層. stop == start のときは x をそのまま返します)
+        :return: 出力
+        """
+        xp = self.backend.xp if xp is None else xp
+        x = self.__compute_array(x)
+        last = len(self.w) - 1 if stop is None else stop
+        batch_size = x.shape[1]
+        buffer = self.__predict_buffer(x, xp=xp)
+
+        hooks = self.hooks
+        z = x
+        for layer in range(start + 1, last + 1):
+            if hooks:
+                self.__pre("predict", layer, "matmul")
+            u = None
+            if layer < last:
+                rows = self.w[layer].shape[0]
+                # 奇数層と偶数層で、使う配列を交互に入れ替える (出力層の出力だけは、新しい配列に書き込む)
+                u = buffer[layer % 2][0:rows * batch_size].reshape(rows, batch_size)
+            u = _affine(self.w[layer], self.b[layer], z, self.diagonal[layer], xp=xp, out=u)
+            if hooks:
+                self.__post("predict", layer, "matmul", 2 * self.w[layer].size * batch_size)
+                self.__pre("predict", layer, "activation")
+            z = self.f[layer].calc(u, xp=xp, out=u)
+            if hooks:
+                self.__post("predict", layer, "activation", u.size)
+        return z
+
+    def __compute_array(self, a):
+        """
+        入力データ・教師値を、計算に使う型に変換します. (すでにその型であれば、そのまま返します)
+        """
+        if a.dtype == self.precision.dtype:
+            return a
+        return a.astype(self.precision.dtype)
+
+    def __predict_buffer(self, x, xp=np):
+        """
+        x の推論に使う2つの配列を返します.
+        足りない場合だけ、中間層の最大ユニット数 × バッチサイズ で確保し直します
+        """
+        size = x.shape[1] * max([0] + [w.shape[0] for w in self.w[1:-1]])
+        dtype = self.precision.dtype
+        buffer = self.predict_buffer
+        if buffer is None or buffer[0].size < size or buffer[0].dtype != dtype:
+            buffer = (xp.empty(size, dtype=dtype), xp.empty(size, dtype=dtype))
+            self.predict_buffer = buffer
+        return buffer
+
+    def backward(self, d, y, xp=None):
+        xp = self.backend.xp if xp is None else xp
+        ws = self.__active_workspace()
+
+        # dE/dW , dE/db の格納領域 (第0層は None)
+        dEdW = [None] * len(self.w)
+        dEdB = [None] * len(self.w)
+
+        for l, gw, gb in self.__backprop(d, y, ws, xp=xp):
+            dEdW[l] = gw
+            dEdB[l] = gb
+
+        # (作業領域を使う場合も、固定した先頭の層の微分値は求めていないので None のまま)
+        return dEdW, dEdB
+
+    def frozen_prefix(self):
+        prefix = 0
+        for l in range(1, len(self.w)):
+            if self.learning_flag[l] != 0.0:
+                break
+            prefix = l
+        return prefix
+
+    def __active_workspace(self):
+        """
+        直前の forward が作業領域を使っていれば、その作業領域を返します
+        """
+        ws = self.workspace
+        if ws is None or self.z_memento is not ws.z:
+            return None
+        return ws
+
+    def __backprop(self, d, y, ws, xp=np):
+        """
+        逆伝搬のジェネレータ.
+        第L層から第1層にむけて (層番号 l, ∂E/∂W(l), ∂E/∂b(l)) を順に返します.
+        ただし、W,b を固定した先頭の層 (frozen_prefix()) の微分値は求めず、その手前で逆伝搬を止めます.
+        ∂E/∂W(l) を返す時点で δ(l-1) は求め終わっているので、受け取った側で W(l) を更新しても構いません.
+        作業領域 ws があれば δ と微分値を作業領域に書き込みます.
+        W,b をまとめている (pack_parameters) 場合は、微分値をまとめた配列に書き込みます.
+        """
+        store = self.parameters
+        out_w = ws.dEdW if ws is not None else None if store is None else store.dEdW
+        out_b = ws.dEdB if ws is not None else None if store is None else store.dEdB
+
+        hooks = self.hooks
+        last = len(self.w) - 1
+        prefix = self.frozen_prefix()
+        # クラス番号の教師値 (整数の配列) は、そのまま渡す
+        d = d if func.is_label(d) else self.__compute_array(d)
+        if hooks:
+            self.__pre("backward", last, "delta")
+        delta = self.f[last].delta(d, y, out=None if ws is None else ws.delta[last], xp=xp)
+        if hooks:
+            self.__post("backward", last, "delta", delta.size)
 
         # delta の列数が、バッチサイズ
         batch_size = float(delta.shape[1])
+        # チェックポイントから計算し直した層 (その層の逆伝搬が済んだら捨てる)
+        recomputed = []
 
-        for l in range(len(self.w) - 1, 1, -1):
+        for l in range(last, prefix, -1):
+            if self.z_memento[l - 1] is None:
+                recomputed = self.__recompute(l - 1, xp=xp)
+            if hooks:
+                self.__pre("backward", l, "matmul")
             # dEdW = δ[l] (z[l-1].T) の各要素をバッチサイズで割ったもの
             # dEdB = δ[l] の各行平均
-            dEdW.append(xp.dot(delta, self.z_memento[l - 1].T) / batch_size)
-            dEdB.append(xp.mean(delta, axis=1, keepdims=True))
+            repeat = self.diagonal[l]
+            work = None if ws is None else ws.scratch(delta)
+            if repeat:
+                dEdW = _diagonal_grad(delta, self.z_memento[l - 1], repeat, xp=xp,
+                                      out=None if out_w is None else out_w[l], work=work)
+            else:
+                dEdW = xp.matmul(delta, self.z_memento[l - 1].T, out=None if out_w is None else out_w[l])
+            dEdW /= batch_size
+            dEdB = xp.mean(delta, axis=1, keepdims=True, out=None if out_b is None else out_b[l])
 
-            # 誤差逆伝搬 δ[l-1] = δ[l] W[l] f'(u[l-1])
-            delta = self.f[l - 1].differential(self.u_memento[l - 1]) * xp.dot(self.w[l].T, delta)
+            # 誤差逆伝搬 δ[l-1] = δ[l] W[l] f'(u[l-1]) (固定した層の直後の層 (layer=1) の誤差逆伝搬はしない)
+            if l > prefix + 1:
+                if repeat:
+                    prev = _diagonal_backprop(self.w[l], delta, repeat, xp=xp,
+                                              out=None if ws is None else ws.delta[l - 1], work=work)
+                else:
+                    prev = xp.matmul(self.w[l].T, delta, out=None if ws is None else ws.delta[l - 1])
+                if hooks:
+                    self.__post("backward", l, "matmul", 4 * self.w[l].size * delta.shape[1] + delta.size)
+                    self.__pre("backward", l, "differential")
+                prev *= _differential(self.f[l - 1], self.u_memento[l - 1], self.z_memento[l - 1], xp=xp,
+                                      out=None if ws is None else ws.scratch(prev))
+                if hooks:
+                    self.__post("backward", l, "differential", 2 * prev.size)
+                delta = prev
+            elif hooks:
+                self.__post("backward", l, "matmul", 2 * self.w[l].size * delta.shape[1] + delta.size)
 
-        # layer=1 の微分値 (layer=1の誤差逆伝搬はしないので for-loop から出してある)
-        dEdW.append(xp.dot(delta, self.z_memento[0].T) / batch_size)
-        dEdB.append(xp.mean(delta, axis=1, keepdims=True))
+            if l - 1 in recomputed:
+                self.u_memento[l - 1] = None
+                self.z_memento[l - 1] = None
 
-        # 第0層(入力層)のダミー微分値
-        dEdW.append(None)
-        dEdB.append(None)
+            yield l, dEdW, dEdB
 
-        # 第L層 から 第0層にむけて 逆順に登録したので、反転して返却
-        dEdW.reverse()
-        dEdB.reverse()
+    def adjust_network(self, dEdW, dEdB, ap=None):
+        # ネットワークの重みの調整
+        ap = self.backend.xp if ap is None else ap
+        store = self.parameters
+        ws = self.workspace
+        # backward が作業領域に書いた微分値であれば、その領域を作業に使って w,b をその場で更新する
+        in_place = ws is not None and dEdW[-1] is ws.dEdW[-1]
 
-        return dEdW, dEdB
+        self.g.next_step()
 
-    def adjust_network(self, dEdW, dEdB, ap=np):
-        # ネットワークの重みの調整
-        hw, hb = self.g.eta(dEdW, dEdB)
-        dRdW, dRdB = self.d.r(self.w, self.b)
+        # W,b を固定した先頭の層は、backward が微分値を求めていないので調整しない
+        prefix = self.frozen_prefix()
+        if store is not None:
+            # まとめた配列は全層を1度に更新するので、固定した層の修正量は 0 にしておく (前回の ε 丸めの作業で壊れている)
+            for idx in range(1, prefix + 1):
+                store.dEdW[idx].fill(0)
+                store.dEdB[idx].fill(0)
+        for idx in range(prefix + 1, len(self.w)):
+            if store is not None:
+                # W,b をまとめている場合は、まとめた微分値の配列を作業に使う
+                gw = store.dEdW[idx]
+                gb = store.dEdB[idx]
+                # backward がまとめた配列に書いた微分値であれば、コピーは不要
+                if dEdW[idx] is not gw:
+                    ap.copyto(gw, dEdW[idx])
+                if dEdB[idx] is not gb:
+                    ap.copyto(gb, dEdB[idx])
+            elif in_place:
+                gw = dEdW[idx]
+                gb = dEdB[idx]
+            else:
+                gw = dEdW[idx].copy()
+                gb = dEdB[idx].copy()
 
-        for idx in range(1, len(self.w)):
-            w = self.w[idx]
-            b = self.b[idx]
+            # 正則化項は、微分値にその場で足し込む (W,b はまだ更新前)
+            gw, gb = self.__fold_update(gw, gb, idx, ws, xp=ap)
+
+            if store is not None:
+                if self.learning_flag[idx] != 1.0:
+                    gw *= self.learning_flag[idx]
+                    gb *= self.learning_flag[idx]
+            else:
+                self.__apply(gw, gb, idx, ws if in_place else None, xp=ap)
+
+        if store is not None:
+            # W,b の更新と ε 丸めは、まとめた配列に対して1度に行う (層番号 0 = 全層)
+            if self.hooks:
+                self.__pre("adjust", 0, "clamp")
+            store.flat -= store.grad
+            _clamp(store.flat, store.grad, store.mask(store.flat), ap, epsilon=self.precision.epsilon())
+            if self.hooks:
+                self.__post("adjust", 0, "clamp", 5 * store.flat.size)
+
+    def __fold_update(self, gw, gb, l, ws, xp=np):
+        """
+        第 l 層の微分値 gw, gb に正則化項を足し込み、学習係数を掛けて修正量にします
+        """
+        hooks = self.hooks
+        if hooks:
+            self.__pre("adjust", l, "decay")
+        self.d.fold(self.w[l], gw, work=None if ws is None else ws.scratch(gw), xp=xp)
+        self.d.fold(self.b[l], gb, work=None if ws is None else ws.scratch(gb), xp=xp)
+        if hooks:
+            self.__post("adjust", l, "decay", 2 * (gw.size + gb.size))
+            self.__pre("adjust", l, "update")
+        gw, gb = self.g.update(gw, gb, l, xp=xp)
+        if hooks:
+            self.__post("adjust", l, "update", gw.size + gb.size)
+        return gw, gb
 
+    def __apply(self, gw, gb, l, ws, xp=np):
+        """
+        第 l 層の W,b から修正量 gw, gb を引きます.
+        gw, gb は ε 丸めの作業に使うので、呼び出し後は値が壊れます
+        """
+        store = self.parameters
+        hooks = self.hooks
+        if hooks:
+            self.__pre("adjust", l, "clamp")
+        for p, grad in [(self.w[l], gw), (self.b[l], gb)]:
             # 微分値が正 → Wijを大きくしたら誤差Eが大きくなるんでWijを少し小さくする
             # 微分値が負 → Wjiを大きくしたら誤差Eが小さくなるんでWijを少し大きくする
-            w -= self.learning_flag[idx] * hw[idx] * (dEdW[idx] + dRdW[idx])
-            b -= self.learning_flag[idx] * hb[idx] * (dEdB[idx] + dRdB[idx])
-
+            grad *= self.learning_flag[l]
+            p -= grad
             # 重みが「計算機のε」未満にならないようにする
-            self.w[idx] = ap.where(ap.abs(w) < const.FLT16_EPSILON, ap.sign(w) * const.FLT16_EPSILON, w)
-            self.b[idx] = ap.where(ap.abs(b) < const.FLT16_EPSILON, ap.sign(b) * const.FLT16_EPSILON, b)
+            mask = ws.mask(p) if ws is not None else None if store is None else store.mask(p)
+            _clamp(p, grad, mask, xp, epsilon=self.precision.epsilon())
+        if hooks:
+            self.__post("adjust", l, "clamp", 6 * (gw.size + gb.size))
+
+    def __pre(self, phase, layer, op):
+        for hook in self.hooks:
+            hook.pre(self, phase, layer, op)
+
+    def __post(self, phase, layer, op, flops):
+        # pre と入れ子になるように、後に登録したフックから呼ぶ
+        for hook in reversed(self.hooks):
+            hook.post(self, phase, layer, op, flops)
+
+    def train_step(self, x, d, xp=None, start=0):
+        """
+         順伝搬・逆伝搬・重み減衰・重み調整を1度に行います.
+         第L層から第1層にむけて、各層の ∂E/∂W, ∂E/∂b が求まった時点で、その層の W,b を更新します.
+         全層分の微分値・学習係数を作らず、正則化項は微分値に直接足し込むので、
+         1ステップで使うメモリは1層分の微分値程度です.
+         (作業領域を使う場合は、微分値も作業領域に書き込みます)
+         forward → backward → adjust_network と同じ結果になります.
+        :param x: 入力データ (start を指定した場合は、第 start 層の出力)
+        :param d: 教師値
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :param start: 第 start+1 層から順伝搬します (frozen_prefix() 以下)
+        :return: 予測値 (更新前の W,b による. 作業領域を使う場合は作業領域の配列なので、次の学習で上書きされます)
+        """
+        xp = self.backend.xp if xp is None else xp
+        y = self.forward(x, xp=xp, start=start)
+        ws = self.__active_workspace()
+
+        self.g.next_step()
+        for l, dEdW, dEdB in self.__backprop(d, y, ws, xp=xp):
+            # 正則化項は、その層の微分値にその場で足し込む
+            dEdW, dEdB = self.__fold_update(dEdW, dEdB, l, ws, xp=xp)
+            self.__apply(dEdW, dEdB, l, ws, xp=xp)
+
+        return y
+
+    def pack_parameters(self):
+        self.parameters = ParameterStore(self.w, self.b, xp=self.backend.xp, grad_dtype=self.precision.dtype)
+        self.w = self.parameters.w
+        self.b = self.parameters.b
+        # 作業領域の微分値も、まとめた配列のビューに作り直す
+        self.workspace = None
+
+    def snapshot_parameters(self, out=None):
+        xp = self.backend.xp
+        store = self.parameters
+        if store is not None:
+            if out is None:
+                return store.flat.copy()
+            xp.copyto(out, store.flat)
+            return out
+
+        if out is None:
+            out = xp.empty(_parameter_size(self.w, self.b), dtype=xp.result_type(*self.w[1:], *self.b[1:]))
+        w, b = _parameter_views(out, self.w, self.b)
+        for l in range(1, len(self.w)):
+            xp.copyto(w[l], self.w[l])
+            xp.copyto(b[l], self.b[l])
+        return out
+
+    def restore_parameters(self, snapshot):
+        xp = self.backend.xp
+        store = self.parameters
+        if store is not None:
+            xp.copyto(store.flat, snapshot)
+            return
+
+        w, b = _parameter_views(snapshot, self.w, self.b)
+        for l in range(1, len(self.w)):
+            self.w[l][...] = w[l]
+            self.b[l][...] = b[l]
+
+    def parameter_views(self, snapshot):
+        return _parameter_views(snapshot, self.w, self.b)
+
+    def parameter_norm(self):
+        xp = self.backend.xp
+        store = self.parameters
+        if store is not None:
+            return float(xp.sqrt(xp.vdot(store.flat, store.flat)))
+
+        total = 0.0
+        for l in range(1, len(self.w)):
+            total += float(xp.vdot(self.w[l], self.w[l]) + xp.vdot(self.b[l], self.b[l]))
+        return float(np.sqrt(total))
+
+
+class StackedNet:
+    """
+    同じ層構成の K 個のネットワークを、まとめて学習します. (初期値の違いや、学習係数の比較用)
+    第 l 層の W,b を、K 個分積み重ねた3次元の配列 (K × 出力数 × 入力数, K × 出力数 × 1) で持つので、
+    順伝搬・逆伝搬の行列積は、K 個の小さな行列積の代わりに1回のバッチ行列積 (matmul) になります.
+    学習係数 (g) と重み減衰 (d) は、ネットワークごとに元の SimpleNet のものを使います.
+    元の SimpleNet の w[l], b[l] は、積み重ねた配列のビューに置き換えるので、
+    学習後もそれぞれのネットワークとして推論・保存できます.
+    """
+
+    def __init__(self, nets):
+        """
+        コンストラクタ
+        :param nets: 同じ層構成・活性化関数・精度の SimpleNet のリスト
+        インスタンス変数
+        nets まとめたネットワークのリスト
+        w 重み行列 (K × 出力数 × 入力数. 第0層は None)
+        b バイアス (K × 出力数 × 1. 第0層は None)
+        """
+        first = nets[0]
+        for net in nets[1:]:
+            if [w.shape for w in net.w[1:]] != [w.shape for w in first.w[1:]]:
+                raise ValueError("nets must have the same layer sizes")
+            if net.diagonal != first.diagonal:
+                raise ValueError("nets must have the same layer types")
+            if [type(f) for f in net.f[1:]] != [type(f) for f in first.f[1:]]:
+                raise ValueError("nets must have the same activate functions")
+            if net.precision.dtype != first.precision.dtype or net.precision.storage != first.precision.storage:
+                raise ValueError("nets must have the same precision")
+
+        self.nets = nets
+        self.backend = first.backend
+        self.precision = first.precision
+        self.f = first.f
+        self.learning_flag = first.learning_flag
+        self.diagonal = first.diagonal
+        self.u_memento = []
+        self.z_memento = []
+
+        xp = self.backend.xp
+        self.w = [None]
+        self.b = [None]
+        for l in range(1, len(first.w)):
+            self.w.append(xp.stack([net.w[l] for net in nets]))
+            self.b.append(xp.stack([net.b[l] for net in nets]))
+
+        for k, net in enumerate(nets):
+            # それぞれのネットワークの W,b を、積み重ねた配列のビューにする (W,b のまとめと作業領域は解除する)
+            net.w = [None] + [w[k] for w in self.w[1:]]
+            net.b = [None] + [b[k] for b in self.b[1:]]
+            net.parameters = None
+            net.workspace = None
+
+    def __len__(self):
+        return len(self.nets)
+
+    def forward(self, x, xp=None):
+        """
+        K 個のネットワークで順伝搬します.
+        :param x: 入力データ. 全ネットワーク共通 (入力数 × データ数) か、ネットワークごと (K × 入力数 × データ数)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :return: 出力 (K × 出力数 × データ数)
+        """
+        xp = self.backend.xp if xp is None else xp
+        x = self.__compute_array(x)
+
+        self.u_memento = [None]
+        self.z_memento = []
+
+        z = x
+        for layer in range(1, len(self.w)):
+            self.z_memento.append(z)
+            # (K × n × m) ・ (m × データ数) は、K 個の行列積を1回で行う
+            u = _affine(self.w[layer], self.b[layer], z, self.diagonal[layer], xp=xp)
+            self.u_memento.append(u)
+            z = self.f[layer].calc(u, xp=xp)
+
+        self.z_memento.append(z)
+        return z
+
+    def predict(self, x, xp=None):
+        """
+        逆伝搬のための u, z を記録せずに、K 個のネットワークで順伝搬します.
+        :param x: 入力データ (forward と同じ)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :return: 出力 (K × 出力数 × データ数)
+        """
+        xp = self.backend.xp if xp is None else xp
+        z = self.__compute_array(x)
+        for layer in range(1, len(self.w)):
+            u = _affine(self.w[layer], self.b[layer], z, self.diagonal[layer], xp=xp)
+            z = self.f[layer].calc(u, xp=xp, out=u)
+        return z
+
+    def backward(self, d, y, xp=None):
+        """
+        K 個のネットワークで逆伝搬します.
+        :param d: 教師値. 全ネットワーク共通 (出力数 × データ数) か、ネットワークごと (K × 出力数 × データ数)
+        :param y: 予測値 (forward の戻り値)
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :return: ∂E/∂W のリスト, ∂E/∂b のリスト (それぞれ K 個分を積み重ねた配列. 第0層は None)
+        """
+        xp = self.backend.xp if xp is None else xp
+        dEdW = [None] * len(self.w)
+        dEdB = [None] * len(self.w)
+
+        last = len(self.w) - 1
+        delta = self.f[last].delta(d if func.is_label(d) else self.__compute_array(d), y, xp=xp)
+        batch_size = float(delta.shape[-1])
+
+        for l in range(last, 0, -1):
+            repeat = self.diagonal[l]
+            if repeat:
+                dEdW[l] = _diagonal_grad(delta, self.z_memento[l - 1], repeat, xp=xp)
+            else:
+                dEdW[l] = xp.matmul(delta, xp.swapaxes(self.z_memento[l - 1], -1, -2))
+            dEdW[l] /= batch_size
+            dEdB[l] = xp.mean(delta, axis=-1, keepdims=True)
+
+            if l > 1:
+                if repeat:
+                    prev = _diagonal_backprop(self.w[l], delta, repeat, xp=xp)
+                else:
+                    prev = xp.matmul(xp.swapaxes(self.w[l], -1, -2), delta)
+                prev *= _differential(self.f[l - 1], self.u_memento[l - 1], self.z_memento[l - 1], xp=xp)
+                delta = prev
+
+        return dEdW, dEdB
+
+    def adjust_network(self, dEdW, dEdB, ap=None):
+        """
+        K 個のネットワークの W,b を調整します.
+        重み減衰と学習係数は、ネットワークごとに (積み重ねた配列の k 番目のビューに) 適用します.
+        学習係数が層ごとのスカラーだけで決まる (状態を持たない) 場合は、K 個分の学習係数を1回で掛けます.
+        :param dEdW: backward の ∂E/∂W (修正量の計算に使うので、値は壊れます)
+        :param dEdB: backward の ∂E/∂b (同上)
+        :param ap: numpy or cupy (省略時は backend のモジュール)
+        """
+        ap = self.backend.xp if ap is None else ap
+        scalar_rate = all([type(net.g).update is grad.Grad.update for net in self.nets])
+
+        for net in self.nets:
+            net.g.next_step()
+
+        for idx in range(1, len(self.w)):
+            gw = dEdW[idx]
+            gb = dEdB[idx]
+
+            for k, net in enumerate(self.nets):
+                net.d.fold(self.w[idx][k], gw[k], xp=ap)
+                net.d.fold(self.b[idx][k], gb[k], xp=ap)
+
+            if scalar_rate:
+                rates = ap.asarray([net.g.layer_rate(idx) for net in self.nets], dtype=gw.dtype)
+                rates = rates.reshape(len(self.nets), 1, 1)
+                gw *= rates
+                gb *= rates
+            else:
+                for k, net in enumerate(self.nets):
+                    net.g.update(gw[k], gb[k], idx, xp=ap)
+
+            for p, g in [(self.w[idx], gw), (self.b[idx], gb)]:
+                g *= self.learning_flag[idx]
+                p -= g
+                _clamp(p, g, None, ap, epsilon=self.precision.epsilon())
+
+    def train_step(self, x, d, xp=None):
+        """
+        順伝搬・逆伝搬・重み調整を1度に行います
+        :param x: 入力データ
+        :param d: 教師値
+        :param xp: numpy or cupy (省略時は backend のモジュール)
+        :return: 予測値 (更新前の W,b による. K × 出力数 × データ数)
+        """
+        y = self.forward(x, xp=xp)
+        dEdW, dEdB = self.backward(d, y, xp=xp)
+        self.adjust_network(dEdW, dEdB, ap=xp)
+        return y
+
+    def __compute_array(self, a):
+        """
+        入力データ・教師値を、計算に使う型に変換します. (すでにその型であれば、そのまま返します)
+        """
+        if a.dtype == self.precision.dtype:
+            return a
+        return a.astype(self.precision.dtype)
+
+
+def _affine(w, b, z, repeat, xp=np, out=None):
+    """
+    u = W・z + b を求めます.
+    対角スケール層 (repeat > 0) では、z を縦に repeat 回並べたものに W (列ベクトル) を要素ごとに掛けます.
+    W, z は、層を積み重ねた3次元の配列 (StackedNet) でも構いません
+    :param w: 重み
+    :param b: バイアス
+    :param z: 前の層の出力
+    :param repeat: 0=通常の層 r=対角スケール層
+    :param xp: numpy or cupy
+    :param out: 結果の格納先 (省略時は新しい配列を確保します)
+    :return: u
+    """
+    if repeat:
+        n = z.shape[-2]
+        lead = w.shape[0:-2]
+        if out is None:
+            out = xp.empty(lead + (repeat * n, z.shape[-1]), dtype=xp.result_type(w, z))
+        # (r, n, 1) * (n, データ数) → (r, n, データ数) を、out に直接書き込む
+        xp.multiply(w.reshape(lead + (repeat, n, 1)), _expand(z, xp), out=out.reshape(lead + (repeat, n, z.shape[-1])))
+        u = out
+    elif out is None and w.ndim == 2:
+        u = xp.dot(w, z)
+    else:
+        u = xp.matmul(w, z, out=out)
+    u += b
+    return u
+
+
+def _diagonal_grad(delta, z, repeat, xp=np, out=None, work=None):
+    """
+    対角スケール層の ∂E/∂W × データ数 (= δ と、並べた z の要素ごとの積の行和) を求めます
+    :param work: delta と同じ形の作業用配列 (省略時は確保します)
+    """
+    n = z.shape[-2]
+    lead = delta.shape[0:-2]
+    shape = lead + (repeat, n, delta.shape[-1])
+    prod = xp.multiply(delta.reshape(shape), _expand(z, xp), out=None if work is None else work.reshape(shape))
+    grad = xp.sum(prod, axis=-1, keepdims=True, out=None if out is None else out.reshape(lead + (repeat, n, 1)))
+    return grad.reshape(lead + (repeat * n, 1)) if out is None else out
+
+
+def _diagonal_backprop(w, delta, repeat, xp=np, out=None, work=None):
+    """
+    対角スケール層の δ(l-1) の f'(u) を掛ける前の値 (= W と δ の要素ごとの積を、並べた r 個について足したもの) を求めます
+    :param work: delta と同じ形の作業用配列 (省略時は確保します)
+    """
+    n = delta.shape[-2] // repeat
+    lead = delta.shape[0:-2]
+    shape = lead + (repeat, n, delta.shape[-1])
+    prod = xp.multiply(w.reshape(lead + (repeat, n, 1)), delta.reshape(shape),
+                       out=None if work is None else work.reshape(shape))
+    return xp.sum(prod, axis=-3, out=out)
+
+
+def _expand(z, xp=np):
+    """
+    3次元の z (積み重ねた層の入力) に、並べる回数の軸を足します
+    """
+    return z if z.ndim == 2 else xp.expand_dims(z, -3)
+
+
+def _differential(f, u, z, xp=np, out=None):
+    """
+    活性化関数 f の微分値 f'(u) を求めます.
+    出力 z = f(u) から求められる関数 (uses_output) は、順伝搬で記録した z から求めます (exp, cosh などを計算し直さない)
+    """
+    if f.uses_output:
+        return f.differential_from_output(z, xp=xp, out=out)
+    return f.differential(u, xp=xp, out=out)
+
+
+class Workspace:
+    """
+    順伝搬・逆伝搬・重み調整で使い回す作業領域.
+    あるバッチサイズについて、各層の u, z, δ, ∂E/∂W, ∂E/∂b を1度だけ確保します.
+    forward/backward/adjust_network は out= 指定でここに書き込むので、
+    学習ループの各ステップで新しい配列を確保しません.
+    """
+
+    def __init__(self, w, b, batch_size, xp=np, dEdW=None, dEdB=None, dtype=None, keep_u=None):
+        """
+        コンストラクタ
+        :param w: 重み行列のリスト (第0層は None)
+        :param b: バイアスのリスト (第0層は None)
+        :param batch_size: バッチサイズ
+        :param xp: numpy or cupy
+        :param dEdW: ∂E/∂W の格納領域のリスト (省略時は確保します)
+        :param dEdB: ∂E/∂b の格納領域のリスト (省略時は確保します)
+        :param dtype: u, z, δ, 微分値の型 (省略時は W,b の型)
+        :param keep_u: 層ごとに u を確保するかのリスト (省略時はすべての層. 確保しない層の u は None)
+        """
+        self.batch_size = batch_size
+        # 層番号と添え字を合わせるため、第0層には None を設定する
+        # (z[0] には forward のたびに入力データを設定する)
+        self.u = [None]
+        self.z = [None]
+        self.delta = [None]
+        self.dEdW = [None]
+        self.dEdB = [None]
+
+        dtype = xp.result_type(*w[1:], *b[1:]) if dtype is None else dtype
+        max_rows = 0
+        max_size = 0
+        for l in range(1, len(w)):
+            shape = (w[l].shape[0], batch_size)
+            self.u.append(xp.empty(shape, dtype=dtype) if keep_u is None or keep_u[l] else None)
+            self.z.append(xp.empty(shape, dtype=dtype))
+            self.delta.append(xp.empty(shape, dtype=dtype))
+            self.dEdW.append(xp.empty(w[l].shape, dtype=dtype) if dEdW is None else dEdW[l])
+            self.dEdB.append(xp.empty(b[l].shape, dtype=dtype) if dEdB is None else dEdB[l])
+            max_rows = max(max_rows, w[l].shape[0])
+            max_size = max(max_size, w[l].size, b[l].size)
+
+        # f'(u)・正則化項の作業用の配列と ε丸め用のマスクは、全層で1つの領域を共有する
+        self.__scratch = xp.empty(max(max_rows * batch_size, max_size), dtype=dtype)
+        self.__mask = xp.empty(max_size, dtype=bool)
+
+    def scratch(self, a):
+        """
+        a と同じ形の作業用配列 (全層で共有) を返します
+        """
+        return self.__scratch[0:a.size].reshape(a.shape)
+
+    def mask(self, a):
+        """
+        a と同じ形の bool 配列 (全層で共有) を返します
+        """
+        return self.__mask[0:a.size].reshape(a.shape)
+
+
+def _clamp(p, work, mask=None, ap=np, epsilon=const.FLT16_EPSILON):
+    """
+    重みが「計算機のε」未満にならないように、p をその場で丸めます.
+    (ap.where で新しい配列を作る代わりに、work と mask を作業領域に使います)
+    :param p: 重み行列またはバイアス
+    :param work: p と同じ形の作業用配列 (値は壊れます)
+    :param mask: p と同じ形の bool 配列 (None の場合は確保します)
+    :param ap: numpy or cupy
+    :param epsilon: ε (W,b の型に合わせた値. precision.epsilon())
+    """
+    ap.abs(p, out=work)
+    mask = ap.less(work, epsilon, out=mask)
+    ap.sign(p, out=work)
+    work *= epsilon
+    ap.copyto(p, work, where=mask)
+
+
+class ParameterStore:
+    """
+    全層の W,b を1つの連続した配列 flat にまとめて持ちます.
+    w[l], b[l] は flat のビューなので、今までどおり層番号 (1から) で使えます.
+    微分値も同じ並び (W1, b1, W2, b2, ...) の配列 grad にまとめ、dEdW[l], dEdB[l] をそのビューにします.
+    重みの更新・ε丸め・スナップショット・ノルムは、flat に対する1回の配列演算で行えます.
+    """
+
+    def __init__(self, w, b, xp=np, grad_dtype=None):
+        """
+        コンストラクタ
+        :param w: 重み行列のリスト (第0層は None)
+        :param b: バイアスのリスト (第0層は None)
+        :param xp: numpy or cupy
+        :param grad_dtype: 微分値の型 (省略時は W,b の型)
+        """
+        size = _parameter_size(w, b)
+        dtype = xp.result_type(*w[1:], *b[1:])
+
+        self.flat = xp.empty(size, dtype=dtype)
+        self.grad = xp.zeros(size, dtype=dtype if grad_dtype is None else grad_dtype)
+        self.w, self.b = _parameter_views(self.flat, w, b)
+        self.dEdW, self.dEdB = _parameter_views(self.grad, w, b)
+        self.__mask = xp.empty(size, dtype=bool)
+
+        for l in range(1, len(w)):
+            self.w[l][...] = w[l]
+            self.b[l][...] = b[l]
+
+    def mask(self, a):
+        """
+        a と同じ形の bool 配列 (ε丸めの作業用) を返します
+        """
+        return self.__mask[0:a.size].reshape(a.shape)
+
+
+def _parameter_size(w, b):
+    """
+    全層の W,b の要素数の合計を返します
+    """
+    return sum([w[l].size + b[l].size for l in range(1, len(w))])
+
+
+def _parameter_views(flat, w, b):
+    """
+    W1, b1, W2, b2, ... の順に並べた1次元配列 flat から、w, b と同じ形のビューのリストを作ります
+    :param flat: 1次元配列
+    :param w: 形の手本にする重み行列のリスト (第0層は None)
+    :param b: 形の手本にするバイアスのリスト (第0層は None)
+    :return: 重み行列のビューのリスト, バイアスのビューのリスト (第0層は None)
+    """
+    view_w = [None]
+    view_b = [None]
+    offset = 0
+    for l in range(1, len(w)):
+        for views, a in [(view_w, w[l]), (view_b, b[l])]:
+            views.append(flat[offset:offset + a.size].reshape(a.shape))
+            offset += a.size
+    return view_w, view_b
@@ -0,0 +1,183 @@
+import importlib
+import json
+import os
+import numpy as np
+from ai_chan.precision import Precision
+
+# 保存形式の版数
+FORMAT_VERSION = 1
+# 層構成・活性化関数・学習係数・重み減衰を記録するファイル
+MANIFEST = "manifest.json"
+
+# 保存しない値 (配列や、JSON にできないもの) の目印
+_SKIP = object()
+
+
+def save(net, path, w=None, b=None):
+    """
+    ネットワークを、ディレクトリ path に保存します.
+    W,b は層ごとの .npy ファイル (w_1.npy, b_1.npy, ...) に、
+    層構成・層の種類・活性化関数・学習フラグ・学習係数・重み減衰・精度は manifest.json に記録します.
+    学習係数の配列の状態 (Momentum の速度、Adam の m, v など) も .npy ファイル (grad_1_0_0.npy, ...) に保存するので、
+    読み込んだネットワークは、保存した時点の続きから同じように学習できます.
+    :param net: ネットワーク (SimpleNet, GPUNet)
+    :param path: 保存先のディレクトリ (無ければ作ります)
+    :param w: 保存する重み行列のリスト (省略時は net.w. NetTrainer.finish_w などを保存するときに指定します)
+    :param b: 保存するバイアスのリスト (省略時は net.b)
+    """
+    w = net.w if w is None else w
+    b = net.b if b is None else b
+    os.makedirs(path, exist_ok=True)
+
+    layers = []
+    for l in range(1, len(w)):
+        layer = {
+            "w": "w_{}.npy".format(l),
+            "b": "b_{}.npy".format(l),
+            "activate_function": _encode(net.f[l]),
+            "learning_flag": float(net.learning_flag[l]),
+            "diagonal": int(net.diagonal[l])
+        }
+        np.save(os.path.join(path, layer["w"]), net.backend.asnumpy(w[l]))
+        np.save(os.path.join(path, layer["b"]), net.backend.asnumpy(b[l]))
+        layers.append(layer)
+
+    # 学習係数の状態: (層番号, 0=W 1=b) ごとの配列のリスト
+    states = []
+    for (l, k), arrays in sorted(getattr(net.g, "state", {}).items()):
+        files = []
+        for i, a in enumerate(arrays):
+            files.append("grad_{}_{}_{}.npy".format(l, k, i))
+            np.save(os.path.join(path, files[-1]), net.backend.asnumpy(a))
+        states.append({"layer": l, "param": k, "files": files})
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "net": _class_name(net),
+        "precision": {"dtype": net.precision.dtype.name, "storage": net.precision.storage.name},
+        "layers": layers,
+        "grad": _encode(net.g),
+        "grad_state": states,
+        "weight_decay": _encode(net.d)
+    }
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def load(path, mmap_mode=None, backend=None):
+    """
+    save() で保存したネットワークを読み込みます.
+    mmap_mode を指定すると、W,b はファイルをメモリにマップした配列になり、読み込みはほぼ一瞬で終わります.
+    同じファイルを読み込んだ複数のプロセスは、OS のページキャッシュを共有します.
+    :param path: save() で保存したディレクトリ
+    :param mmap_mode: np.load の mmap_mode
+        None : W,b をメモリに読み込みます
+        "r" : 読み込み専用でマップします (推論専用. 学習すると W,b を更新できずにエラーになります)
+        "c" : コピーオンライトでマップします (学習で更新したページだけが、そのプロセスのメモリにコピーされます)
+    :param backend: ネットワークのバックエンド (省略時は numpy. GPUNet は読み込み後に to_gpu() してください)
+    :return: ネットワーク
+    """
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest["format"] > FORMAT_VERSION:
+        raise ValueError("unsupported format: {}".format(manifest["format"]))
+
+    precision = Precision(manifest["precision"]["dtype"], storage=manifest["precision"]["storage"])
+    net = _import(manifest["net"])(backend=backend, precision=precision)
+
+    for layer in manifest["layers"]:
+        w = np.load(os.path.join(path, layer["w"]), mmap_mode=mmap_mode)
+        b = np.load(os.path.join(path, layer["b"]), mmap_mode=mmap_mode)
+        # numpy のバックエンドであれば、マップした配列をそのまま使う (コピーしない)
+        net.w.append(net.backend.asarray(w))
+        net.b.append(net.backend.asarray(b))
+        net.f.append(_decode(layer["activate_function"]))
+        net.learning_flag.append(layer["learning_flag"])
+        net.diagonal.append(layer.get("diagonal", 0))
+
+    g = _decode(manifest["grad"])
+    if hasattr(g, "state"):
+        # 状態を保存していない (古い形式の) 場合は、学習回数も 0 から数え直す (Adam のバイアス補正を合わせるため)
+        if "grad_state" not in manifest:
+            g.cnt = 0
+        for state in manifest.get("grad_state", []):
+            g.state[(state["layer"], state["param"])] = [
+                net.backend.asarray(np.load(os.path.join(path, name))) for name in state["files"]]
+    net.set_learning_rate(g)
+    net.set_weight_decay(_decode(manifest["weight_decay"]))
+    return net
+
+
+def _class_name(obj):
+    return "{}.{}".format(type(obj).__module__, type(obj).__name__)
+
+
+def _import(name):
+    """
+    保存したクラス名から、クラスを取り出します.
+    manifest.json を書き換えて任意のモジュールを読み込ませないよう、ai_chan パッケージのクラスだけを受け付けます
+    """
+    module, cls = name.rsplit(".", 1)
+    if not module.startswith("ai_chan."):
+        raise ValueError("not an ai_chan class: {}".format(name))
+    cls = getattr(importlib.import_module(module), cls, None)
+    if not isinstance(cls, type):
+        raise ValueError("not an ai_chan class: {}".format(name))
+    return cls
+
+
+def _encode(obj):
+    """
+    オブジェクトを、クラス名と (JSON にできる) 属性の dict にします
+    """
+    attributes = {}
+    for name, value in vars(obj).items():
+        value = _encode_value(value)
+        if value is not _SKIP:
+            attributes[name] = value
+    return {"class": _class_name(obj), "attributes": attributes}
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        items = [_encode_value(v) for v in value]
+        return _SKIP if _SKIP in items else items
+    if isinstance(value, dict):
+        # JSON の dict のキーは文字列になるので、(キー, 値) の組のリストにする
+        if not all([isinstance(k, (int, str)) for k in value.keys()]):
+            return _SKIP
+        items = [[k, _encode_value(v)] for k, v in value.items()]
+        return _SKIP if _SKIP in [v for k, v in items] else {"items": items}
+    if type(value).__module__.startswith("ai_chan."):
+        return _encode(value)
+    return _SKIP
+
+
+def _decode(encoded):
+    """
+    _encode() の結果から、オブジェクトを作り直します.
+    引数なしのコンストラクタで作ってから、保存した属性を上書きします.
+    (引数なしで作れないクラスは、コンストラクタを呼ばずに作ります)
+    """
+    cls = _import(encoded["class"])
+    try:
+        obj = cls()
+    except TypeError:
+        obj = cls.__new__(cls)
+    for name, value in encoded["attributes"].items():
+        setattr(obj, name, _decode_value(value))
+    return obj
+
+
+def _decode_value(value):
+    if isinstance(value, list):
+        return [_decode_value(v) for v in value]
+    if isinstance(value, dict):
+        if "class" in value:
+            return _decode(value)
+        return {k: _decode_value(v) for k, v in value["items"]}
+    return value
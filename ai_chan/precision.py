@@ -0,0 +1,101 @@
+import numpy as np
+from ai_chan import const
+
+
+class Precision:
+    """
+    ネットワークの浮動小数点の型を決めます.
+    dtype は、活性 u, z ・ 誤差 δ ・ 微分値 ∂E/∂W など、計算に使う型です.
+    storage は、W,b を保存する型です. (省略時は dtype と同じ)
+    storage=float16, dtype=float32 とすると、W,b は float16 で持ち、行列積の累積や微分値は float32 で計算します.
+    ただし、float32 の W,b の控え (マスターコピー) は持たないので、次の点に注意してください.
+      * 節約できるのは W,b のメモリだけで、速くはなりません. (順伝搬のたびに float16 の W を float32 に変換して計算します)
+      * W,b の更新 (W -= 修正量) は float16 で行うので、|W| の約 1/1000 より小さな修正量は丸められて消えます.
+        学習係数を小さくしたときや学習の終盤には、W,b が更新されなくなることがあります
+    """
+
+    def __init__(self, dtype=np.float64, storage=None):
+        """
+        コンストラクタ
+        :param dtype: 計算に使う型
+        :param storage: W,b を保存する型 (省略時は dtype)
+        """
+        self.dtype = np.dtype(dtype)
+        self.storage = self.dtype if storage is None else np.dtype(storage)
+
+    def epsilon(self):
+        """
+        W,b の ε丸めに使う値を返します. (W,b を保存する型に合わせます)
+        """
+        return epsilon(self.storage)
+
+    def __eq__(self, other):
+        # persist.load や pickle で作り直した精度も、型が同じなら同じ精度とみなす
+        if not isinstance(other, Precision):
+            return NotImplemented
+        return self.dtype == other.dtype and self.storage == other.storage
+
+    def __hash__(self):
+        return hash((self.dtype, self.storage))
+
+    def name(self):
+        """
+        この精度の名称を返します
+        """
+        if self.storage == self.dtype:
+            return self.dtype.name
+        return "{}/{}".format(self.storage.name, self.dtype.name)
+
+
+FLOAT64 = Precision(np.float64)
+FLOAT32 = Precision(np.float32)
+# W,b のメモリを半分にする精度 (float32 より速くはならず、小さな修正量は消えます. Precision の説明を参照)
+MIXED16 = Precision(np.float32, storage=np.float16)
+
+
+def epsilon(dtype):
+    """
+    dtype の W,b を丸めるときの「計算機のε」を返します
+    :param dtype: 型
+    :return: ε
+    """
+    size = np.dtype(dtype).itemsize
+    if size <= 2:
+        return const.FLT16_EPSILON
+    if size <= 4:
+        return const.FLT32_EPSILON
+    return const.FLT64_EPSILON
+
+
+def get_precision(precision=None):
+    """
+    精度を返します
+    :param precision: 次のいずれか
+        None, "float64" : float64
+        "float32" : float32
+        "mixed16" : W,b は float16, 計算は float32 (メモリの節約用. 小さな修正量は消えます)
+        Precision : そのまま返します
+        型 (np.float32 など) : その型で保存・計算する精度
+    :return: 精度
+    """
+    if precision is None:
+        return FLOAT64
+
+    if isinstance(precision, Precision):
+        return precision
+
+    if isinstance(precision, str):
+        if precision == "float64":
+            return FLOAT64
+        if precision == "float32":
+            return FLOAT32
+        if precision == "mixed16":
+            return MIXED16
+
+    try:
+        dtype = np.dtype(precision)
+    except TypeError:
+        raise ValueError("unknown precision: {}".format(precision))
+    if dtype.kind != 'f':
+        raise ValueError("unknown precision: {}".format(precision))
+    return Precision(dtype)
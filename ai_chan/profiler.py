@@ -0,0 +1,160 @@
+from abc import ABCMeta, abstractmethod
+import time
+import tracemalloc
+
+
+class Hook(metaclass=ABCMeta):
+    """
+    ネットワークの処理の前後に呼ばれるフックのインタフェース.
+    AbstractNet.add_hook() で登録すると、層ごと・処理段階 (phase) ごとの演算 (op) の前後に呼ばれます.
+    フックを登録していないネットワークは、フックの呼び出しをしません.
+
+    phase と op の組み合わせは次のとおりです. (layer は層番号. 0 は全層まとめての処理です)
+        "forward" / "predict" : "matmul" (W・z + b), "activation" (f(u))
+        "recompute" : "matmul", "activation" (use_checkpoint で、逆伝搬のために順伝搬し直した層)
+        "backward" : "delta" (出力層の δ), "matmul" (∂E/∂W, ∂E/∂b, δ(l-1) の行列積), "differential" (f'(u))
+        "adjust" : "decay" (正則化項の足し込み), "update" (学習係数), "clamp" (W,b の更新と ε 丸め)
+    """
+
+    @abstractmethod
+    def pre(self, net, phase, layer, op):
+        """
+        演算の前に呼ばれます
+        :param net: ネットワーク
+        :param phase: 処理段階
+        :param layer: 層番号
+        :param op: 演算
+        """
+        pass
+
+    @abstractmethod
+    def post(self, net, phase, layer, op, flops):
+        """
+        演算の後に呼ばれます
+        :param net: ネットワーク
+        :param phase: 処理段階
+        :param layer: 層番号
+        :param op: 演算
+        :param flops: 演算の浮動小数点演算回数 (配列の形から求めた目安)
+        """
+        pass
+
+
+class Record:
+    """
+    (phase, layer, op) ごとの集計
+    """
+
+    def __init__(self):
+        # 呼ばれた回数
+        self.calls = 0
+        # 経過時間の合計 (秒)
+        self.seconds = 0.0
+        # 浮動小数点演算回数の合計
+        self.flops = 0
+        # 演算中に確保したメモリの合計 (byte. trace_memory=True のときだけ)
+        self.allocated = 0
+
+
+class Profiler(Hook):
+    """
+    層ごと・処理段階ごとの演算の時間・浮動小数点演算回数・メモリ確保量を集計するフック.
+
+        profiler = Profiler()
+        net.add_hook(profiler)
+        trainer.train(1000)
+        print(profiler.summary())
+
+    時間を正しく測るために、演算の前後で backend.synchronize() を呼び GPU の処理が終わるのを待ちます.
+    (非同期に実行できなくなるので、GPUNet ではプロファイル中の学習は遅くなります)
+    """
+
+    def __init__(self, trace_memory=False, synchronize=True):
+        """
+        コンストラクタ
+        :param trace_memory: True=tracemalloc で演算中のメモリ確保量を測ります (numpy のみ. 学習は遅くなります)
+        :param synchronize: True=演算の前後で GPU の処理が終わるのを待ちます
+        """
+        self.trace_memory = trace_memory
+        self.synchronize = synchronize
+        # (phase, layer, op) → Record
+        self.records = {}
+        self.__start = 0.0
+        self.__memory = 0
+        self.__started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracing = True
+
+    def pre(self, net, phase, layer, op):
+        if self.synchronize:
+            net.backend.synchronize()
+        if self.trace_memory:
+            self.__memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        self.__start = time.perf_counter()
+
+    def post(self, net, phase, layer, op, flops):
+        if self.synchronize:
+            net.backend.synchronize()
+        elapsed = time.perf_counter() - self.__start
+
+        key = (phase, layer, op)
+        record = self.records.get(key)
+        if record is None:
+            record = Record()
+            self.records[key] = record
+        record.calls += 1
+        record.seconds += elapsed
+        record.flops += flops
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            record.allocated += peak - self.__memory
+
+    def reset(self):
+        """
+        集計をやり直します
+        """
+        self.records = {}
+
+    def close(self):
+        """
+        このプロファイラが始めた tracemalloc を止めます
+        """
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+    def total(self):
+        """
+        全ての演算の経過時間の合計 (秒) を返します
+        """
+        return sum([record.seconds for record in self.records.values()])
+
+    def summary(self):
+        """
+        集計結果の表を返します. (処理段階・層番号・演算の順)
+        :return: 表の文字列
+        """
+        total = self.total()
+        lines = ["{:<8} {:>5} {:<12} {:>8} {:>12} {:>7} {:>10} {:>14}".format(
+            "phase", "layer", "op", "calls", "time(ms)", "%", "GFLOP/s", "alloc(byte)")]
+        for key in sorted(self.records.keys(), key=_sort_key):
+            phase, layer, op = key
+            record = self.records[key]
+            lines.append("{:<8} {:>5} {:<12} {:>8} {:>12.3f} {:>7.1f} {:>10.3f} {:>14}".format(
+                phase, layer, op, record.calls, record.seconds * 1000.0,
+                100.0 * record.seconds / total if total > 0 else 0.0,
+                record.flops / record.seconds / 1e9 if record.seconds > 0 else 0.0,
+                "{:,}".format(record.allocated) if self.trace_memory else "-"))
+        lines.append("total {:.3f} ms".format(total * 1000.0))
+        return "\n".join(lines)
+
+
+# 表に並べる処理段階の順
+_PHASES = ["forward", "predict", "backward", "adjust"]
+
+
+def _sort_key(key):
+    phase, layer, op = key
+    return (_PHASES.index(phase) if phase in _PHASES else len(_PHASES), phase, layer, op)
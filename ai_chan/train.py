@@ -1,6 +1,9 @@
 from ai_chan import nnet, util
+from ai_chan.metrics import Recorder
+import copy
 import numpy as np
 import sys
+import time
 
 
 class NetTrainer:
@@ -8,21 +11,33 @@ class NetTrainer:
     学習管理クラス
     """
 
-    def __init__(self, nnet, x, d, divide=5):
+    # 訓練誤差・汎化誤差の指標名
+    TRAIN_ERROR = "train_error"
+    EVAL_ERROR = "eval_error"
+
+    def __init__(self, nnet, x, d, divide=5, metrics=None, cache_prefix=False, loss=util.least_square_average):
         """
         コンストラクタ
         :param nnet: ニューラルネット
         :param x: 入力データ
         :param d: 教師値
         :param divide: 教師データをいくつのミニバッチに分割するか(デフォルト5)
+        :param metrics: 学習中の指標の記録先 (metrics.Recorder. 省略時はすべてメモリ上の配列に記録します)
+                        訓練誤差は "train_error"、汎化誤差は "eval_error" という指標名で記録します
+        :param cache_prefix: True=W,b を固定した先頭の層 (nnet.frozen_prefix()) の出力を最初に1度だけ求めておき、
+                             学習・評価ではその続きの層だけを計算します
+        :param loss: 訓練誤差・汎化誤差の誤差関数 loss(d, y) (既定は自乗誤差. 出力層が Softmax の場合は util.cross_entropy)
+                     データ数で割らない値を返す関数にします (eval_size を指定したときに、件数の比を掛けるため)
         """
         self.nnet = nnet
-        # 訓練誤差
-        self.tx = []
-        self.te = []
-        # 汎化誤差
-        self.gx = []
-        self.ge = []
+        # 誤差関数
+        self.loss = loss
+        # 訓練誤差・汎化誤差などの指標
+        self.metrics = Recorder() if metrics is None else metrics
+        # 評価のたびに記録する指標 (指標名 → trainer を受け取って値を返す関数)
+        self.extra_metrics = {}
+        # 教師データの分割数
+        self.divide = divide
         # 入力データ
         self.x = np.hsplit(x, divide)
         # 教師値データ
@@ -34,57 +49,229 @@ class NetTrainer:
         # 初期状態と終了状態のパラメータ
         self.start_w = None
         self.start_b = None
+        # 初期状態の W,b をまとめた配列と、学習係数・重み減衰の状態 (snapshot="iteration" の学習し直しに使う)
+        self.start_snapshot = None
+        self.start_state = None
         self.best_w = None
         self.best_b = None
         self.finish_w = None
         self.finish_b = None
+        # 最小エラーだった評価の学習回数
+        self.best_iteration = None
+        # 早期終了した学習回数 (None の場合は loop 回学習した)
+        self.stop_iteration = None
+        # これまでの学習回数 (train を続けて呼ぶと、続きから学習します)
+        self.iteration = 0
+        # これまでの最小エラー
+        self.min_error = sys.float_info.max
+        # 最小エラー時の W,b のスナップショット (snapshot="copy" のとき)
+        self.best_snapshot = None
+        # 評価に使うデータの添字 (eval_size を指定したとき)
+        self.eval_index = None
+        # 固定した先頭の層の出力を使い回すか
+        self.cache_prefix = cache_prefix
+        # 固定した先頭の層の、ミニバッチごとの出力と、その層数
+        self.prefix_x = None
+        self.prefix_start = 0
 
-    def train(self, loop):
+    @property
+    def tx(self):
+        """
+        訓練誤差を記録した学習回数の配列
+        """
+        return self.metrics[self.TRAIN_ERROR].x
+
+    @property
+    def te(self):
+        """
+        訓練誤差の配列
+        """
+        return self.metrics[self.TRAIN_ERROR].values
+
+    @property
+    def gx(self):
+        """
+        汎化誤差 (評価用データの誤差) を記録した学習回数の配列
+        """
+        return self.metrics[self.EVAL_ERROR].x
+
+    @property
+    def ge(self):
+        """
+        汎化誤差の配列
+        """
+        return self.metrics[self.EVAL_ERROR].values
+
+    def add_metric(self, name, fn):
+        """
+        評価のたびに記録する指標を追加します. (metrics.parameter_norm など)
+        :param name: 指標名
+        :param fn: trainer を受け取って値を返す関数
+        """
+        self.extra_metrics[name] = fn
+
+    def train(self, loop, eval_every=1, eval_seconds=None, eval_size=None, patience=None, min_delta=0.0,
+              snapshot="copy"):
         """
         学習を行います.
-        学習の途中経過は、このクラスのインスタンス変数を参照してください
-        :param loop: 学習回数
-        :return: 最小エラー
+        学習の途中経過は、このクラスのインスタンス変数を参照してください.
+        評価 (評価用データの推論) は、その回の学習の前に行い、gx にはその回の学習回数を記録します.
+        評価を間引いても、gx[i] は ge[i] を求めたときの学習回数です.
+        train を続けて呼ぶと、前回の続き (iteration 回目) から学習します. 学習回数・最小エラーは通算です.
+        :param loop: 学習回数 (今回の呼び出しで学習する回数)
+        :param eval_every: 何回の学習ごとに評価するか (None の場合は、回数では評価しない)
+        :param eval_seconds: 前回の評価から何秒たったら評価するか (None の場合は、時間では評価しない)
+        :param eval_size: 評価に使うデータ数. 評価用データから、学習の最初に1度だけ無作為に選びます (None の場合は全件)
+                          誤差は、全件で評価したときと同じ尺度になるように件数の比を掛けます
+        :param patience: 評価誤差が改善しない評価が何回続いたら学習をやめるか (None の場合は、やめない)
+        :param min_delta: 評価誤差がこの値より大きく小さくなったときだけ、改善したとみなします
+        :param snapshot: 最小エラー時の W,b の取り方
+            "copy" : 学習の前に確保した配列に、改善するたびにコピーします. finish_w, finish_b は最小エラー時の W,b です
+            "iteration" : 最小エラー時の学習回数 (best_iteration) だけを記録し、学習中は W,b をコピーしません.
+                          finish_w, finish_b は None にし、最小エラー時の W,b は best_parameters() で求めます
+        :return: これまでの最小エラー
         """
+        if snapshot not in ["copy", "iteration"]:
+            raise ValueError("unknown snapshot: {}".format(snapshot))
+
         # 初期の重みをとっておく
-        self.start_w = np.copy(self.nnet.w)
-        self.start_b = np.copy(self.nnet.b)
+        if self.start_w is None:
+            self.start_snapshot = self.nnet.snapshot_parameters()
+            self.start_w, self.start_b = self.nnet.parameter_views(self.start_snapshot)
+            self.start_state = copy.deepcopy((self.nnet.g, self.nnet.d))
 
-        min_error = sys.float_info.max
+        xs, start = self.__prefix_inputs()
+        x_eval, d_eval, scale = self.__eval_sample(xs, eval_size)
 
-        for cnt in range(0, loop):
-            # 順伝搬 (評価用)
-            gy = self.nnet.forward(self.x[self.eval_data])
+        # 最小エラー時の W,b のコピー先は、最初の学習の前に1度だけ確保する
+        if snapshot == "copy" and self.best_snapshot is None:
+            self.best_snapshot = self.nnet.snapshot_parameters()
+        wait = 0
+        last_eval = None
+        self.stop_iteration = None
 
-            # 誤差評価 (評価用)
-            self.gx.append(cnt)
-            error = util.least_square_average(self.d[self.eval_data], gy)
-            self.ge.append(error)
+        for cnt in range(self.iteration, self.iteration + loop):
+            if self.__need_eval(cnt, last_eval, eval_every, eval_seconds):
+                last_eval = time.perf_counter()
 
-            # 最小エラー値の更新
-            if min_error > error:
-                min_error = error
-                # 重みをとっておく
-                self.finish_w = np.copy(self.nnet.w)
-                self.finish_b = np.copy(self.nnet.b)
+                # 推論 (評価用). 逆伝搬しないので u,z の記録は不要
+                gy = self.nnet.predict(x_eval, start=start)
+
+                # 誤差評価 (評価用)
+                error = self.loss(d_eval, gy) * scale
+                self.metrics.record(self.EVAL_ERROR, cnt, error)
+                for name, fn in self.extra_metrics.items():
+                    self.metrics.record(name, cnt, fn(self))
+
+                # 最小エラー値の更新
+                if self.min_error - min_delta > error:
+                    self.min_error = error
+                    self.best_iteration = cnt
+                    wait = 0
+                    # 重みをとっておく (確保済みの配列に上書きする)
+                    if snapshot == "copy":
+                        self.nnet.snapshot_parameters(out=self.best_snapshot)
+                else:
+                    wait += 1
+                    # 早期終了
+                    if patience is not None and wait >= patience:
+                        self.stop_iteration = cnt
+                        break
 
             # 今回の学習セット番号
             current_batch = cnt % self.train_size
 
-            # 順伝搬 (訓練用)
-            y = self.nnet.forward(self.x[current_batch])
+            # 順伝搬・逆伝搬・パラメータ修正 (訓練用)
+            y = self.nnet.train_step(xs[current_batch], self.d[current_batch], start=start)
 
             # 誤差評価 (訓練用)
-            self.tx.append(cnt)
-            error = util.least_square_average(self.d[current_batch], y)
-            self.te.append(error)
+            error = self.loss(self.d[current_batch], y)
+            self.metrics.record(self.TRAIN_ERROR, cnt, error)
+            self.iteration = cnt + 1
+
+        if snapshot == "copy":
+            self.finish_w, self.finish_b = self.nnet.parameter_views(self.best_snapshot)
+        else:
+            # 最小エラー時の W,b は、best_parameters() が求めるまで分からない
+            self.finish_w, self.finish_b = None, None
+
+        return self.min_error
+
+    def best_parameters(self):
+        """
+        最小エラー時の W,b を返します. (finish_w, finish_b にも設定します)
+        snapshot="iteration" で学習した場合は、初期の W,b と学習係数・重み減衰の状態から
+        best_iteration 回まで学習し直して求めます. (ミニバッチの順番は決まっているので、同じ W,b になります)
+        学習し直した後、ネットワークの W,b と学習係数・重み減衰の状態は元に戻します
+        :return: W のリスト, b のリスト (最小エラーを記録していない場合は None, None)
+        """
+        if self.finish_w is not None or self.best_iteration is None:
+            return self.finish_w, self.finish_b
+
+        nnet = self.nnet
+        current = nnet.snapshot_parameters()
+        state = (nnet.g, nnet.d)
+        hooks = nnet.hooks
+        try:
+            # 学習し直す分は、プロファイラなどのフックに数えない
+            nnet.hooks = []
+            nnet.restore_parameters(self.start_snapshot)
+            nnet.g, nnet.d = copy.deepcopy(self.start_state)
+            for cnt in range(0, self.best_iteration):
+                current_batch = cnt % self.train_size
+                nnet.train_step(self.x[current_batch], self.d[current_batch])
+            self.finish_w, self.finish_b = nnet.parameter_views(nnet.snapshot_parameters())
+        finally:
+            nnet.restore_parameters(current)
+            nnet.g, nnet.d = state
+            nnet.hooks = hooks
+        return self.finish_w, self.finish_b
 
-            # 逆伝搬
-            dEdW, dEdB = self.nnet.backward(self.d[current_batch], y)
-            # パラメータ修正
-            self.nnet.adjust_network(dEdW, dEdB)
+    @staticmethod
+    def __need_eval(cnt, last_eval, eval_every, eval_seconds):
+        """
+        今回 (cnt 回目) の学習の前に評価するかを返します. 1回目の学習の前には、必ず評価します
+        """
+        if last_eval is None:
+            return True
+        if eval_every is not None and cnt % eval_every == 0:
+            return True
+        if eval_seconds is not None and time.perf_counter() - last_eval >= eval_seconds:
+            return True
+        return False
+
+    def __prefix_inputs(self):
+        """
+        学習・評価に使う、ミニバッチごとの入力と、順伝搬を始める層番号を返します.
+        cache_prefix=True の場合は、固定した先頭の層の出力を (固定した層数が変わらない限り) 1度だけ求めて使い回します
+        """
+        if not self.cache_prefix:
+            return self.x, 0
+        start = self.nnet.frozen_prefix()
+        if start == 0:
+            return self.x, 0
+        if self.prefix_x is None or self.prefix_start != start:
+            self.prefix_x = [self.nnet.predict(x, stop=start) for x in self.x]
+            self.prefix_start = start
+        return self.prefix_x, start
+
+    def __eval_sample(self, xs, eval_size):
+        """
+        評価に使う入力データと教師値、誤差に掛ける件数の比を返します.
+        eval_size を指定した場合は、評価用データから eval_size 件を無作為に選んだコピーを返します
+        (選ぶデータは最初に1度だけ決め、続きから学習するときも同じデータで評価します)
+        (誤差関数は件数で割らないので、全件の誤差と同じ尺度にするには 全件数/eval_size を掛けます)
+        """
+        x = xs[self.eval_data]
+        d = self.d[self.eval_data]
+        if eval_size is None or eval_size >= x.shape[1]:
+            return x, d, 1.0
 
-        return min_error
+        # 列 (=1件のデータ) を選ぶ. 並び順は元のまま
+        if self.eval_index is None or len(self.eval_index) != eval_size:
+            self.eval_index = np.sort(np.random.choice(x.shape[1], eval_size, replace=False))
+        idx = self.eval_index
+        return x[:, idx], d[:, idx], x.shape[1] / float(eval_size)
 
     def eval(self):
         """
@@ -98,10 +285,10 @@ class NetTrainer:
         y_train = []
         for dataset in range(0, self.train_size):
             d_train.append(self.d[dataset])
-            y_train.append(self.nnet.forward(self.x[dataset]))
+            y_train.append(self.nnet.predict(self.x[dataset]))
 
         d_eval = self.d[self.eval_data]
-        y_eval = self.nnet.forward(self.x[self.eval_data])
+        y_eval = self.nnet.predict(self.x[self.eval_data])
 
         return d_train, y_train, d_eval, y_eval
 
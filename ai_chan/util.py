@@ -16,6 +16,29 @@ def least_square_average(d, y):
     return (np.sum(np.square(d - y)) / 2.0) / float(len(d))
 
 
+def cross_entropy(d, y, xp=np):
+    """
+     交差エントロピーの、データの合計を求めます (func.Softmax の出力層の誤差関数)
+     least_square_average と同じく、データ数では割りません
+    :param d:教師データ(expected). クラス番号 (整数) を並べた 1行N列 の配列、または one-hot の配列
+    :param y:予想(actual). 各クラスの確率 (Softmax の出力). StackedNet の出力 (K × クラス数 × データ数) も受け付けます
+    :param xp: numpy or cupy (y と同じモジュール)
+    :return: 交差エントロピー -Σ log(正解のクラスの確率)
+             (y が3次元の場合は、ネットワークごとの値の配列)
+    """
+    # log(0) にならないように、確率は y の型で表せる最小の正の数に丸める
+    tiny = np.finfo(y.dtype).tiny
+    if d.dtype.kind in "iu":
+        # one-hot の配列を作らずに、正解のクラスの確率だけを取り出す (クラスは最後から2番目の軸)
+        labels = d.reshape((1,) * (y.ndim - 1) + (-1,))
+        p = xp.take_along_axis(y, xp.broadcast_to(labels, y.shape[:-2] + (1, labels.shape[-1])), axis=-2)
+        log_likelihood = xp.log(xp.maximum(p, tiny))
+    else:
+        log_likelihood = d * xp.log(xp.maximum(y, tiny))
+    error = -xp.sum(log_likelihood, axis=(-2, -1))
+    return float(error) if y.ndim == 2 else error
+
+
 def draw_hist(m, label, bins=50, min_max=(-10.0, 10.0)):
     """
     行列のリストを展開して、matplotlib の　histogram を作ります
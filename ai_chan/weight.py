@@ -18,6 +18,21 @@ class WeightDecay(metaclass=ABCMeta):
         """
         pass
 
+    def fold(self, p, grad, work=None, xp=np):
+        """
+        1つの重み行列またはバイアス p の正則化項 ∂R/∂p を、勾配 grad にその場で足し込みます.
+        正則化項の配列を作らないので、学習の1ステップごとの確保が要りません.
+        (既定の実装は、1つ分の r() を求めて足します)
+        :param p: 重み行列またはバイアス
+        :param grad: p の ∂E/∂p (上書きされます)
+        :param work: p と同じ形の作業用配列 (値は壊れます. None の場合は必要なら確保します)
+        :param xp: numpy or cupy
+        :return: grad
+        """
+        dRdW, dRdB = self.r([None, p], [None, p], ap=xp)
+        grad += dRdW[1]
+        return grad
+
 
 class NoDecay(WeightDecay):
     """
@@ -38,6 +53,10 @@ class NoDecay(WeightDecay):
 
         return dRdW, dRdB
 
+    def fold(self, p, grad, work=None, xp=np):
+        # 正則化項は 0 なので、何もしない
+        return grad
+
 
 class L1Decay(WeightDecay):
     """
@@ -56,11 +75,22 @@ class L1Decay(WeightDecay):
         dRdB = [None]
 
         for idx in range(1, len(w)):
-            dRdW.append(self.rate * ap.where(w[idx] > 0.0, 1.0, -1.0))
-            dRdB.append(self.rate * ap.where(b[idx] > 0.0, 1.0, -1.0))
+            # W,b と同じ型で返す
+            dRdW.append(self.rate * ap.where(w[idx] > 0.0, 1.0, -1.0).astype(w[idx].dtype, copy=False))
+            dRdB.append(self.rate * ap.where(b[idx] > 0.0, 1.0, -1.0).astype(b[idx].dtype, copy=False))
 
         return dRdW, dRdB
 
+    def fold(self, p, grad, work=None, xp=np):
+        # Wij > 0 の要素に +rate, それ以外に -rate (2 rate (Wij > 0) - rate)
+        if work is None:
+            work = xp.empty_like(grad)
+        xp.greater(p, 0.0, out=work)
+        work *= 2.0 * self.rate
+        work -= self.rate
+        grad += work
+        return grad
+
 
 class L2Decay(WeightDecay):
     """
@@ -84,6 +114,15 @@ class L2Decay(WeightDecay):
 
         return dRdW, dRdB
 
+    def fold(self, p, grad, work=None, xp=np):
+        # rate * Wij を作業用配列に求めて足す
+        if self.rate != 0.0:
+            if work is None:
+                work = xp.empty_like(grad)
+            xp.multiply(p, self.rate, out=work)
+            grad += work
+        return grad
+
 
 class LmaxDecay(WeightDecay):
     """
@@ -113,3 +152,17 @@ class LmaxDecay(WeightDecay):
             dRdB.append(self.rate * ap.where(b[idx] == abs_maxB, abs_maxB, 0.0))
 
         return dRdW, dRdB
+
+    def fold(self, p, grad, work=None, xp=np):
+        # 絶対値が最大の要素だけに rate * Wij を足す. (最大の要素が複数あるときは、最初の1つだけ)
+        maxP = xp.max(p)
+        minP = xp.min(p)
+        if maxP + minP > 0.0:
+            abs_max = maxP
+            pos = xp.argmax(p)
+        else:
+            abs_max = minP
+            pos = xp.argmin(p)
+
+        grad[xp.unravel_index(pos, p.shape)] += self.rate * abs_max
+        return grad
@@ -0,0 +1,62 @@
+"""
+深いネットワークで、順伝搬の記録の仕方 (すべての層 / use_compact_memento / use_checkpoint) ごとに、
+学習1ステップあたりの時間と、1ステップで確保したメモリの最大値 (tracemalloc の peak) を比較します.
+
+    python -m benchmarks.bench_checkpoint
+"""
+import math
+import time
+import tracemalloc
+import numpy as np
+from ai_chan import nnet, layer, func, grad
+
+
+def create_net(in_size, width, depth, out_size, compact, checkpoint):
+    np.random.seed(0)
+    net = nnet.SimpleNet()
+    # 深くしても桁あふれしないよう、出力が有界な Tanh を使う
+    net.add_layer(*([in_size] + [width] * depth), layer_factory=layer.Xavier(), activate_function=func.Tanh())
+    net.add_layer(out_size, layer_factory=layer.Xavier(), activate_function=func.IdentityMapping())
+    # 計測中に発散しないよう、学習率は小さくしておく
+    net.set_learning_rate(grad.Static(rate=10e-9))
+    net.use_compact_memento(compact)
+    net.use_checkpoint(checkpoint)
+    return net
+
+
+def peak_bytes(net, x, d):
+    """
+    train_step 1回で確保したメモリの最大値 (W,b など、すでに確保済みのものを除く)
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    net.train_step(x, d)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+
+def main(in_size=10, width=512, depth=16, out_size=1, batch_size=512, loop=5):
+    x = np.random.normal(0, 1, (in_size, batch_size))
+    d = np.random.normal(0, 1, (out_size, batch_size))
+    every = int(math.sqrt(depth))
+
+    print("layers={}x{} batch={}".format(width, depth, batch_size))
+    for label, compact, checkpoint in [("all layers", False, None),
+                                       ("compact", True, None),
+                                       ("checkpoint={}".format(every), False, every),
+                                       ("compact+checkpoint={}".format(every), True, every)]:
+        net = create_net(in_size, width, depth, out_size, compact, checkpoint)
+        net.train_step(x, d)
+
+        start = time.perf_counter()
+        for cnt in range(0, loop):
+            net.train_step(x, d)
+        msec = (time.perf_counter() - start) * 1000.0 / loop
+
+        print("{:<22} time/step={:>8.3f} ms  peak={:>14,} byte".format(label, msec, peak_bytes(net, x, d)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+重み減衰 (WeightDecay) ごとに、adjust_network 1回あたりのメモリ確保量と時間を比較します.
+
+    python -m benchmarks.bench_decay
+
+adjust_network は、正則化項を WeightDecay.fold() で微分値にその場で足し込みます.
+比較のため、以前の方法 (WeightDecay.r() で全層分の正則化項を作ってから足す) の確保量と時間も表示します.
+作業領域 (use_workspace) を使うので、adjust_network の確保量は正則化項の扱いの差がそのまま出ます.
+"""
+import time
+import tracemalloc
+import numpy as np
+from ai_chan import nnet, layer, func, grad, weight
+
+
+def create_net(in_size, width, depth, out_size, d):
+    net = nnet.SimpleNet()
+    net.add_layer(*([in_size] + [width] * depth), layer_factory=layer.Random())
+    net.add_layer(out_size, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+    # 計測中に発散しないよう、学習率は小さくしておく
+    net.set_learning_rate(grad.Static(rate=10e-9))
+    net.set_weight_decay(d)
+    return net
+
+
+def fold(net, dEdW, dEdB):
+    ws = net.workspace
+    for idx in range(1, len(net.w)):
+        net.d.fold(net.w[idx], dEdW[idx], work=ws.scratch(dEdW[idx]))
+        net.d.fold(net.b[idx], dEdB[idx], work=ws.scratch(dEdB[idx]))
+
+
+def legacy(net, dEdW, dEdB):
+    dRdW, dRdB = net.d.r(net.w, net.b)
+    for idx in range(1, len(net.w)):
+        dEdW[idx] += dRdW[idx]
+        dEdB[idx] += dRdB[idx]
+
+
+def measure(func, loop):
+    """
+    :return: 1回あたりの確保量(byte), 1回あたりの時間(ms)
+    """
+    func()
+
+    tracemalloc.start()
+    allocated = 0
+    for cnt in range(0, loop):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - current
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for cnt in range(0, loop):
+        func()
+    elapsed = time.perf_counter() - start
+
+    return allocated / loop, elapsed * 1000.0 / loop
+
+
+def main(in_size=10, width=512, depth=3, out_size=1, batch_size=256, loop=50):
+    x = np.random.normal(0, 1, (in_size, batch_size))
+    d = np.random.normal(0, 1, (out_size, batch_size))
+
+    print("layers={}x{} batch={}".format(width, depth, batch_size))
+    for decay in [weight.NoDecay(), weight.L1Decay(), weight.L2Decay(), weight.LmaxDecay()]:
+        np.random.seed(0)
+        net = create_net(in_size, width, depth, out_size, decay)
+        net.use_workspace(batch_size)
+        dEdW, dEdB = net.backward(d, net.forward(x))
+
+        name = decay.__class__.__name__
+        for label, target in [("adjust_network", lambda: net.adjust_network(dEdW, dEdB)),
+                              ("fold", lambda: fold(net, dEdW, dEdB)),
+                              ("r (legacy)", lambda: legacy(net, dEdW, dEdB))]:
+            allocated, msec = measure(target, loop)
+            print("{:<10} {:<15} alloc={:>12,.0f} byte  time={:.3f} ms".format(name, label, allocated, msec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+呼び出しのたびに演算モジュールを判別する方式 (以前の gpu.GPU デコレータ) と、
+ネットワーク作成時に1度だけ決める方式 (backend.Backend) のオーバーヘッドを比較します.
+
+    python -m benchmarks.bench_dispatch
+
+iris 程度の小さなバッチでは、行列演算そのものより呼び出しのオーバーヘッドが目立ちます.
+cupy が無い環境では、cupy.get_array_module の代わりに「常に numpy を返す」関数で判別します.
+(判別そのものの費用は含まれないので、以前の方式のオーバーヘッドは少なめに出ます)
+"""
+import functools
+import inspect
+import time
+import types
+import numpy as np
+from ai_chan import nnet, layer, func, grad, weight, backend
+
+if backend.cupy_available():
+    import cupy
+    get_array_module = cupy.get_array_module
+else:
+    def get_array_module(*args):
+        return np
+
+
+def dispatch_per_call(clazz):
+    """
+    以前の gpu.GPU デコレータと同じく、xp/ap を引数に持つメソッドを、
+    呼び出しのたびに演算モジュールを判別するようにデコレートします
+    """
+    def xp_decorator(f):
+        @functools.wraps(f)
+        def __func(*args, **kwargs):
+            kwargs["xp"] = get_array_module(args[1])
+            return f(*args, **kwargs)
+        return __func
+
+    def ap_decorator(f):
+        @functools.wraps(f)
+        def __func(*args, **kwargs):
+            kwargs["ap"] = get_array_module(args[1][1])
+            return f(*args, **kwargs)
+        return __func
+
+    for property_name in dir(clazz):
+        attr = getattr(clazz, property_name)
+        if type(attr) is not types.FunctionType:
+            continue
+        args = inspect.signature(attr).parameters.keys()
+        if 'xp' in args:
+            setattr(clazz, property_name, xp_decorator(attr))
+        elif 'ap' in args:
+            setattr(clazz, property_name, ap_decorator(attr))
+    return clazz
+
+
+@dispatch_per_call
+class DispatchReLu(func.ReLu):
+    pass
+
+
+@dispatch_per_call
+class DispatchIdentityMapping(func.IdentityMapping):
+    pass
+
+
+@dispatch_per_call
+class DispatchStatic(grad.Static):
+    pass
+
+
+@dispatch_per_call
+class DispatchL2Decay(weight.L2Decay):
+    pass
+
+
+@dispatch_per_call
+class DispatchNet(nnet.SimpleNet):
+    pass
+
+
+def create_net(clazz, relu, identity, static, decay, x):
+    np.random.seed(0)
+    net = clazz()
+    net.add_pre_layer(layer.Normalize(), activate_function=relu, x=x)
+    net.add_layer(60, activate_function=relu)
+    net.add_layer(1, layer_factory=layer.Random(), activate_function=identity)
+    net.set_learning_rate(static)
+    net.set_weight_decay(decay)
+    return net
+
+
+def measure(net, x, d, loop):
+    start = time.perf_counter()
+    for cnt in range(0, loop):
+        y = net.forward(x)
+        dEdW, dEdB = net.backward(d, y)
+        net.adjust_network(dEdW, dEdB)
+    return (time.perf_counter() - start) * 1000000.0 / loop
+
+
+def main(batch_size=120, loop=5000):
+    # iris と同じ大きさ (特徴量3, 120件)
+    x = np.random.normal(0, 1, (3, batch_size))
+    d = np.random.normal(0, 1, (1, batch_size))
+
+    nets = [
+        ("per-call dispatch", create_net(DispatchNet, DispatchReLu(), DispatchIdentityMapping(),
+                                         DispatchStatic(), DispatchL2Decay(), x)),
+        ("backend", create_net(nnet.SimpleNet, func.ReLu(), func.IdentityMapping(),
+                               grad.Static(), weight.L2Decay(), x)),
+    ]
+    for name, net in nets:
+        measure(net, x, d, 10)
+        print("{:<18} {:.1f} us/step".format(name, measure(net, x, d, loop)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+学習アルゴリズム (grad) ごとに、経過時間あたりの収束の速さを比較します.
+
+    python -m benchmarks.bench_optimizers
+
+tests/test_run.py と同じ iris の回帰 (がく片の長さ・幅, 花びらの長さ → 花びらの幅) を、
+同じネットワーク (Normalize 3→6, ReLu 6→60, 恒等写像 60→1, L2Decay) で学習します.
+各アルゴリズムを同じ時間だけ学習させ、経過時間ごとの評価用データの誤差を表示します.
+"""
+import time
+import numpy as np
+from sklearn import datasets
+from ai_chan import nnet, layer, func, grad, weight, util
+
+
+def load_iris(seed=0):
+    iris = datasets.load_iris()
+    data = np.random.RandomState(seed).permutation(iris.data)
+
+    x_vals = data[:, 0:3].T
+    d_vals = data[:, 3:4].T
+    train_size = int(x_vals.shape[1] * 0.8)
+
+    return x_vals, x_vals[:, 0:train_size], d_vals[:, 0:train_size], \
+        x_vals[:, train_size:], d_vals[:, train_size:]
+
+
+def create_net(x_vals, g, seed=0):
+    np.random.seed(seed)
+    net = nnet.SimpleNet()
+    net.add_pre_layer(layer.Normalize(), x=x_vals)
+    net.add_layer(60)
+    net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+    net.set_learning_rate(g)
+    net.set_weight_decay(weight.L2Decay())
+    return net
+
+
+def run(net, x_train, d_train, x_eval, d_eval, seconds, marks):
+    """
+    seconds 秒間学習して、marks の各時刻 (秒) での評価用データの誤差を返します
+    """
+    errors = []
+    iterations = 0
+    start = time.perf_counter()
+    for mark in marks:
+        while time.perf_counter() - start < mark:
+            net.train_step(x_train, d_train)
+            iterations += 1
+        errors.append(util.least_square_average(d_eval, net.predict(x_eval)))
+    return errors, iterations
+
+
+def main(seconds=2.0):
+    x_vals, x_train, d_train, x_eval, d_eval = load_iris()
+    marks = [seconds * r for r in [0.05, 0.1, 0.25, 0.5, 1.0]]
+
+    optimizers = [
+        ("Static", grad.Static()),
+        ("Momentum", grad.Momentum()),
+        ("Nesterov", grad.Nesterov()),
+        ("AdaGrad", grad.AdaGrad()),
+        ("RMSProp", grad.RMSProp()),
+        ("Adam", grad.Adam()),
+    ]
+
+    print("{:<10} {:>8} ".format("grad", "iter") + " ".join(["{:>9.2f}s".format(m) for m in marks]))
+    for name, g in optimizers:
+        net = create_net(x_vals, g)
+        errors, iterations = run(net, x_train, d_train, x_eval, d_eval, seconds, marks)
+        print("{:<10} {:>8} ".format(name, iterations) + " ".join(["{:>10.5f}".format(e) for e in errors]))
+
+
+if __name__ == '__main__':
+    main()
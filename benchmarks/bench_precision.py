@@ -0,0 +1,47 @@
+"""
+精度 (SimpleNet の precision) ごとに、学習1ステップあたりの時間と W,b・作業領域のバイト数を比較します.
+
+    python -m benchmarks.bench_precision
+"""
+import time
+import numpy as np
+from ai_chan import nnet, layer, func, grad
+
+
+def create_net(in_size, width, depth, out_size, precision):
+    net = nnet.SimpleNet(precision=precision)
+    # 幅が広くても float16 で桁あふれしないよう、出力が有界な Sigmoid を使う
+    net.add_layer(*([in_size] + [width] * depth), layer_factory=layer.Random(), activate_function=func.Sigmoid())
+    net.add_layer(out_size, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+    # 計測中に発散しないよう、学習率は小さくしておく
+    net.set_learning_rate(grad.Static(rate=10e-9))
+    return net
+
+
+def main(in_size=10, width=1024, depth=3, out_size=1, batch_size=256, loop=20):
+    x = np.random.normal(0, 1, (in_size, batch_size))
+    d = np.random.normal(0, 1, (out_size, batch_size))
+
+    print("layers={}x{} batch={}".format(width, depth, batch_size))
+    for precision in ["float64", "float32", "mixed16"]:
+        np.random.seed(0)
+        net = create_net(in_size, width, depth, out_size, precision)
+        net.use_workspace(batch_size)
+        net.train_step(x, d)
+
+        start = time.perf_counter()
+        for cnt in range(0, loop):
+            net.train_step(x, d)
+        msec = (time.perf_counter() - start) * 1000.0 / loop
+
+        params = sum([net.w[l].nbytes + net.b[l].nbytes for l in range(1, len(net.w))])
+        ws = net.workspace
+        activations = sum([a.nbytes for a in ws.u[1:] + ws.z[1:] + ws.delta[1:]])
+        print("{:<16} time/step={:>8.3f} ms  W,b={:>12,} byte  u,z,δ={:>12,} byte".format(
+            net.precision.name(), msec, params, activations))
+
+
+if __name__ == '__main__':
+    # float32 の Sigmoid は exp(-u) が inf になることがある (結果は 0 で正しい) ので、警告は出さない
+    with np.errstate(over='ignore'):
+        main()
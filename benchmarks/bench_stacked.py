@@ -0,0 +1,51 @@
+"""
+同じ層構成の K 個のネットワーク (初期値の種と学習係数だけが異なる) を学習する時間を、
+1つずつ学習した場合 (SimpleNet × K) と、まとめて学習した場合 (StackedNet) で比較します.
+
+    python -m benchmarks.bench_stacked
+
+データは benchmarks.bench_optimizers と同じ iris の回帰です.
+iris 程度の小さな問題では、1つのネットワークの行列積は小さすぎて BLAS を使い切れないので、
+K 個の行列積を1回のバッチ行列積にまとめると、1ステップあたりの時間が短くなります.
+"""
+import time
+import numpy as np
+from ai_chan import nnet, grad
+from benchmarks.bench_optimizers import load_iris, create_net
+
+
+def create_nets(x_vals, k):
+    rates = np.logspace(-4, -2, k)
+    return [create_net(x_vals, grad.Static(rate=float(rates[seed])), seed=seed) for seed in range(0, k)]
+
+
+def measure(step, loop):
+    """
+    :return: 1ステップあたりの時間(ms)
+    """
+    step()
+    start = time.perf_counter()
+    for cnt in range(0, loop):
+        step()
+    return (time.perf_counter() - start) * 1000.0 / loop
+
+
+def main(loop=200):
+    x_vals, x_train, d_train, x_eval, d_eval = load_iris()
+
+    for k in [4, 16, 64]:
+        nets = create_nets(x_vals, k)
+
+        def separate():
+            for net in nets:
+                net.train_step(x_train, d_train)
+
+        stacked = nnet.StackedNet(create_nets(x_vals, k))
+        separate_msec = measure(separate, loop)
+        stacked_msec = measure(lambda: stacked.train_step(x_train, d_train), loop)
+        print("K={:<3} SimpleNet x K: {:8.3f} ms/step  StackedNet: {:8.3f} ms/step  ({:.1f}x)".format(
+            k, separate_msec, stacked_msec, separate_msec / stacked_msec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+推論プロセスの起動にかかる時間を、学習し直す場合と保存したネットワークを読み込む場合で比較します.
+
+    python -m benchmarks.bench_startup
+
+iris の回帰 (benchmarks/bench_optimizers.py と同じネットワーク) で、
+「loop 回学習してから predict」と「persist.load してから predict」の時間を計ります.
+W,b が大きいネットワークでは、mmap_mode="r" の読み込みが W,b の大きさによらずほぼ一定になります.
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from ai_chan import nnet, layer, func, grad, persist
+from benchmarks.bench_optimizers import load_iris, create_net
+
+
+def retrain(x_vals, x_train, d_train, x_eval, loop):
+    net = create_net(x_vals, grad.Adam())
+    for cnt in range(0, loop):
+        net.train_step(x_train, d_train)
+    return net.predict(x_eval)
+
+
+def load_predict(path, x_eval, mmap_mode):
+    net = persist.load(path, mmap_mode=mmap_mode)
+    return net.predict(x_eval)
+
+
+def measure(func, repeat=5):
+    """
+    :return: 最短の時間 (ms)
+    """
+    best = None
+    for cnt in range(0, repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(loop=2000, width=2048, depth=4):
+    x_vals, x_train, d_train, x_eval, d_eval = load_iris()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # iris: 学習し直す vs 読み込む
+        net = create_net(x_vals, grad.Adam())
+        for cnt in range(0, loop):
+            net.train_step(x_train, d_train)
+        path = os.path.join(tmp, "iris")
+        persist.save(net, path)
+
+        print("iris ({} iterations)".format(loop))
+        print("  retrain + predict      {:>10.3f} ms".format(
+            measure(lambda: retrain(x_vals, x_train, d_train, x_eval, loop), repeat=1)))
+        for mmap_mode in [None, "r"]:
+            print("  load({:<4}) + predict   {:>10.3f} ms".format(
+                str(mmap_mode), measure(lambda: load_predict(path, x_eval, mmap_mode))))
+
+        # W,b が大きいネットワーク: メモリに読み込む vs マップする
+        np.random.seed(0)
+        net = nnet.SimpleNet()
+        net.add_layer(*([3] + [width] * depth), layer_factory=layer.Random(), activate_function=func.Sigmoid())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        path = os.path.join(tmp, "wide")
+        persist.save(net, path)
+        size = sum([net.w[l].nbytes + net.b[l].nbytes for l in range(1, len(net.w))])
+
+        print("wide ({}x{}, W,b={:,} byte)".format(width, depth, size))
+        for mmap_mode in [None, "r"]:
+            print("  load({:<4})             {:>10.3f} ms".format(
+                str(mmap_mode), measure(lambda: persist.load(path, mmap_mode=mmap_mode))))
+
+
+if __name__ == '__main__':
+    main()
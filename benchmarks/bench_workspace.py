@@ -0,0 +1,71 @@
+"""
+作業領域 (SimpleNet.use_workspace) の有無で、学習1ステップあたりのメモリ確保量と時間を比較します.
+
+    python -m benchmarks.bench_workspace
+
+メモリ確保量は tracemalloc で測ります (numpy の配列データも tracemalloc に記録されます).
+1ステップの間に一時的に確保された最大バイト数 (peak - 開始時) を「確保量」としています.
+"""
+import time
+import tracemalloc
+import numpy as np
+from ai_chan import nnet, layer, func, grad
+
+
+def create_net(in_size, width, depth, out_size):
+    net = nnet.SimpleNet()
+    net.add_layer(*([in_size] + [width] * depth), layer_factory=layer.Random())
+    net.add_layer(out_size, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+    # 計測中に発散しないよう、学習率は小さくしておく
+    net.set_learning_rate(grad.Static(rate=10e-9))
+    return net
+
+
+def step(net, x, d):
+    y = net.forward(x)
+    dEdW, dEdB = net.backward(d, y)
+    net.adjust_network(dEdW, dEdB)
+
+
+def measure(net, x, d, loop):
+    """
+    :return: 1ステップあたりの確保量(byte), 1ステップあたりの時間(ms)
+    """
+    # 1回目は作業領域の確保が入るので、計測から外す
+    step(net, x, d)
+
+    tracemalloc.start()
+    allocated = 0
+    for cnt in range(0, loop):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(net, x, d)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - current
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for cnt in range(0, loop):
+        step(net, x, d)
+    elapsed = time.perf_counter() - start
+
+    return allocated / loop, elapsed * 1000.0 / loop
+
+
+def main(in_size=10, width=512, depth=3, out_size=1, batch_size=256, loop=50):
+    x = np.random.normal(0, 1, (in_size, batch_size))
+    d = np.random.normal(0, 1, (out_size, batch_size))
+
+    print("layers={}x{} batch={}".format(width, depth, batch_size))
+    for workspace in [False, True]:
+        np.random.seed(0)
+        net = create_net(in_size, width, depth, out_size)
+        if workspace:
+            net.use_workspace(batch_size)
+        allocated, msec = measure(net, x, d, loop)
+        print("workspace={:<5} alloc/step={:>12,.0f} byte  time/step={:.3f} ms".format(
+            str(workspace), allocated, msec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+forward / backward / adjust_network / NetTrainer.train の処理速度を、
+層の幅・深さ・バッチサイズ・活性化関数・重み減衰・バックエンドの組み合わせごとに測り、JSON に保存します.
+
+    python -m benchmarks.suite                       # 全ての組み合わせを測り、benchmarks/results/<commit>.json に保存
+    python -m benchmarks.suite --quick               # 組み合わせを減らして測る
+    python -m benchmarks.suite --output a.json       # 保存先を指定する
+    python -m benchmarks.suite --compare a.json b.json   # 2つの結果を比べる (b の a に対する時間の比)
+
+各測定は、1回の予備実行の後に repeat 回 (既定 5回) 測り、1回あたりの時間の中央値を記録します.
+cupy が使える環境では、cupy のバックエンドでも測ります. (測定の前後で GPU の処理が終わるのを待ちます)
+コミット間で比較できるように、結果にはコミットのハッシュ・numpy のバージョン・CPU数を記録します.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+from ai_chan import nnet, layer, func, weight, grad, backend
+from ai_chan.train import NetTrainer
+
+# 測定する組み合わせ
+GRID = {
+    "width": [16, 128, 512],
+    "depth": [1, 3],
+    "batch": [32, 256],
+    "activation": ["ReLu", "Sigmoid", "Tanh"],
+    "decay": ["NoDecay", "L2Decay", "L1Decay"]
+}
+
+# --quick のときの組み合わせ
+QUICK_GRID = {
+    "width": [16, 128],
+    "depth": [2],
+    "batch": [64],
+    "activation": ["ReLu", "Tanh"],
+    "decay": ["NoDecay", "L2Decay"]
+}
+
+ACTIVATIONS = {
+    "ReLu": func.ReLu,
+    "Sigmoid": func.Sigmoid,
+    "Tanh": func.Tanh
+}
+
+DECAYS = {
+    "NoDecay": weight.NoDecay,
+    "L1Decay": weight.L1Decay,
+    "L2Decay": weight.L2Decay
+}
+
+# 入力数・出力数 (iris の回帰と同じ)
+IN_SIZE = 3
+OUT_SIZE = 1
+# NetTrainer.train の1回の測定での学習回数
+TRAIN_LOOP = 20
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def backends():
+    """
+    測定するバックエンドのリストを返します (cupy は使える場合だけ)
+    """
+    names = ["numpy"]
+    if backend.cupy_available():
+        names.append("cupy")
+    return names
+
+
+def create_net(case, be):
+    np.random.seed(0)
+    net = nnet.SimpleNet(backend=be)
+    f = ACTIVATIONS[case["activation"]]
+    net.add_layer(*([IN_SIZE] + [case["width"]] * case["depth"]), layer_factory=layer.Xavier(), activate_function=f())
+    net.add_layer(OUT_SIZE, layer_factory=layer.Xavier(), activate_function=func.IdentityMapping())
+    # 測定中に発散しないよう、学習率は小さくしておく
+    net.set_learning_rate(grad.Static(rate=10e-6))
+    net.set_weight_decay(DECAYS[case["decay"]]())
+    return net
+
+
+def measure(fn, be, repeat, number=1):
+    """
+    fn を number 回呼ぶ時間を repeat 回測り、1回あたりの時間 (秒) の中央値を返します
+    """
+    fn()
+    be.synchronize()
+    times = []
+    for cnt in range(0, repeat):
+        start = time.perf_counter()
+        for n in range(0, number):
+            fn()
+        be.synchronize()
+        times.append((time.perf_counter() - start) / number)
+    return float(np.median(times))
+
+
+def run_case(case, backend_name, repeat):
+    """
+    1つの組み合わせについて、各処理の1回あたりの時間と、1秒あたりに処理できるデータ数を返します
+    """
+    be = backend.get_backend(backend_name)
+    batch = case["batch"]
+    x = be.asarray(np.random.normal(0, 1, (IN_SIZE, batch)))
+    d = be.asarray(np.random.normal(0, 1, (OUT_SIZE, batch)))
+
+    net = create_net(case, be)
+    y = net.forward(x)
+    dEdW, dEdB = net.backward(d, y)
+
+    # adjust_network は微分値を作業に使うので、測定のたびに元の微分値のコピーを渡す
+    def copy_grads():
+        return [None] + [g.copy() for g in dEdW[1:]], [None] + [g.copy() for g in dEdB[1:]]
+
+    def adjust():
+        net.adjust_network(*copy_grads())
+
+    seconds = {
+        "forward": measure(lambda: net.forward(x), be, repeat),
+        "backward": measure(lambda: net.backward(d, y), be, repeat),
+        # 微分値のコピーの時間は差し引く
+        "adjust_network": max(0.0, measure(adjust, be, repeat) - measure(copy_grads, be, repeat)),
+    }
+
+    # NetTrainer は教師データを5分割して、4つを訓練に使う
+    x_all = be.asarray(np.random.normal(0, 1, (IN_SIZE, batch * 5)))
+    d_all = be.asarray(np.random.normal(0, 1, (OUT_SIZE, batch * 5)))
+    trainer = NetTrainer(create_net(case, be), x_all, d_all)
+    seconds["train"] = measure(lambda: trainer.train(TRAIN_LOOP), be, repeat) / TRAIN_LOOP
+
+    result = dict(case)
+    result["backend"] = backend_name
+    result["seconds"] = seconds
+    result["samples_per_second"] = {name: batch / sec if sec > 0 else None for name, sec in seconds.items()}
+    return result
+
+
+def cases(grid):
+    names = list(grid.keys())
+    for values in itertools.product(*[grid[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def commit():
+    """
+    現在のコミットのハッシュを返します (git が使えなければ None)
+    """
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(grid=GRID, repeat=5, verbose=True):
+    """
+    全ての組み合わせを測ります
+    :return: 結果の dict (JSON にそのまま保存できます)
+    """
+    results = []
+    for backend_name in backends():
+        for case in cases(grid):
+            result = run_case(case, backend_name, repeat)
+            results.append(result)
+            if verbose:
+                print("{:<6} {}  {}".format(backend_name, _case_label(case), "  ".join(
+                    ["{}={:.3f}ms".format(name, sec * 1000.0) for name, sec in result["seconds"].items()])))
+
+    return {
+        "commit": commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "repeat": repeat,
+        "results": results
+    }
+
+
+def save(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base, target, threshold=1.1):
+    """
+    2つの結果の、同じ組み合わせ・同じ処理の時間の比 (target / base) を返します.
+    :param base: 基準の結果 (run の戻り値、または保存した JSON)
+    :param target: 比べる結果
+    :param threshold: この比を超えたものを遅くなった (regression=True) とみなします
+    :return: (組み合わせ, 処理名, 基準の時間, 比べる時間, 比, regression) のリスト
+    """
+    base_times = {}
+    for result in base["results"]:
+        for name, sec in result["seconds"].items():
+            base_times[(_case_key(result), name)] = sec
+
+    rows = []
+    for result in target["results"]:
+        for name, sec in result["seconds"].items():
+            before = base_times.get((_case_key(result), name))
+            if before is None or before <= 0:
+                continue
+            ratio = sec / before
+            rows.append((_case_key(result), name, before, sec, ratio, ratio > threshold))
+    return rows
+
+
+def _case_key(result):
+    return (result["backend"],) + tuple([result[name] for name in GRID.keys()])
+
+
+def _case_label(case):
+    return " ".join(["{}={}".format(name, case[name]) for name in GRID.keys()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ai_chan benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="組み合わせを減らして測る")
+    parser.add_argument("--repeat", type=int, default=5, help="測定の繰り返し回数")
+    parser.add_argument("--output", help="結果の保存先 (省略時は benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "TARGET"), help="2つの結果を比べる")
+    parser.add_argument("--threshold", type=float, default=1.1, help="遅くなったとみなす時間の比")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        rows = compare(load(args.compare[0]), load(args.compare[1]), threshold=args.threshold)
+        for key, name, before, after, ratio, regression in sorted(rows, key=lambda row: -row[4]):
+            print("{} {:<6} {}  {:<15} {:10.3f}ms -> {:10.3f}ms  x{:.2f}".format(
+                "!" if regression else " ", key[0], _case_label(dict(zip(GRID.keys(), key[1:]))), name,
+                before * 1000.0, after * 1000.0, ratio))
+        return
+
+    report = run(grid=QUICK_GRID if args.quick else GRID, repeat=args.repeat)
+    path = args.output
+    if path is None:
+        path = os.path.join(RESULTS_DIR, "{}.json".format(report["commit"] or "latest"))
+    save(report, path)
+    print("saved: {}".format(path))
+
+
+if __name__ == '__main__':
+    main()
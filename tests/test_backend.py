@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import backend, nnet, layer
+
+
+class CountingModule:
+    """
+    numpy に処理を委譲しながら、使われた関数の名前を記録するモジュールもどき
+    """
+    __name__ = "counting"
+
+    def __init__(self):
+        self.called = set()
+
+    def __getattr__(self, name):
+        self.called.add(name)
+        return getattr(np, name)
+
+
+class TestBackend(unittest.TestCase):
+
+    def test_get_backend(self):
+        """
+        get_backend が指定に応じたバックエンドを返すことを検証します.
+        """
+        self.assertIs(backend.NUMPY, backend.get_backend())
+        self.assertIs(backend.NUMPY, backend.get_backend("numpy"))
+        self.assertIs(backend.NUMPY, backend.get_backend(np))
+
+        b = backend.Backend(np)
+        self.assertIs(b, backend.get_backend(b))
+
+        if not backend.cupy_available():
+            self.assertIs(backend.NUMPY, backend.get_backend("auto"))
+
+        with self.assertRaises(ValueError):
+            backend.get_backend("fortran")
+
+    def test_net_uses_backend(self):
+        """
+        ネットワークが、コンストラクタで指定したバックエンドのモジュールで計算することを検証します.
+        """
+        module = CountingModule()
+        net = nnet.SimpleNet(backend=module)
+        net.add_layer(2, 3, layer_factory=layer.Seq())
+        net.add_layer(1, layer_factory=layer.Seq())
+
+        x = np.array([
+            [1],
+            [-1]
+        ])
+        y = net.forward(x)
+
+        npt.assert_array_equal([[2]], y)
+        self.assertIn("dot", module.called)
+        self.assertIn("maximum", module.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,9 @@ import numpy.testing as npt
 from ai_chan import nnet
 from ai_chan import layer
 from ai_chan import util
+from ai_chan import grad
+from ai_chan import weight
+from ai_chan import func
 
 
 class TestBackward(unittest.TestCase):
@@ -194,6 +197,165 @@ class TestBackward(unittest.TestCase):
             # パラメータ修正
             net.adjust_network(dEdW,dEdB)
 
+    def test_train_step(self):
+        """
+        train_step が forward → backward → adjust_network と同じ W,b に更新することを検証します.
+        """
+        x = np.array([
+            [ 1, -1, 2],
+            [-1,  1, 0]
+        ])
+        d = np.array([[0, 10, 3]])
+
+        for workspace in [None, 3]:
+            nets = []
+            for cnt in range(0, 2):
+                net = nnet.SimpleNet()
+                net.add_layer(2, 3, 4, layer_factory=layer.Seq())
+                net.add_layer(1, layer_factory=layer.Seq())
+                net.set_learning_rate(grad.Shrink())
+                net.set_weight_decay(weight.L2Decay())
+                net.use_workspace(workspace)
+                nets.append(net)
+
+            for cnt in range(0, 5):
+                y = nets[0].forward(x)
+                dEdW, dEdB = nets[0].backward(d, y)
+                nets[0].adjust_network(dEdW, dEdB)
+
+                nets[1].train_step(x, d)
+
+            for l in range(1, len(nets[0].w)):
+                npt.assert_allclose(nets[0].w[l], nets[1].w[l])
+                npt.assert_allclose(nets[0].b[l], nets[1].b[l])
+
+    def test_frozen_prefix(self):
+        """
+        W,b を固定した先頭の層には逆伝搬せず、W,b も変わらないことを検証します.
+        固定した層の出力から順伝搬 (start) しても、同じ W,b に更新することを検証します.
+        """
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (2, 6))
+        d = np.random.normal(0, 1, (1, 6))
+
+        for pack in [False, True]:
+            for workspace in [None, 6]:
+                nets = []
+                for cnt in range(0, 2):
+                    np.random.seed(1)
+                    net = nnet.SimpleNet()
+                    net.add_layer(2, 3, layer_factory=layer.Random(), fix_parameter=True)
+                    net.add_layer(4, layer_factory=layer.Random())
+                    net.add_layer(1, layer_factory=layer.Random())
+                    net.set_learning_rate(grad.Static(rate=0.01))
+                    net.set_weight_decay(weight.L2Decay())
+                    if pack:
+                        net.pack_parameters()
+                    net.use_workspace(workspace)
+                    nets.append(net)
+                w1 = nets[0].w[1].copy()
+                self.assertEqual(1, nets[0].frozen_prefix())
+
+                for cnt in range(0, 3):
+                    y = nets[0].forward(x)
+                    dEdW, dEdB = nets[0].backward(d, y)
+                    self.assertIsNone(dEdW[1])
+                    self.assertIsNone(dEdB[1])
+                    nets[0].adjust_network(dEdW, dEdB)
+
+                    nets[1].train_step(nets[1].predict(x, stop=1), d, start=1)
+
+                npt.assert_array_equal(w1, nets[0].w[1])
+                for l in range(1, len(nets[0].w)):
+                    npt.assert_allclose(nets[0].w[l], nets[1].w[l])
+                    npt.assert_allclose(nets[0].b[l], nets[1].b[l])
+
+        with self.assertRaises(ValueError):
+            nets[0].forward(x, start=2)
+
+    def test_compact_memento(self):
+        """
+        逆伝搬で読まない u を記録しなくても、同じ W,b に更新することを検証します.
+        """
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (2, 6))
+        d = np.random.normal(0, 1, (1, 6))
+
+        for workspace in [None, 6]:
+            nets = []
+            for compact in [False, True]:
+                np.random.seed(1)
+                net = nnet.SimpleNet()
+                net.add_layer(2, 5, layer_factory=layer.Random(), activate_function=func.ReLu())
+                net.add_layer(4, layer_factory=layer.Random(), activate_function=func.Tanh())
+                net.add_layer(3, layer_factory=layer.Random(), activate_function=func.Sigmoid())
+                net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+                net.set_learning_rate(grad.Static(rate=0.01))
+                net.use_workspace(workspace)
+                net.use_compact_memento(compact)
+                nets.append(net)
+
+            for cnt in range(0, 3):
+                for net in nets:
+                    net.train_step(x, d)
+
+            # 出力 z から微分値を求める層と出力層の u は記録しない
+            self.assertTrue(all([u is not None for u in nets[0].u_memento[1:]]))
+            self.assertTrue(all([u is None for u in nets[1].u_memento]))
+            for l in range(1, len(nets[0].w)):
+                npt.assert_allclose(nets[0].z_memento[l], nets[1].z_memento[l])
+                npt.assert_allclose(nets[0].w[l], nets[1].w[l])
+                npt.assert_allclose(nets[0].b[l], nets[1].b[l])
+
+    def test_checkpoint(self):
+        """
+        every 層ごとにだけ u,z を記録しても、同じ W,b に更新することを検証します.
+        """
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (2, 6))
+        d = np.random.normal(0, 1, (1, 6))
+
+        for every in [1, 2, 3]:
+            for compact in [False, True]:
+                nets = []
+                for checkpoint in [None, every]:
+                    np.random.seed(1)
+                    net = nnet.SimpleNet()
+                    net.add_layer(2, 5, 4, layer_factory=layer.Random(), activate_function=func.Tanh())
+                    net.add_layer(5, 4, 3, layer_factory=layer.Random(), activate_function=func.ReLu())
+                    net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+                    net.set_learning_rate(grad.Static(rate=0.01))
+                    net.set_weight_decay(weight.L2Decay())
+                    net.use_workspace(6)
+                    net.use_compact_memento(compact)
+                    net.use_checkpoint(checkpoint)
+                    nets.append(net)
+
+                for cnt in range(0, 3):
+                    y0 = nets[0].forward(x)
+                    y1 = nets[1].forward(x)
+                    npt.assert_allclose(y0, y1)
+                    # 入力・every 層ごと・出力層の z だけを記録する
+                    last = len(nets[1].w) - 1
+                    for l in range(0, last + 1):
+                        self.assertEqual(l % every == 0 or l == last, nets[1].z_memento[l] is not None)
+                    for net, y in [(nets[0], y0), (nets[1], y1)]:
+                        dEdW, dEdB = net.backward(d, y)
+                        net.adjust_network(dEdW, dEdB)
+                    # 計算し直した層の記録は、逆伝搬の後に捨てる
+                    for l in range(0, last + 1):
+                        self.assertEqual(l % every == 0 or l == last, nets[1].z_memento[l] is not None)
+
+                    nets[0].train_step(x, d)
+                    nets[1].train_step(x, d)
+
+                for l in range(1, len(nets[0].w)):
+                    npt.assert_allclose(nets[0].w[l], nets[1].w[l])
+                    npt.assert_allclose(nets[0].b[l], nets[1].b[l])
+
+        with self.assertRaises(ValueError):
+            nets[1].use_checkpoint(0)
+
 
 if __name__ == '__main__':
     unittest.main()
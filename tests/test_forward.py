@@ -123,6 +123,37 @@ class TestForward(unittest.TestCase):
             [2, 8]
         ], y)
 
+    def test_predict(self):
+        """
+        predict が forward と同じ予測値を返し、u,z の記録を変更しないことを検証します.
+        """
+        net = nnet.SimpleNet()
+        net.add_layer(2, 3, 4, 3, layer_factory=layer.Seq())
+        net.add_layer(1, layer_factory=layer.Seq())
+
+        x = np.array([
+            [ 1, -1, 2],
+            [-1,  1, 0]
+        ])
+        other = np.array([
+            [3],
+            [2]
+        ])
+
+        y = net.forward(x)
+        u_memento = [None if u is None else u.copy() for u in net.u_memento]
+        z_memento = [z.copy() for z in net.z_memento]
+
+        npt.assert_array_equal(y, net.predict(x))
+        npt.assert_array_equal(net.forward(other), net.predict(other))
+        net.forward(x)
+
+        # 推論しても、逆伝搬で使う u,z の記録は変わらない
+        net.predict(other)
+        for l in range(1, len(net.w)):
+            npt.assert_array_equal(u_memento[l], net.u_memento[l])
+            npt.assert_array_equal(z_memento[l], net.z_memento[l])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, grad, util
+
+
+class TestFunc(unittest.TestCase):
+
+    def test_differential_from_output(self):
+        """
+        出力 z = f(x) から求めた微分値が、x から求めた微分値と同じになることを検証します.
+        """
+        x = np.linspace(-3.0, 3.0, 13).reshape(1, -1)
+        for f in [func.IdentityMapping(), func.Sigmoid(), func.Tanh(), func.ReLu()]:
+            self.assertTrue(f.uses_output)
+            z = f.calc(x)
+            npt.assert_allclose(f.differential(x), f.differential_from_output(z), atol=1e-12)
+
+            out = np.empty_like(x)
+            self.assertIs(out, f.differential_from_output(z, out=out))
+            npt.assert_allclose(f.differential(x), out, atol=1e-12)
+
+    def test_differential_from_input(self):
+        """
+        uses_output でない活性化関数は、x から微分値を求めて学習することを検証します.
+        """
+        class Softplus(func.ActivateFunction):
+            def calc(self, x, xp=np, out=None):
+                return xp.log1p(xp.exp(x), out=out)
+
+            def differential(self, x, xp=np, out=None):
+                return func.Sigmoid().calc(x, xp=xp, out=out)
+
+            def inv(self, x, xp=np):
+                return x
+
+            def delta(self, d, y, out=None, xp=np):
+                return y - d
+
+            def name(self):
+                return "Softplus"
+
+        self.assertFalse(Softplus().uses_output)
+        with self.assertRaises(NotImplementedError):
+            Softplus().differential_from_output(np.zeros((1, 1)))
+
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (2, 8))
+        d = np.sum(x, axis=0, keepdims=True)
+        net = nnet.SimpleNet()
+        net.add_layer(2, 4, layer_factory=layer.Random(), activate_function=Softplus())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Static(rate=0.01))
+        net.use_compact_memento()
+        dEdW, dEdB = net.backward(d, net.forward(x))
+        # x から微分値を求める層の u は、記録を省略しない
+        self.assertIsNotNone(net.u_memento[1])
+        self.assertIsNone(net.u_memento[2])
+
+        # 数値微分と比べる
+        eps = 1e-6
+        net.w[1][0, 0] += eps
+        e1 = np.sum(np.square(net.predict(x) - d)) / 2.0
+        net.w[1][0, 0] -= 2 * eps
+        e2 = np.sum(np.square(net.predict(x) - d)) / 2.0
+        self.assertAlmostEqual((e1 - e2) / (2 * eps) / x.shape[1], dEdW[1][0, 0], places=6)
+
+    def test_softmax(self):
+        """
+        ソフトマックス関数が列ごとの確率になり、大きな入力でもオーバーフローしないことを検証します.
+        """
+        f = func.Softmax()
+        x = np.array([
+            [1.0, 1000.0, -5.0],
+            [2.0, 1000.0, -5.0],
+            [3.0, 999.0, -5.0]
+        ])
+        y = f.calc(x)
+        self.assertTrue(np.all(np.isfinite(y)))
+        npt.assert_allclose(np.ones((1, 3)), np.sum(y, axis=0, keepdims=True))
+        npt.assert_allclose(np.exp([1.0, 2.0, 3.0]) / np.sum(np.exp([1.0, 2.0, 3.0])), y[:, 0])
+        npt.assert_allclose([1.0 / 3.0] * 3, y[:, 2])
+
+        # out に x 自身を指定できる
+        z = x.copy()
+        self.assertIs(z, f.calc(z, out=z))
+        npt.assert_allclose(y, z)
+
+        with self.assertRaises(NotImplementedError):
+            f.differential(x)
+
+    def test_softmax_labels(self):
+        """
+        教師値がクラス番号の場合の δ と交差エントロピーが、one-hot の場合と同じになることを検証します.
+        """
+        f = func.Softmax()
+        y = f.calc(np.random.RandomState(0).normal(0, 1, (4, 5)))
+        labels = np.array([[0, 3, 1, 1, 2]])
+        one_hot = np.eye(4)[:, labels[0]]
+
+        npt.assert_allclose(f.delta(one_hot, y), f.delta(labels, y))
+        out = np.empty_like(y)
+        self.assertIs(out, f.delta(labels, y, out=out))
+        npt.assert_allclose(y - one_hot, out)
+        # y は変更しない
+        npt.assert_allclose(np.ones((1, 5)), np.sum(y, axis=0, keepdims=True))
+
+        self.assertAlmostEqual(util.cross_entropy(one_hot, y), util.cross_entropy(labels, y))
+        self.assertAlmostEqual(-np.sum(np.log(y[labels[0], np.arange(5)])), util.cross_entropy(labels, y))
+        # 確率が 0 でも発散しない
+        self.assertTrue(np.isfinite(util.cross_entropy(np.array([[1]]), np.array([[1.0], [0.0]]))))
+
+        # 積み重ねた (3次元の) 出力は、ネットワークごとの値になる
+        stacked = np.stack([y, y[::-1]])
+        npt.assert_allclose([util.cross_entropy(labels, y), util.cross_entropy(labels, y[::-1])],
+                            util.cross_entropy(labels, stacked))
+
+    def test_softmax_post_layer(self):
+        """
+        クラス番号の教師値からは、Softmax の出力層を作らないことを検証します. (one-hot の教師値からは作れます)
+        """
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (2, 20))
+        labels = (x[0:1] > 0).astype(np.int64)
+
+        net = nnet.SimpleNet()
+        net.add_layer(2, 4, layer_factory=layer.Random())
+        with self.assertRaises(ValueError):
+            net.add_post_layer(x, labels, activate_function=func.Softmax())
+        self.assertEqual(2, len(net.w))
+
+        net.add_post_layer(x, np.eye(2)[:, labels[0]], activate_function=func.Softmax())
+        self.assertEqual((2, 4), net.w[2].shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
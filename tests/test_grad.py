@@ -0,0 +1,159 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import grad, nnet, layer, func, util
+
+
+class TestGrad(unittest.TestCase):
+
+    def test_static(self):
+        """
+        Static が、勾配に学習係数を掛けた修正量を返すことを検証します.
+        """
+        g = grad.Static(rate=0.1)
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[1.0, -2.0]]), np.array([[3.0]]), 1)
+        npt.assert_allclose([[0.1, -0.2]], dEdW)
+        npt.assert_allclose([[0.3]], dEdB)
+
+    def test_schedule(self):
+        """
+        各 Schedule が、学習回数に応じたスカラーの係数を返すことを検証します.
+        """
+        self.assertAlmostEqual(0.1, grad.Constant(0.1).rate(100))
+        step = grad.StepDecay(1.0, step_size=10, gamma=0.5)
+        self.assertAlmostEqual(1.0, step.rate(10))
+        self.assertAlmostEqual(0.5, step.rate(11))
+        self.assertAlmostEqual(0.25, grad.ExponentialDecay(1.0, gamma=0.5).rate(3))
+        cosine = grad.CosineDecay(1.0, steps=10, min_rate=0.1)
+        self.assertAlmostEqual(1.0, cosine.rate(1))
+        self.assertAlmostEqual(0.55, cosine.rate(6))
+        self.assertAlmostEqual(0.1, cosine.rate(100))
+        warm_up = grad.WarmUp(0.1, steps=4)
+        self.assertAlmostEqual(0.025, warm_up.rate(1))
+        self.assertAlmostEqual(0.1, warm_up.rate(10))
+
+    def test_scalar_eta(self):
+        """
+        Static, Shrink の eta が、層ごとのスカラーを返すことを検証します.
+        要素ごとに係数が変わる AdaGrad だけが、行列を返します.
+        """
+        dEdW = [None, np.ones((2, 3)), np.ones((1, 2))]
+        dEdB = [None, np.ones((2, 1)), np.ones((1, 1))]
+
+        hw, hb = grad.Static(0.1, multipliers={2: 0.5}).eta(dEdW, dEdB)
+        self.assertEqual([None, 0.1, 0.05], hw)
+        self.assertEqual([None, 0.1, 0.05], hb)
+
+        g = grad.Shrink(0.1)
+        g.eta(dEdW, dEdB)
+        hw, hb = g.eta(dEdW, dEdB)
+        self.assertAlmostEqual(0.05, hw[1])
+
+        g = grad.AdaGrad(rate=0.1, epsilon=0.0)
+        g.next_step()
+        g.update(np.full((2, 3), 2.0), np.full((2, 1), 2.0), 1)
+        hw, hb = g.eta(dEdW, dEdB)
+        npt.assert_allclose(np.full((2, 3), 0.05), hw[1])
+        self.assertEqual(0.1, hw[2])
+
+    def test_scheduled_update(self):
+        """
+        Schedule と層ごとの倍率が、修正量に反映されることを検証します.
+        """
+        g = grad.Static(grad.StepDecay(0.1, step_size=1, gamma=0.5), multipliers={2: 2.0})
+        g.next_step()
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[1.0, -2.0]]), np.array([[3.0]]), 2)
+        npt.assert_allclose([[0.1, -0.2]], dEdW)
+        npt.assert_allclose([[0.3]], dEdB)
+
+    def test_momentum(self):
+        """
+        Momentum が、前回の修正量に慣性をつけた修正量を返すことを検証します.
+        """
+        g = grad.Momentum(rate=0.1, momentum=0.5)
+
+        # 1回目 v = 0.1 * g
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[1.0, -2.0]]), np.array([[4.0]]), 1)
+        npt.assert_allclose([[0.1, -0.2]], dEdW)
+        npt.assert_allclose([[0.4]], dEdB)
+
+        # 2回目 v = 0.5 * v + 0.1 * g
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[1.0, -2.0]]), np.array([[0.0]]), 1)
+        npt.assert_allclose([[0.15, -0.3]], dEdW)
+        npt.assert_allclose([[0.2]], dEdB)
+
+    def test_nesterov(self):
+        """
+        Nesterov が、μv + ηg を修正量とすることを検証します.
+        """
+        g = grad.Nesterov(rate=0.1, momentum=0.5)
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[1.0]]), np.array([[2.0]]), 1)
+        # v = 0.1, 修正量 = 0.5 * 0.1 + 0.1
+        npt.assert_allclose([[0.15]], dEdW)
+        npt.assert_allclose([[0.3]], dEdB)
+
+    def test_adagrad(self):
+        """
+        AdaGrad が、勾配の自乗和で割った修正量を返すことを検証します.
+        """
+        g = grad.AdaGrad(rate=0.1, epsilon=0.0)
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[3.0, -4.0]]), np.array([[2.0]]), 1)
+        npt.assert_allclose([[0.1, -0.1]], dEdW)
+
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[4.0, 3.0]]), np.array([[2.0]]), 1)
+        npt.assert_allclose([[0.1 * 4.0 / 5.0, 0.1 * 3.0 / 5.0]], dEdW)
+
+    def test_adam(self):
+        """
+        Adam の1回目の修正量が、およそ α sign(g) になることを検証します.
+        """
+        g = grad.Adam(rate=0.01)
+        g.next_step()
+        dEdW, dEdB = g.update(np.array([[3.0, -0.5]]), np.array([[2.0]]), 1)
+        npt.assert_allclose([[0.01, -0.01]], dEdW, rtol=10e-6)
+        npt.assert_allclose([[0.01]], dEdB, rtol=10e-6)
+
+    def test_state(self):
+        """
+        状態の配列は最初の update で1度だけ確保され、以降はその場で更新されることを検証します.
+        """
+        for g in [grad.Momentum(), grad.Nesterov(), grad.AdaGrad(), grad.RMSProp(), grad.Adam()]:
+            g.next_step()
+            g.update(np.ones((2, 3)), np.ones((2, 1)), 1)
+            state = [a for a in g.state[(1, 0)]]
+            for cnt in range(0, 3):
+                g.next_step()
+                g.update(np.ones((2, 3)), np.ones((2, 1)), 1)
+            for before, after in zip(state, g.state[(1, 0)]):
+                self.assertIs(before, after)
+
+    def test_train(self):
+        """
+        各アルゴリズムで学習すると誤差が小さくなることを検証します.
+        """
+        x = np.random.normal(0, 1, (3, 20))
+        d = np.sum(x, axis=0, keepdims=True)
+
+        for g in [grad.Momentum(), grad.Nesterov(), grad.AdaGrad(), grad.RMSProp(), grad.Adam()]:
+            np.random.seed(0)
+            net = nnet.SimpleNet()
+            net.add_layer(3, 10, activate_function=func.Tanh(), layer_factory=layer.Random())
+            net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+            net.set_learning_rate(g)
+
+            first = util.least_square_average(d, net.forward(x))
+            for cnt in range(0, 100):
+                net.train_step(x, d)
+            last = util.least_square_average(d, net.forward(x))
+            self.assertLess(last, first, g.__class__.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import itertools
+import sys
+import unittest
+import warnings
+from unittest import mock
+import numpy as np
+import numpy.testing as npt
+from ai_chan import hyper, nnet, layer, func, grad
+
+
+def create_net(params):
+    """
+    ハイパーパラメータからネットワークを作ります. (ワーカープロセスに渡すので、モジュールの関数にする)
+    """
+    net = nnet.SimpleNet()
+    net.add_layer(3, params["units"], layer_factory=layer.Random(), activate_function=params["f"])
+    net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+    net.set_learning_rate(grad.Static(rate=params["rate"]))
+    return net
+
+
+class TestHyper(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.x = np.random.normal(0, 1, (3, 50))
+        self.d = np.sum(self.x, axis=0, keepdims=True)
+        self.space = {
+            "units": [4, 8, 16],
+            "f": [func.Sigmoid(), func.Tanh(), func.ReLu()],
+            "rate": [0.001, 0.01, 0.1]
+        }
+
+    def test_orthogonal_array(self):
+        """
+        直交表のどの2列をとっても、水準の組み合わせが同じ回数ずつ現れることを検証します.
+        """
+        for levels in [[2, 2, 2], [3, 3, 3, 3], [5, 5, 5, 5, 5, 5]]:
+            table = np.array(hyper.orthogonal_array(levels))
+            self.assertEqual(len(levels), table.shape[1])
+            for i, j in itertools.combinations(range(0, len(levels)), 2):
+                pairs = [tuple(row) for row in table[:, [i, j]]]
+                counts = [pairs.count(pair) for pair in itertools.product(range(levels[i]), range(levels[j]))]
+                self.assertEqual(1, len(set(counts)))
+
+        self.assertEqual(9, len(hyper.orthogonal_array([3, 3, 3, 3])))
+
+    def test_experiments(self):
+        """
+        直交表では 9 実験、全組み合わせでは 27 実験になり、実験ごとに異なる乱数の種が割り当てられることを検証します.
+        """
+        trainer = hyper.HyperTrainer(create_net, self.space, self.x, self.d)
+        trials = trainer.experiments()
+        self.assertEqual(9, len(trials))
+        self.assertEqual(9, len(set([trial.seed for trial in trials])))
+        self.assertEqual(trials[0].seed, hyper.HyperTrainer(create_net, self.space, self.x, self.d).experiments()[0].seed)
+
+        trainer = hyper.HyperTrainer(create_net, self.space, self.x, self.d, design="grid")
+        self.assertEqual(27, len(trainer.experiments()))
+
+    def test_run(self):
+        """
+        プロセスプールで実行した結果が、同じ種で順に実行した結果と一致することを検証します.
+        """
+        serial = hyper.HyperTrainer(create_net, self.space, self.x, self.d, loop=20, max_workers=0)
+        best = serial.train()
+        self.assertEqual(9, len(serial.results))
+        self.assertEqual(min([trial.error for trial in serial.results]), best.error)
+
+        parallel = hyper.HyperTrainer(create_net, self.space, self.x, self.d, loop=20, max_workers=2)
+        streamed = [trial.index for trial in parallel.run()]
+        self.assertEqual(list(range(0, 9)), sorted(streamed))
+
+        errors = {trial.index: trial.error for trial in serial.results}
+        for trial in parallel.results:
+            self.assertAlmostEqual(errors[trial.index], trial.error)
+            npt.assert_array_equal(list(range(0, 20)), trial.gx)
+
+        effects = parallel.effects()
+        self.assertEqual(3, len(effects["rate"]))
+
+    def test_train_options(self):
+        """
+        NetTrainer.train のオプションが、各実験に渡されることを検証します.
+        """
+        trainer = hyper.HyperTrainer(create_net, self.space, self.x, self.d, loop=20, max_workers=0, eval_every=5)
+        trainer.train()
+        for trial in trainer.results:
+            npt.assert_array_equal([0, 5, 10, 15], trial.gx)
+
+    def test_warn_without_threadpoolctl(self):
+        """
+        threadpoolctl が無いときは、BLAS のスレッド数を制限できないことを1度だけ警告することを検証します.
+        """
+        with mock.patch.dict(sys.modules, {"threadpoolctl": None}), mock.patch.object(hyper, "_warned_threadpoolctl",
+                                                                                        False):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                hyper._init_worker(1, self.x, self.d)
+                hyper._init_worker(1, self.x, self.d)
+                # スレッド数を制限しない場合は警告しない
+                hyper._init_worker(None, self.x, self.d)
+        self.assertEqual(1, len([w for w in caught if "threadpoolctl" in str(w.message)]))
+
+    def test_successive_halving(self):
+        """
+        段ごとに実験が半分に減り、残った実験は続きから学習することを検証します.
+        """
+        for max_workers in [0, 2]:
+            trainer = hyper.SuccessiveHalving(create_net, self.space, self.x, self.d, min_loop=5, reduction=2,
+                                              max_workers=max_workers)
+            rungs = {}
+            for trial in trainer.run():
+                rungs.setdefault(trial.rung, []).append(trial)
+
+            # 27 → 13 → 6 → 3 → 1
+            self.assertEqual([27, 13, 6, 3, 1], [len(rungs[rung]) for rung in sorted(rungs.keys())])
+            self.assertEqual(27, len(trainer.results))
+
+            best = trainer.best()
+            self.assertEqual(80, best.iteration)
+            npt.assert_array_equal(list(range(0, 80)), best.gx)
+            # 最後に残った実験は、1段目でも上位にいる
+            first = sorted(rungs[0], key=lambda trial: trial.error)
+            self.assertIn(best.index, [trial.index for trial in first[0:13]])
+            self.assertEqual(80, trainer.trainers[best.index].iteration)
+
+            # 残った実験の学習器は、続きから学習でき、学習結果も取り出せる
+            survivor = trainer.trainers[best.index]
+            survivor.train(5)
+            self.assertEqual(85, survivor.iteration)
+            d_train, y_train, d_eval, y_eval = survivor.eval()
+            self.assertEqual(d_eval.shape, y_eval.shape)
+
+    def test_successive_halving_max_loop(self):
+        """
+        max_loop に達したら、残った実験がいくつでも終わることを検証します.
+        """
+        trainer = hyper.SuccessiveHalving(create_net, self.space, self.x, self.d, min_loop=5, max_loop=12,
+                                          reduction=3, max_workers=0)
+        trainer.train()
+        self.assertEqual(9, len(trainer.survivors))
+        for trial in trainer.survivors:
+            self.assertEqual(12, trial.iteration)
+
+
+if __name__ == '__main__':
+    unittest.main()
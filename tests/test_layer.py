@@ -0,0 +1,150 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import layer, nnet, func, grad
+
+
+class TestLeastSquare(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.x = np.random.normal(0, 1, (4, 200))
+        self.w = np.random.normal(0, 1, (3, 4))
+        self.b = np.random.normal(0, 1, (3, 1))
+        self.y = np.dot(self.w, self.x) + self.b
+
+    def test_multi_output(self):
+        """
+        複数の出力を1度に回帰し、出力ごとに回帰した結果と一致することを検証します.
+        """
+        for method in ["lstsq", "normal", "auto"]:
+            w, b = layer.LeastSquare(method=method).create(self.x, self.y)
+            self.assertEqual((3, 4), w.shape)
+            self.assertEqual((3, 1), b.shape)
+            npt.assert_allclose(self.w, w, err_msg=method)
+            npt.assert_allclose(self.b, b, err_msg=method)
+
+        # 出力が1つの場合は、1次元の教師値も受け付ける
+        w, b = layer.LeastSquare().create(self.x, self.y[1])
+        npt.assert_allclose(self.w[1:2], w)
+        npt.assert_allclose(self.b[1:2], b)
+
+    def test_ridge(self):
+        """
+        リッジ回帰では W が 0 に近づき、lstsq と正規方程式で同じ結果になることを検証します.
+        """
+        w, b = layer.LeastSquare(ridge=10.0).create(self.x, self.y)
+        self.assertLess(np.sum(np.square(w)), np.sum(np.square(self.w)))
+
+        w2, b2 = layer.LeastSquare(ridge=10.0, method="normal").create(self.x, self.y)
+        npt.assert_allclose(w, w2)
+        npt.assert_allclose(b, b2)
+
+    def test_singular(self):
+        """
+        AᵀA が正則でない (同じ特徴が2つある) 場合、正規方程式でも lstsq で解き直すことを検証します.
+        """
+        x = np.vstack((self.x, self.x[0:1]))
+        w, b = layer.LeastSquare(method="normal").create(x, self.y)
+        w2, b2 = layer.LeastSquare(method="lstsq").create(x, self.y)
+        npt.assert_allclose(w2, w, atol=1e-8)
+        npt.assert_allclose(np.dot(w, x) + b, self.y, atol=1e-8)
+
+
+class TestNormalize(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.x = np.random.normal(5, 3, (4, 100))
+        self.d = np.sum(self.x, axis=0, keepdims=True)
+
+    def test_streaming(self):
+        """
+        データの塊ごとに読んで求めた W,b が、全データで求めた W,b と一致することを検証します.
+        """
+        w, b = layer.Normalize().create(self.x)
+        w2, b2 = layer.Normalize().create(chunks=iter(np.array_split(self.x, [1, 30, 31, 77], axis=1)))
+        npt.assert_allclose(w, w2)
+        npt.assert_allclose(b, b2)
+
+        # 塊を渡した場合は、層の出力は求めない
+        net = nnet.SimpleNet()
+        self.assertIsNone(net.add_pre_layer(layer.Normalize(), chunks=np.array_split(self.x, 3, axis=1)))
+        npt.assert_allclose(w, net.w[1])
+
+        with self.assertRaises(ValueError):
+            layer.Normalize().create(self.x, chunks=[self.x])
+
+    def test_array_like(self):
+        """
+        配列に変換できる入力データ (list など) は、1つの配列として扱うことを検証します.
+        """
+        w, b = layer.Normalize().create(self.x)
+        w2, b2 = layer.Normalize().create(self.x.tolist())
+        npt.assert_allclose(w, w2)
+        npt.assert_allclose(b, b2)
+
+        net = nnet.SimpleNet()
+        z = net.add_pre_layer(layer.Normalize(), x=self.x.tolist())
+        npt.assert_allclose(func.ReLu().calc(np.dot(w, self.x) + b), z)
+
+    def create_net(self, diagonal, workspace=False):
+        np.random.seed(0)
+        net = nnet.SimpleNet()
+        net.add_pre_layer(layer.Normalize(diagonal=diagonal), x=self.x)
+        net.add_layer(6, layer_factory=layer.Random())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Static(rate=0.01))
+        if workspace:
+            net.use_workspace(self.x.shape[1])
+        return net
+
+    def test_diagonal(self):
+        """
+        対角スケール層が、対角行列の層と同じ出力・同じ (対角成分の) 微分値になることを検証します.
+        """
+        dense = self.create_net(False)
+        self.assertEqual((8, 4), dense.w[1].shape)
+        for workspace in [False, True]:
+            net = self.create_net(True, workspace=workspace)
+            self.assertEqual([None, 2, 0, 0], net.diagonal)
+            self.assertEqual((8, 1), net.w[1].shape)
+
+            y = dense.forward(self.x)
+            npt.assert_allclose(y, net.forward(self.x))
+            npt.assert_allclose(dense.predict(self.x), net.predict(self.x))
+
+            dense_w, dense_b = dense.backward(self.d, y)
+            dEdW, dEdB = net.backward(self.d, y)
+            # 対角行列の層の対角成分 (上下2つの n×n ブロックの対角)
+            diag = np.concatenate((np.diag(dense_w[1][0:4]), np.diag(dense_w[1][4:8])))
+            npt.assert_allclose(diag.reshape(-1, 1), dEdW[1])
+            for l in range(1, 4):
+                npt.assert_allclose(dense_b[l], dEdB[l])
+            for l in range(2, 4):
+                npt.assert_allclose(dense_w[l], dEdW[l])
+
+    def test_diagonal_backprop(self):
+        """
+        対角スケール層の誤差逆伝搬が、対角行列の転置を掛けたものと一致することを検証します.
+        """
+        w = np.random.normal(0, 1, (8, 1))
+        delta = np.random.normal(0, 1, (8, 5))
+        dense = np.vstack((np.diag(w[0:4, 0]), np.diag(w[4:8, 0])))
+        npt.assert_allclose(np.dot(dense.T, delta), nnet._diagonal_backprop(w, delta, 2))
+
+    def test_stacked(self):
+        """
+        対角スケール層のあるネットワークも、まとめて学習できることを検証します.
+        """
+        net = self.create_net(True)
+        stacked = nnet.StackedNet([self.create_net(True), self.create_net(True)])
+        for cnt in range(0, 5):
+            net.train_step(self.x, self.d)
+            stacked.train_step(self.x, self.d)
+        for l in range(1, 4):
+            npt.assert_allclose(net.w[l], stacked.w[l][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, grad, train, metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_series(self):
+        """
+        確保した件数を超えても、すべての値を記録できることを検証します.
+        """
+        series = metrics.Series(capacity=4)
+        for cnt in range(0, 10):
+            series.append(cnt, cnt * 0.5)
+        self.assertEqual(10, len(series))
+        npt.assert_array_equal(np.arange(0, 10), series.x)
+        npt.assert_allclose(np.arange(0, 10) * 0.5, series.values)
+
+    def test_every(self):
+        series = metrics.Series(mode="every", every=3)
+        for cnt in range(0, 10):
+            series.append(cnt, float(cnt))
+        npt.assert_array_equal([0, 3, 6, 9], series.x)
+        self.assertEqual(10, series.count)
+
+    def test_reservoir(self):
+        """
+        リザーバサンプリングでは capacity 件だけを、学習回数の順に記録し、np.random の状態を変えないことを検証します.
+        """
+        np.random.seed(0)
+        expected = np.random.rand()
+
+        np.random.seed(0)
+        series = metrics.Series(mode="reservoir", capacity=100)
+        for cnt in range(0, 10000):
+            series.append(cnt, float(cnt))
+        self.assertEqual(expected, np.random.rand())
+
+        self.assertEqual(100, len(series))
+        self.assertTrue(np.all(np.diff(series.x) > 0))
+        npt.assert_array_equal(series.x, series.values)
+        # 全体から均等に選ぶので、後半の値も選ばれている
+        self.assertGreater(np.sum(series.x >= 5000), 20)
+
+    def test_trainer(self):
+        """
+        NetTrainer が、訓練誤差・汎化誤差・追加の指標を記録し、ファイルにも書き出すことを検証します.
+        """
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (3, 100))
+        d = np.sum(x, axis=0, keepdims=True)
+        net = nnet.SimpleNet()
+        net.add_layer(3, 10, layer_factory=layer.Random(), activate_function=func.Tanh())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Static(rate=0.01))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.jsonl")
+            recorder = metrics.Recorder(writer=metrics.JsonlWriter(path),
+                                        series={"train_error": metrics.Series(mode="every", every=5)})
+            trainer = train.NetTrainer(net, x, d, metrics=recorder)
+            trainer.add_metric("norm", metrics.parameter_norm)
+            trainer.train(20, eval_every=10)
+            recorder.close()
+
+            npt.assert_array_equal([0, 5, 10, 15], trainer.tx)
+            npt.assert_array_equal([0, 10], trainer.gx)
+            npt.assert_array_equal([0, 10], recorder["norm"].x)
+            self.assertGreater(recorder["norm"].values[0], 0.0)
+
+            # ファイルには、間引いた値も書き出す
+            data = metrics.read_jsonl(path)
+            npt.assert_array_equal(np.arange(0, 20), data["train_error"][0])
+            npt.assert_allclose(trainer.ge, data["eval_error"][1])
+            npt.assert_allclose(recorder["norm"].values, data["norm"][1])
+
+    def test_writer_buffer(self):
+        """
+        JsonlWriter が flush_every 件ごとと close のときに、ファイルに書き出すことを検証します.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.jsonl")
+            writer = metrics.JsonlWriter(path, flush_every=3, flush_seconds=None)
+            for cnt in range(0, 2):
+                writer.write("loss", cnt, 0.5)
+            self.assertEqual({}, metrics.read_jsonl(path))
+
+            writer.write("loss", 2, 0.5)
+            npt.assert_array_equal([0, 1, 2], metrics.read_jsonl(path)["loss"][0])
+
+            writer.write("loss", 3, 0.5)
+            writer.close()
+            npt.assert_array_equal([0, 1, 2, 3], metrics.read_jsonl(path)["loss"][0])
+
+            # 時間でも書き出す
+            writer = metrics.JsonlWriter(path, flush_every=100, flush_seconds=0.0)
+            writer.write("loss", 4, 0.5)
+            npt.assert_array_equal([0, 1, 2, 3, 4], metrics.read_jsonl(path)["loss"][0])
+            writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
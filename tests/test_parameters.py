@@ -0,0 +1,101 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, weight, train
+
+
+class TestParameters(unittest.TestCase):
+
+    def create_net(self, packed=False, workspace=None):
+        np.random.seed(1)
+        net = nnet.SimpleNet()
+        net.add_layer(3, 8, 6, activate_function=func.Sigmoid())
+        net.add_layer(2, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_weight_decay(weight.L2Decay(rate=0.01))
+        net.use_workspace(workspace)
+        if packed:
+            net.pack_parameters()
+        return net
+
+    def test_pack(self):
+        """
+        W,b をまとめても値が変わらず、w[l], b[l] がまとめた配列のビューになることを検証します.
+        """
+        net1 = self.create_net()
+        net2 = self.create_net(packed=True)
+
+        self.assertEqual(1, net2.parameters.flat.ndim)
+        for l in range(1, len(net1.w)):
+            npt.assert_array_equal(net1.w[l], net2.w[l])
+            npt.assert_array_equal(net1.b[l], net2.b[l])
+            self.assertTrue(np.shares_memory(net2.w[l], net2.parameters.flat))
+            self.assertTrue(np.shares_memory(net2.b[l], net2.parameters.flat))
+
+        self.assertAlmostEqual(net1.parameter_norm(), net2.parameter_norm())
+
+    def test_train(self):
+        """
+        W,b をまとめて学習しても、まとめない場合と同じ W,b になり、
+        学習後も w[l], b[l] がまとめた配列のビューのままであることを検証します.
+        """
+        x = np.random.normal(0, 1, (3, 5))
+        d = np.random.normal(0, 1, (2, 5))
+
+        expected = self.create_net()
+        nets = [self.create_net(packed=True), self.create_net(packed=True, workspace=5)]
+        for cnt in range(0, 10):
+            for net in [expected] + nets:
+                y = net.forward(x)
+                dEdW, dEdB = net.backward(d, y)
+                net.adjust_network(dEdW, dEdB)
+
+        stepped = self.create_net(packed=True)
+        for cnt in range(0, 10):
+            stepped.train_step(x, d)
+
+        for net in nets + [stepped]:
+            for l in range(1, len(expected.w)):
+                npt.assert_allclose(expected.w[l], net.w[l])
+                npt.assert_allclose(expected.b[l], net.b[l])
+                self.assertTrue(np.shares_memory(net.w[l], net.parameters.flat))
+
+    def test_snapshot(self):
+        """
+        スナップショットを取って戻せること、前回のスナップショットに上書きできることを検証します.
+        """
+        for packed in [False, True]:
+            net = self.create_net(packed=packed)
+            snapshot = net.snapshot_parameters()
+            w, b = net.parameter_views(snapshot)
+            npt.assert_array_equal(net.w[2], w[2])
+            npt.assert_array_equal(net.b[2], b[2])
+
+            expected = net.w[1].copy()
+            net.w[1] += 1.0
+            net.restore_parameters(snapshot)
+            npt.assert_array_equal(expected, net.w[1])
+
+            net.b[2] += 1.0
+            self.assertIs(snapshot, net.snapshot_parameters(out=snapshot))
+            npt.assert_array_equal(net.b[2], b[2])
+
+    def test_trainer(self):
+        """
+        NetTrainer が、最小エラー時の W,b を学習中の W,b とは別に保存することを検証します.
+        """
+        x = np.random.normal(0, 1, (3, 50))
+        d = np.random.normal(0, 1, (2, 50))
+
+        for packed in [False, True]:
+            net = self.create_net(packed=packed)
+            start = net.w[1].copy()
+            trainer = train.NetTrainer(net, x, d)
+            trainer.train(20)
+
+            npt.assert_array_equal(start, trainer.start_w[1])
+            self.assertEqual(net.w[1].shape, trainer.finish_w[1].shape)
+            self.assertFalse(np.shares_memory(net.w[1], trainer.finish_w[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
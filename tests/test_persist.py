@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, grad, weight, persist, precision
+
+
+class TestPersist(unittest.TestCase):
+
+    def create_net(self, p=None):
+        np.random.seed(0)
+        net = nnet.SimpleNet(precision=p)
+        net.add_layer(3, 8, activate_function=func.Sigmoid(), layer_factory=layer.Random())
+        net.add_layer(6, activate_function=func.Tanh(), layer_factory=layer.Random(), fix_parameter=True)
+        net.add_layer(2, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Adam(rate=grad.WarmUp(grad.CosineDecay(0.01, steps=100), steps=10),
+                                        multipliers={2: 0.5}))
+        net.set_weight_decay(weight.L2Decay(rate=0.01))
+        return net
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "net")
+        self.x = np.random.normal(0, 1, (3, 10))
+        self.d = np.random.normal(0, 1, (2, 10))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_save_load(self):
+        """
+        保存したネットワークを読み込むと、同じ層構成・パラメータ・学習係数・重み減衰になることを検証します.
+        """
+        net = self.create_net()
+        for cnt in range(0, 5):
+            net.train_step(self.x, self.d)
+        persist.save(net, self.path)
+
+        loaded = persist.load(self.path)
+
+        self.assertIsInstance(loaded, nnet.SimpleNet)
+        self.assertEqual(len(net.w), len(loaded.w))
+        for l in range(1, len(net.w)):
+            npt.assert_array_equal(net.w[l], loaded.w[l])
+            npt.assert_array_equal(net.b[l], loaded.b[l])
+            self.assertIs(type(net.f[l]), type(loaded.f[l]))
+        self.assertEqual(net.learning_flag, loaded.learning_flag)
+        npt.assert_array_equal(net.predict(self.x), loaded.predict(self.x))
+
+        self.assertIsInstance(loaded.g, grad.Adam)
+        self.assertEqual(5, loaded.g.cnt)
+        self.assertEqual({2: 0.5}, loaded.g.multipliers)
+        self.assertIsInstance(loaded.g.schedule, grad.WarmUp)
+        self.assertAlmostEqual(net.g.layer_rate(2), loaded.g.layer_rate(2))
+        # 配列の状態も保存する
+        self.assertEqual(sorted(net.g.state.keys()), sorted(loaded.g.state.keys()))
+        for key, arrays in net.g.state.items():
+            for a, b in zip(arrays, loaded.g.state[key]):
+                npt.assert_array_equal(a, b)
+        self.assertIsInstance(loaded.d, weight.L2Decay)
+        self.assertEqual(0.01, loaded.d.rate)
+
+        # 読み込んだネットワークで、保存した時点の続きから同じように学習できる
+        for cnt in range(0, 3):
+            net.train_step(self.x, self.d)
+            loaded.train_step(self.x, self.d)
+        for l in range(1, len(net.w)):
+            npt.assert_allclose(net.w[l], loaded.w[l])
+            npt.assert_allclose(net.b[l], loaded.b[l])
+
+    def test_reject_foreign_class(self):
+        """
+        manifest.json に ai_chan 以外のクラス名が書かれていたら、読み込まないことを検証します.
+        """
+        persist.save(self.create_net(), self.path)
+        manifest_path = os.path.join(self.path, persist.MANIFEST)
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        for key, value in [("net", "subprocess.Popen"),
+                           ("grad", {"class": "os.system", "attributes": {}}),
+                           ("weight_decay", {"class": "ai_chan.persist.load", "attributes": {}})]:
+            broken = dict(manifest)
+            broken[key] = value
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(broken, f)
+            with self.assertRaises(ValueError):
+                persist.load(self.path)
+
+    def test_mmap(self):
+        """
+        mmap_mode を指定すると、W,b がファイルをマップした配列になることを検証します.
+        """
+        net = self.create_net(precision.FLOAT32)
+        persist.save(net, self.path)
+
+        loaded = persist.load(self.path, mmap_mode="r")
+        for l in range(1, len(net.w)):
+            # ファイルをマップした配列のビュー (コピーしていない)
+            self.assertIsInstance(loaded.w[l].base, np.memmap)
+            self.assertEqual(np.float32, loaded.w[l].dtype)
+        self.assertEqual(np.float32, loaded.precision.dtype)
+        npt.assert_array_equal(net.predict(self.x), loaded.predict(self.x))
+
+        # コピーオンライトなら学習できて、ファイルは変わらない
+        loaded = persist.load(self.path, mmap_mode="c")
+        loaded.train_step(self.x, self.d)
+        npt.assert_array_equal(net.w[1], np.load(os.path.join(self.path, "w_1.npy")))
+
+    def test_save_snapshot(self):
+        """
+        w, b を指定すると、ネットワークの W,b の代わりにそれを保存することを検証します.
+        """
+        net = self.create_net()
+        w, b = net.parameter_views(net.snapshot_parameters())
+        net.train_step(self.x, self.d)
+        persist.save(net, self.path, w=w, b=b)
+
+        loaded = persist.load(self.path)
+        npt.assert_array_equal(w[1], loaded.w[1])
+        npt.assert_array_equal(b[3], loaded.b[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
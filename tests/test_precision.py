@@ -0,0 +1,152 @@
+import pickle
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import precision, nnet, layer, func, grad, weight, util
+
+
+class TestPrecision(unittest.TestCase):
+
+    def create_net(self, p, decay=weight.L2Decay(rate=0.01), g=None):
+        np.random.seed(0)
+        net = nnet.SimpleNet(precision=p)
+        net.add_pre_layer(layer.Normalize(), x=self.x)
+        net.add_layer(10, layer_factory=layer.Xavier(), activate_function=func.Sigmoid())
+        net.add_layer(8, layer_factory=layer.He())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Static(rate=0.01) if g is None else g)
+        net.set_weight_decay(decay)
+        return net
+
+    def setUp(self):
+        np.random.seed(1)
+        self.x = np.random.normal(0, 1, (3, 16))
+        self.d = np.sum(self.x, axis=0, keepdims=True)
+
+    def test_get_precision(self):
+        """
+        get_precision が指定に応じた精度を返すことを検証します.
+        """
+        self.assertIs(precision.FLOAT64, precision.get_precision())
+        self.assertIs(precision.FLOAT32, precision.get_precision("float32"))
+        self.assertIs(precision.MIXED16, precision.get_precision("mixed16"))
+        self.assertEqual(np.float32, precision.get_precision(np.float32).dtype)
+        self.assertEqual("float16/float32", precision.MIXED16.name())
+        self.assertGreater(precision.MIXED16.epsilon(), precision.FLOAT32.epsilon())
+        self.assertGreater(precision.FLOAT32.epsilon(), precision.FLOAT64.epsilon())
+
+        with self.assertRaises(ValueError):
+            precision.get_precision("int8")
+
+    def test_equality(self):
+        """
+        作り直した精度 (persist.load, pickle) も、型が同じなら同じ精度とみなすことを検証します.
+        """
+        self.assertEqual(precision.FLOAT64, precision.Precision(np.float64))
+        self.assertEqual(precision.FLOAT64, pickle.loads(pickle.dumps(nnet.SimpleNet())).precision)
+        self.assertEqual(precision.MIXED16, precision.Precision("float32", storage="float16"))
+        self.assertNotEqual(precision.FLOAT32, precision.MIXED16)
+        self.assertNotEqual(precision.FLOAT64, np.float64)
+        self.assertEqual(1, len({precision.FLOAT32, precision.Precision(np.float32)}))
+
+    def test_factory_dtype(self):
+        """
+        すべてのレイヤファクトリが、指定した型の W,b を作ることを検証します.
+        """
+        for factory in [layer.Seq(), layer.Random(), layer.Xavier(), layer.He()]:
+            w, b = factory.create(3, 2, dtype=np.float32)
+            self.assertEqual(np.float32, w.dtype, factory.__class__.__name__)
+            self.assertEqual(np.float32, b.dtype, factory.__class__.__name__)
+
+        w, b = layer.Normalize().create(self.x, dtype=np.float32)
+        self.assertEqual(np.float32, w.dtype)
+        self.assertEqual(np.float32, b.dtype)
+
+        w, b = layer.LeastSquare().create(self.x, self.d[0], dtype=np.float32)
+        self.assertEqual(np.float32, w.dtype)
+        self.assertEqual(np.float32, b.dtype)
+
+    def test_float32(self):
+        """
+        float32 のネットワークでは、W,b・活性・微分値・正則化項がすべて float32 のまま学習できることを検証します.
+        """
+        for decay in [weight.NoDecay(), weight.L1Decay(rate=0.01), weight.L2Decay(rate=0.01), weight.LmaxDecay()]:
+            for workspace in [False, True]:
+                net = self.create_net("float32", decay=decay, g=grad.Adam(rate=0.01))
+                if workspace:
+                    net.use_workspace(self.x.shape[1])
+
+                y = net.forward(self.x)
+                self.assertEqual(np.float32, y.dtype)
+                dEdW, dEdB = net.backward(self.d, y)
+                for l in range(1, len(net.w)):
+                    self.assertEqual(np.float32, net.u_memento[l].dtype)
+                    self.assertEqual(np.float32, dEdW[l].dtype)
+                    self.assertEqual(np.float32, dEdB[l].dtype)
+
+                dRdW, dRdB = decay.r(net.w, net.b)
+                for l in range(1, len(net.w)):
+                    self.assertEqual(np.float32, dRdW[l].dtype, decay.__class__.__name__)
+
+                first = util.least_square_average(self.d, net.predict(self.x))
+                for cnt in range(0, 50):
+                    net.train_step(self.x, self.d)
+                last = util.least_square_average(self.d, net.predict(self.x))
+                self.assertLess(last, first)
+                for l in range(1, len(net.w)):
+                    self.assertEqual(np.float32, net.w[l].dtype)
+                    self.assertEqual(np.float32, net.b[l].dtype)
+                self.assertEqual(np.float32, net.predict(self.x).dtype)
+
+    def test_float32_matches_float64(self):
+        """
+        float32 で学習した結果が、float64 で学習した結果とほぼ一致することを検証します.
+        """
+        results = []
+        for p in ["float64", "float32"]:
+            net = self.create_net(p)
+            for cnt in range(0, 20):
+                net.train_step(self.x, self.d)
+            results.append(net.predict(self.x))
+
+        npt.assert_allclose(results[0], results[1], rtol=10e-4, atol=10e-4)
+
+    def test_mixed16(self):
+        """
+        mixed16 では、W,b は float16 で持ち、活性と微分値は float32 で計算することを検証します.
+        """
+        net = self.create_net("mixed16")
+        net.pack_parameters()
+        net.use_workspace(self.x.shape[1])
+
+        first = util.least_square_average(self.d, net.predict(self.x))
+        for cnt in range(0, 50):
+            y = net.forward(self.x)
+            dEdW, dEdB = net.backward(self.d, y)
+            net.adjust_network(dEdW, dEdB)
+        last = util.least_square_average(self.d, net.predict(self.x))
+
+        self.assertLess(last, first)
+        self.assertEqual(np.float16, net.parameters.flat.dtype)
+        self.assertEqual(np.float32, net.parameters.grad.dtype)
+        for l in range(1, len(net.w)):
+            self.assertEqual(np.float16, net.w[l].dtype)
+            self.assertEqual(np.float32, net.u_memento[l].dtype)
+            self.assertEqual(np.float32, dEdW[l].dtype)
+
+    def test_clamp_epsilon(self):
+        """
+        ε丸めが、W,b の型に合わせた ε を使うことを検証します.
+        """
+        for p in [precision.FLOAT64, precision.FLOAT32, precision.MIXED16]:
+            net = nnet.SimpleNet(precision=p)
+            net.add_layer(1, 1, layer_factory=layer.Seq(), activate_function=func.IdentityMapping())
+            net.set_learning_rate(grad.Static(rate=0.0))
+            net.b[1][0, 0] = p.epsilon() / 4.0
+            x = np.array([[1.0]])
+            net.train_step(x, net.forward(x))
+            self.assertAlmostEqual(p.epsilon(), float(net.b[1][0, 0]), delta=p.epsilon() * 10e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, grad, weight, profiler
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.x = np.random.normal(0, 1, (3, 20))
+        self.d = np.sum(self.x, axis=0, keepdims=True)
+
+    def create_net(self):
+        np.random.seed(0)
+        net = nnet.SimpleNet()
+        net.add_layer(3, 8, 4, layer_factory=layer.Random(), activate_function=func.Tanh())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Static(rate=0.01))
+        net.set_weight_decay(weight.L2Decay())
+        return net
+
+    def test_records(self):
+        """
+        層ごと・処理段階ごとの演算が記録され、フックの有無で学習結果が変わらないことを検証します.
+        """
+        plain = self.create_net()
+        net = self.create_net()
+        p = profiler.Profiler(trace_memory=True)
+        net.add_hook(p)
+
+        for cnt in range(0, 3):
+            plain.train_step(self.x, self.d)
+            net.train_step(self.x, self.d)
+        net.predict(self.x)
+        p.close()
+
+        for l in range(1, 4):
+            npt.assert_allclose(plain.w[l], net.w[l])
+            for key in [("forward", l, "matmul"), ("forward", l, "activation"), ("backward", l, "matmul"),
+                        ("adjust", l, "decay"), ("adjust", l, "update"), ("adjust", l, "clamp")]:
+                self.assertEqual(3, p.records[key].calls, key)
+                self.assertGreater(p.records[key].flops, 0)
+            self.assertEqual(1, p.records[("predict", l, "matmul")].calls)
+
+        self.assertEqual(3, p.records[("backward", 3, "delta")].calls)
+        self.assertEqual(3, p.records[("backward", 2, "differential")].calls)
+        self.assertNotIn(("backward", 1, "differential"), p.records)
+        # W(1) は 8×3, バッチは 20
+        self.assertEqual(3 * 2 * 8 * 3 * 20, p.records[("forward", 1, "matmul")].flops)
+        # 作業領域を使わない順伝搬は、u,z を新しく確保する
+        self.assertGreater(p.records[("forward", 1, "matmul")].allocated, 0)
+
+        summary = p.summary()
+        self.assertIn("forward", summary)
+        self.assertIn("clamp", summary)
+
+        net.remove_hook(p)
+        p.reset()
+        net.train_step(self.x, self.d)
+        self.assertEqual(0, len(p.records))
+
+    def test_packed(self):
+        """
+        W,b をまとめた場合は、W,b の更新と ε 丸めを層番号 0 (全層) で記録することを検証します.
+        """
+        net = self.create_net()
+        net.pack_parameters()
+        p = profiler.Profiler()
+        net.add_hook(p)
+        y = net.forward(self.x)
+        net.adjust_network(*net.backward(self.d, y))
+        self.assertEqual(1, p.records[("adjust", 0, "clamp")].calls)
+        self.assertEqual(1, p.records[("adjust", 1, "update")].calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,9 @@
 import unittest
 import numpy as np
-import cupy as cp
 import time
 from matplotlib import pyplot as plt
 from sklearn import datasets
-from ai_chan import nnet, layer, util, weight, func, gpu, grad
+from ai_chan import nnet, layer, util, weight, func, gpu, grad, backend
 
 
 class TestForward(unittest.TestCase):
@@ -12,7 +11,10 @@ class TestForward(unittest.TestCase):
     新しく組み込んだモジュールの思考をするためのテストモジュール.
     Jupyter notebook を再起動するのめんどいので
     """
+    @unittest.skipUnless(backend.cupy_available(), "cupy が使えないので GPU のテストは行いません")
     def test_gpu(self):
+        import cupy as cp
+
         # データセットのロード
         # iris.data = [(がく片の長さ , がく片の幅 , 花びらの長さ , 花びらの幅)]
         iris = datasets.load_iris()
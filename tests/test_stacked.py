@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, grad, weight
+
+
+class TestStacked(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.x = np.random.normal(0, 1, (3, 20))
+        self.d = np.sum(self.x, axis=0, keepdims=True)
+
+    def create_nets(self, optimizers):
+        nets = []
+        for seed, g in enumerate(optimizers):
+            np.random.seed(seed)
+            net = nnet.SimpleNet()
+            net.add_layer(3, 8, 4, layer_factory=layer.Random(), activate_function=func.Tanh())
+            net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+            net.set_learning_rate(g)
+            net.set_weight_decay(weight.L2Decay(rate=0.01) if seed % 2 == 0 else weight.NoDecay())
+            nets.append(net)
+        return nets
+
+    def assert_same_training(self, create_optimizers):
+        """
+        まとめて学習した結果が、1つずつ学習した結果と一致することを検証します.
+        """
+        nets = self.create_nets(create_optimizers())
+        for net in nets:
+            for cnt in range(0, 10):
+                net.train_step(self.x, self.d)
+
+        stacked = nnet.StackedNet(self.create_nets(create_optimizers()))
+        for cnt in range(0, 10):
+            stacked.train_step(self.x, self.d)
+
+        self.assertEqual(len(nets), len(stacked))
+        y = stacked.predict(self.x)
+        for k, net in enumerate(nets):
+            for l in range(1, len(net.w)):
+                npt.assert_allclose(net.w[l], stacked.w[l][k])
+                npt.assert_allclose(net.b[l], stacked.b[l][k])
+                # 元のネットワークの W,b は、積み重ねた配列のビュー
+                self.assertIs(stacked.w[l], stacked.nets[k].w[l].base)
+            npt.assert_allclose(net.predict(self.x), y[k])
+            npt.assert_allclose(net.predict(self.x), stacked.nets[k].predict(self.x))
+
+    def test_scalar_rate(self):
+        self.assert_same_training(lambda: [grad.Static(rate=rate) for rate in [0.001, 0.01, 0.1]])
+
+    def test_stateful(self):
+        self.assert_same_training(lambda: [grad.Momentum(rate=0.01), grad.Adam(rate=0.01), grad.Static(rate=0.01)])
+
+    def test_member_input(self):
+        """
+        ネットワークごとの入力データ (K × 入力数 × データ数) で順伝搬できることを検証します.
+        """
+        stacked = nnet.StackedNet(self.create_nets([grad.Static(), grad.Static()]))
+        x = np.stack([self.x, self.x * 2.0])
+        y = stacked.forward(x)
+        self.assertEqual((2, 1, 20), y.shape)
+        npt.assert_allclose(stacked.nets[1].predict(self.x * 2.0), y[1])
+
+    def test_different_layers(self):
+        nets = self.create_nets([grad.Static()])
+        other = nnet.SimpleNet()
+        other.add_layer(3, 4, 1, layer_factory=layer.Random())
+        with self.assertRaises(ValueError):
+            nnet.StackedNet(nets + [other])
+
+
+if __name__ == '__main__':
+    unittest.main()
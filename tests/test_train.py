@@ -0,0 +1,196 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, grad, train, util
+
+
+class TestTrain(unittest.TestCase):
+
+    def create_trainer(self, g=None):
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (3, 100))
+        d = np.sum(x, axis=0, keepdims=True)
+
+        net = nnet.SimpleNet()
+        net.add_layer(3, 10, layer_factory=layer.Random(), activate_function=func.Tanh())
+        net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_learning_rate(grad.Static(rate=0.01) if g is None else g)
+        return train.NetTrainer(net, x, d)
+
+    def test_eval_every(self):
+        """
+        eval_every 回ごとに評価し、gx が評価したときの学習回数になることを検証します.
+        """
+        full = self.create_trainer()
+        full.train(25)
+
+        trainer = self.create_trainer()
+        min_error = trainer.train(25, eval_every=10)
+
+        npt.assert_array_equal([0, 10, 20], trainer.gx)
+        npt.assert_array_equal([full.ge[cnt] for cnt in [0, 10, 20]], trainer.ge)
+        self.assertEqual(min(trainer.ge), min_error)
+        # 訓練誤差は毎回記録する
+        npt.assert_array_equal(list(range(0, 25)), trainer.tx)
+
+    def test_eval_seconds(self):
+        """
+        時間で評価する場合も、最初の学習の前には評価し、gx が昇順の学習回数になることを検証します.
+        """
+        trainer = self.create_trainer()
+        trainer.train(25, eval_every=None, eval_seconds=3600.0)
+        npt.assert_array_equal([0], trainer.gx)
+
+        trainer = self.create_trainer()
+        trainer.train(25, eval_every=None, eval_seconds=0.0)
+        npt.assert_array_equal(list(range(0, 25)), trainer.gx)
+
+    def test_eval_size(self):
+        """
+        評価用データの一部で評価しても、誤差が全件のときと同じ程度の大きさになることを検証します.
+        """
+        full = self.create_trainer()
+        full.train(5)
+
+        trainer = self.create_trainer()
+        trainer.train(5, eval_size=10)
+
+        npt.assert_array_equal(full.gx, trainer.gx)
+        self.assertLess(trainer.ge[0], full.ge[0] * 3.0)
+        self.assertGreater(trainer.ge[0], full.ge[0] / 3.0)
+
+    def test_early_stopping(self):
+        """
+        評価誤差が patience 回続けて改善しなかったら、学習をやめることを検証します.
+        """
+        trainer = self.create_trainer()
+        # 学習率が大きすぎて発散するネットワーク
+        trainer.nnet.set_learning_rate(grad.Static(rate=10.0))
+        with np.errstate(all='ignore'):
+            trainer.train(100, patience=3)
+
+        self.assertIsNotNone(trainer.stop_iteration)
+        self.assertLess(len(trainer.tx), 100)
+        self.assertEqual(trainer.stop_iteration, trainer.gx[-1])
+        # 最後に改善してから、3回評価して止まった
+        self.assertEqual(trainer.best_iteration + 3, trainer.gx[-1])
+
+    def test_min_delta(self):
+        """
+        min_delta より小さな改善は、改善とみなさないことを検証します.
+        """
+        trainer = self.create_trainer()
+        min_error = trainer.train(20, min_delta=10e10)
+        self.assertEqual(0, trainer.best_iteration)
+        self.assertEqual(trainer.ge[0], min_error)
+
+    def test_best_snapshot(self):
+        """
+        snapshot="copy" では最小エラー時の W,b を、
+        snapshot="iteration" では最小エラー時の学習回数をとっておき、best_parameters() で W,b を学習し直すことを検証します.
+        """
+        trainer = self.create_trainer()
+        trainer.train(30, eval_every=5)
+        best_iteration = trainer.best_iteration
+
+        # 同じ学習を best_iteration 回だけ行えば、最小エラー時の W,b になる
+        again = self.create_trainer()
+        again.train(best_iteration)
+        for l in range(1, len(trainer.finish_w)):
+            npt.assert_allclose(again.nnet.w[l], trainer.finish_w[l])
+            npt.assert_allclose(again.nnet.b[l], trainer.finish_b[l])
+
+        trainer = self.create_trainer()
+        trainer.train(30, eval_every=5, snapshot="iteration")
+        self.assertEqual(best_iteration, trainer.best_iteration)
+        self.assertIsNone(trainer.finish_w)
+
+        # 状態を持つ学習係数でも、初期の状態から学習し直す
+        trainer = self.create_trainer(g=grad.Adam())
+        trainer.train(30, eval_every=5, snapshot="iteration")
+        again = self.create_trainer(g=grad.Adam())
+        again.train(trainer.best_iteration)
+        last_w = [None] + [w.copy() for w in trainer.nnet.w[1:]]
+        best_w, best_b = trainer.best_parameters()
+        self.assertIs(best_w, trainer.finish_w)
+        for l in range(1, len(best_w)):
+            npt.assert_allclose(again.nnet.w[l], best_w[l])
+            npt.assert_allclose(again.nnet.b[l], best_b[l])
+            # ネットワークの W,b は学習終了時のまま
+            npt.assert_array_equal(last_w[l], trainer.nnet.w[l])
+        # 学習係数の状態も元に戻っているので、続きから学習すると1度に学習した場合と同じになる
+        trainer.train(5, snapshot="iteration")
+        full = self.create_trainer(g=grad.Adam())
+        full.train(35)
+        for l in range(1, len(full.nnet.w)):
+            npt.assert_allclose(full.nnet.w[l], trainer.nnet.w[l])
+
+        with self.assertRaises(ValueError):
+            trainer.train(1, snapshot="deep")
+
+    def test_resume(self):
+        """
+        train を続けて呼ぶと、前回の続きから学習し、1度に学習した場合と同じ結果になることを検証します.
+        """
+        full = self.create_trainer()
+        full.train(20)
+
+        trainer = self.create_trainer()
+        trainer.train(10)
+        min_error = trainer.train(10)
+
+        self.assertEqual(20, trainer.iteration)
+        npt.assert_array_equal(list(range(0, 20)), trainer.gx)
+        npt.assert_array_equal(list(range(0, 20)), trainer.tx)
+        npt.assert_allclose(full.ge, trainer.ge)
+        self.assertAlmostEqual(full.min_error, min_error)
+        self.assertEqual(full.best_iteration, trainer.best_iteration)
+
+    def test_cache_prefix(self):
+        """
+        固定した先頭の層の出力を使い回しても、同じ誤差で学習することを検証します.
+        """
+        trainers = []
+        for cache_prefix in [False, True]:
+            np.random.seed(0)
+            x = np.random.normal(0, 1, (3, 100))
+            d = np.sum(x, axis=0, keepdims=True)
+
+            net = nnet.SimpleNet()
+            net.add_layer(3, 10, layer_factory=layer.Random(), activate_function=func.Tanh(), fix_parameter=True)
+            net.add_layer(5, layer_factory=layer.Random(), activate_function=func.Tanh())
+            net.add_layer(1, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+            net.set_learning_rate(grad.Static(rate=0.01))
+            trainer = train.NetTrainer(net, x, d, cache_prefix=cache_prefix)
+            trainer.train(10, eval_size=10)
+            trainers.append(trainer)
+
+        self.assertIsNone(trainers[0].prefix_x)
+        self.assertEqual(1, trainers[1].prefix_start)
+        self.assertEqual((10, 20), trainers[1].prefix_x[0].shape)
+        npt.assert_allclose(trainers[0].te, trainers[1].te)
+        npt.assert_allclose(trainers[0].ge, trainers[1].ge)
+
+    def test_softmax(self):
+        """
+        クラス番号の教師値と交差エントロピーで、分類問題を学習できることを検証します.
+        """
+        np.random.seed(0)
+        x = np.random.normal(0, 1, (2, 200))
+        # 4つの象限をクラスにする
+        d = ((x[0:1] > 0) * 2 + (x[1:2] > 0)).astype(np.int64)
+
+        net = nnet.SimpleNet()
+        net.add_layer(2, 16, layer_factory=layer.He(), activate_function=func.ReLu())
+        net.add_layer(4, layer_factory=layer.Xavier(), activate_function=func.Softmax())
+        net.set_learning_rate(grad.Static(rate=0.5))
+        trainer = train.NetTrainer(net, x, d, loss=util.cross_entropy)
+        trainer.train(200)
+
+        self.assertLess(trainer.min_error, trainer.ge[0] / 4.0)
+        _, _, d_eval, y_eval = trainer.eval()
+        self.assertGreater(np.mean(np.argmax(y_eval, axis=0) == d_eval[0]), 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -185,6 +185,27 @@ class TestWeight(unittest.TestCase):
             [5.1]
         ])
 
+    def test_fold(self):
+        """
+        fold() が、r() の正則化項を勾配にその場で足し込むことを検証します.
+        """
+        for d in [weight.NoDecay(), weight.L1Decay(), weight.L2Decay(), weight.LmaxDecay()]:
+            dRdW, dRdB = d.r(self.w, self.b)
+            for idx in range(1, len(self.w)):
+                for p, dRdP in [(self.w[idx], dRdW[idx]), (self.b[idx], dRdB[idx])]:
+                    grad = np.ones_like(p)
+                    result = d.fold(p, grad, work=np.empty_like(p))
+                    self.assertIs(grad, result)
+                    npt.assert_allclose(1.0 + dRdP, grad, err_msg=d.__class__.__name__)
+
+                    # 作業用の配列が無くても同じ結果になる
+                    npt.assert_allclose(1.0 + dRdP, d.fold(p, np.ones_like(p)), err_msg=d.__class__.__name__)
+
+        # rate が非常に小さくても、桁あふれしない
+        grad = np.ones_like(self.w[1])
+        weight.L2Decay(rate=1e-320).fold(self.w[1], grad, work=np.empty_like(grad))
+        npt.assert_allclose(np.ones_like(grad), grad)
+
 
 if __name__ == '__main__':
     unittest.main()
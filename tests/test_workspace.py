@@ -0,0 +1,101 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from ai_chan import nnet, layer, func, weight
+
+
+class TestWorkspace(unittest.TestCase):
+
+    def create_net(self, workspace):
+        np.random.seed(1)
+        net = nnet.SimpleNet()
+        net.add_layer(3, 8, 6, activate_function=func.Sigmoid())
+        net.add_layer(4, activate_function=func.ReLu())
+        net.add_layer(2, layer_factory=layer.Random(), activate_function=func.IdentityMapping())
+        net.set_weight_decay(weight.L2Decay(rate=0.01))
+        if workspace:
+            net.use_workspace(5)
+        return net
+
+    def test_forward_backward(self):
+        """
+        作業領域を使っても、使わない場合と同じ u,z,∂E/∂W,∂E/∂b になることを検証します.
+        """
+        x = np.random.normal(0, 1, (3, 5))
+        d = np.random.normal(0, 1, (2, 5))
+
+        net1 = self.create_net(False)
+        net2 = self.create_net(True)
+
+        y1 = net1.forward(x)
+        y2 = net2.forward(x)
+        npt.assert_allclose(y1, y2)
+        for l in range(1, len(net1.w)):
+            npt.assert_allclose(net1.u_memento[l], net2.u_memento[l])
+            npt.assert_allclose(net1.z_memento[l], net2.z_memento[l])
+
+        dEdW1, dEdB1 = net1.backward(d, y1)
+        dEdW2, dEdB2 = net2.backward(d, y2)
+        for l in range(1, len(net1.w)):
+            # 微分値は作業領域の配列に書き込む
+            self.assertIs(net2.workspace.dEdW[l], dEdW2[l])
+            self.assertIs(net2.workspace.dEdB[l], dEdB2[l])
+            npt.assert_allclose(dEdW1[l], dEdW2[l])
+            npt.assert_allclose(dEdB1[l], dEdB2[l])
+
+    def test_train(self):
+        """
+        作業領域を使って学習しても、使わない場合と同じ W,b になること、
+        作業領域が学習ループの中で作り直されないことを検証します.
+        """
+        x = np.random.normal(0, 1, (3, 5))
+        d = np.random.normal(0, 1, (2, 5))
+
+        net1 = self.create_net(False)
+        net2 = self.create_net(True)
+
+        workspace = None
+        for cnt in range(0, 20):
+            for net in [net1, net2]:
+                y = net.forward(x)
+                dEdW, dEdB = net.backward(d, y)
+                net.adjust_network(dEdW, dEdB)
+            if workspace is None:
+                workspace = net2.workspace
+            self.assertIs(workspace, net2.workspace)
+
+        for l in range(1, len(net1.w)):
+            npt.assert_allclose(net1.w[l], net2.w[l])
+            npt.assert_allclose(net1.b[l], net2.b[l])
+
+    def test_other_batch_size(self):
+        """
+        作業領域と異なるバッチサイズのデータは、作業領域を使わずに順伝搬することを検証します.
+        """
+        net = self.create_net(True)
+        y = net.forward(np.random.normal(0, 1, (3, 7)))
+        self.assertEqual((2, 7), y.shape)
+        self.assertIsNone(net.workspace)
+
+    def test_output_alias(self):
+        """
+        作業領域を使うと forward の戻り値は作業領域の配列で、次の forward で上書きされること、
+        predict の戻り値は新しい配列であることを検証します.
+        """
+        net = self.create_net(True)
+        x1 = np.random.normal(0, 1, (3, 5))
+        x2 = np.random.normal(0, 1, (3, 5))
+
+        y1 = net.forward(x1)
+        self.assertIs(net.workspace.z[-1], y1)
+        expected = y1.copy()
+        net.forward(x2)
+        self.assertFalse(np.allclose(expected, y1))
+
+        p1 = net.predict(x1)
+        net.predict(x2)
+        npt.assert_allclose(expected, p1)
+
+
+if __name__ == '__main__':
+    unittest.main()